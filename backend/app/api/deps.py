@@ -6,15 +6,15 @@ from pydantic import ValidationError
 
 from app.core.config import settings
 from app.models.user import TokenPayload, User
-from app.infra.database import get_db
+from app.infra.database import db, get_db
+from app.services.query_scheduler import query_scheduler
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
 )
 
 def get_current_user(
-    token: str = Depends(reusable_oauth2),
-    db_conn = Depends(get_db)
+    token: str = Depends(reusable_oauth2)
 ) -> User:
     try:
         payload = jwt.decode(
@@ -33,8 +33,13 @@ def get_current_user(
     # In auth endpoint we should use email or id as sub.
     # Let's assume we used Email as sub for simplicity or ID.
     # If we used ID:
+    # Hold the pooled connection only for the lookup, not for the whole request
     user_query = "SELECT id, email, is_active, is_superuser, full_name, role FROM users WHERE email = ?"
-    user_row = db_conn.execute(user_query, [token_data.sub]).fetchone()
+    db_conn = db.get_connection()
+    try:
+        user_row = db_conn.execute(user_query, [token_data.sub]).fetchone()
+    finally:
+        db_conn.close()
     
     if not user_row:
         raise HTTPException(status_code=404, detail="User not found")
@@ -63,3 +68,25 @@ def get_current_active_superuser(
             status_code=400, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+def get_query_db(
+    current_user: User = Depends(get_current_user),
+    db_conn = Depends(get_db)
+):
+    """Request connection whose queries are attributed to the current user (running-queries registry, timeouts)"""
+    db_conn.user = current_user.email
+    db_conn.role = current_user.role
+    return db_conn
+
+def admit(lane: str):
+    """
+    Dependency factory: hold a scheduler slot in `lane` for the duration of the request.
+    Raises AdmissionError (HTTP 429) when the lane's queue is full.
+    """
+    def dependency(current_user: User = Depends(get_current_user)):
+        query_scheduler.acquire(lane, current_user.email)
+        try:
+            yield
+        finally:
+            query_scheduler.release(lane, current_user.email)
+    return dependency
@@ -1,9 +1,10 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, datasets, sql, dashboards, transformations, ai
+from app.api.v1.endpoints import auth, datasets, uploads, sql, dashboards, transformations, ai
 
 router = APIRouter()
 
 router.include_router(auth.router, prefix="/auth", tags=["auth"])
+router.include_router(uploads.router, prefix="/datasets/uploads", tags=["datasets"])
 router.include_router(datasets.router, prefix="/datasets", tags=["datasets"])
 router.include_router(sql.router, prefix="/sql", tags=["sql"])
 router.include_router(dashboards.router, prefix="/dashboards", tags=["dashboards"])
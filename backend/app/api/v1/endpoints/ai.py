@@ -1,18 +1,25 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from typing import List, Dict
-from app.schemas.ai import TrainRequest, PredictionRequest, ModelMetadata, PredictRangeRequest
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import Any, List, Dict, Optional
+from app.api import deps
+from app.models.user import User
+from app.schemas.ai import TrainRequest, PredictionRequest, ModelMetadata, PredictRangeRequest, TrainingJob, ScoreTableRequest
 from app.services.ai_service import ai_service
+from app.services.training_jobs import training_jobs, TrainingJobNotFoundError, KIND_TRAIN, KIND_RETRAIN
+from app.services.model_registry import model_registry
+from app.services.ingest_jobs import ingest_jobs, KIND_SCORE
+from app.services.data_loader import FileInUseError
+from app.services.query_scheduler import AdmissionError
 
 router = APIRouter()
 
 @router.post("/train")
-def train_model(request: TrainRequest, background_tasks: BackgroundTasks):
+def train_model(request: TrainRequest):
     """
-    Starts model training in the background.
+    Queues model training; a worker process picks it up (see /ai/jobs).
     """
     model_id = ai_service.train_model(request)
-    background_tasks.add_task(ai_service._train_implementation, model_id, request)
-    return {"message": "Training started", "model_id": model_id, "model_name": request.model_name}
+    job = training_jobs.submit(model_id, KIND_TRAIN, request)
+    return {"message": "Training started", "model_id": model_id, "model_name": request.model_name, "job_id": job.id}
 
 @router.get("/models", response_model=List[ModelMetadata])
 def list_models():
@@ -27,20 +34,25 @@ def delete_model(model_id: str):
     Delete a trained model and all its artifacts.
     """
     try:
+        training_jobs.cancel_model(model_id)
         ai_service.delete_model(model_id)
         return {"message": "Model deleted successfully", "model_id": model_id}
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 @router.post("/models/{model_id}/retrain")
-def retrain_model(model_id: str, background_tasks: BackgroundTasks):
+def retrain_model(model_id: str, threads: Optional[int] = None):
     """
     Retrains an existing model with the latest data from its dataset.
     """
     try:
         request = ai_service.retrain_model(model_id)
-        background_tasks.add_task(ai_service._train_implementation, model_id, request)
-        return {"message": "Retraining started", "model_id": model_id}
+        request.threads = threads
+        # The model is only reset once no other job is training it
+        job = training_jobs.submit(model_id, KIND_RETRAIN, request, prepare=lambda: ai_service.mark_retraining(model_id))
+        return {"message": "Retraining started", "model_id": model_id, "job_id": job.id}
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -76,3 +88,76 @@ def predict_range(model_id: str, request: PredictRangeRequest):
         return ai_service.predict_range(model_id, request.periods, request.frequency, request.context_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/models/{model_id}/score-table")
+def score_table(
+    model_id: str,
+    request: ScoreTableRequest,
+    response: Response,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Scores every row of a dataset and registers the predictions as a new dataset
+    (`output_table`), so dashboards can chart them like any other table.
+    The result reports rows scored and throughput (rows/s). Runs as an ingest job
+    (202 + job id, see /datasets/jobs/{id}) unless background=false.
+    """
+    job = ingest_jobs.create(KIND_SCORE, {
+        "model_id": model_id,
+        "source_table": request.source_table,
+        "table_name": request.output_table,
+        "columns": request.columns,
+        "prediction_column": request.prediction_column,
+        "dashboard_id": request.dashboard_id,
+        "storage_mode": request.storage_mode,
+    }, current_user.email, phase="score")
+    if request.background:
+        job = ingest_jobs.submit(job.id)
+        response.status_code = 202
+        return {"message": "Scoring job queued", "job_id": job.id, "status": job.status}
+
+    try:
+        return {**ingest_jobs.run_inline(job.id, current_user.email), "job_id": job.id}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except FileInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
+
+@router.get("/jobs", response_model=List[TrainingJob])
+def list_training_jobs(status: Optional[str] = None, model_id: Optional[str] = None, limit: int = 50):
+    """
+    Training jobs, newest first (queued, running, succeeded, failed, cancelled).
+    """
+    return training_jobs.list(status, model_id, limit)
+
+@router.get("/jobs/{job_id}", response_model=TrainingJob)
+def get_training_job(job_id: str):
+    try:
+        return training_jobs.get(job_id)
+    except TrainingJobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/jobs/{job_id}/cancel", response_model=TrainingJob)
+def cancel_training_job(job_id: str):
+    """
+    Cancels a queued job, or stops the worker process of a running one.
+    """
+    try:
+        return training_jobs.cancel(job_id)
+    except TrainingJobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/registry")
+def get_registry_stats():
+    """
+    Models held in memory for predictions (LRU), with hit/miss counters.
+    """
+    return model_registry.stats()
@@ -7,6 +7,7 @@ from app.models.dashboard import (
     DashboardCreate,
     DashboardLayoutUpdate
 )
+from app.schemas.dashboard import DashboardRenderResponse
 from app.services.dashboard_service import dashboard_service
 
 router = APIRouter()
@@ -49,6 +50,20 @@ def get_dashboard(
         raise HTTPException(status_code=404, detail="Dashboard no encontrado")
     return dashboard
 
+@router.post("/{dashboard_id}/render", response_model=DashboardRenderResponse)
+def render_dashboard(
+    dashboard_id: str,
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Ejecutar las consultas de todos los widgets del dashboard en una sola llamada.
+    Devuelve los datos, el tiempo y el error (si lo hubo) de cada widget.
+    """
+    rendered = dashboard_service.render_dashboard(dashboard_id, current_user.email, current_user.role)
+    if not rendered:
+        raise HTTPException(status_code=404, detail="Dashboard no encontrado")
+    return rendered
+
 @router.put("/{dashboard_id}/layout", response_model=Dashboard)
 def update_dashboard_layout(
     dashboard_id: str,
@@ -1,53 +1,134 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Response
 from app.api import deps
+from app.services.query_scheduler import AdmissionError, LANE_INGEST
 from app.models.user import User
-from app.services.data_loader import data_loader
-from app.services.data_converter import data_converter
+from app.services.data_loader import data_loader, FileInUseError
+from app.services.remote_cache import remote_cache
+from app.services.ingest_jobs import (
+    ingest_jobs,
+    IngestJobNotFoundError,
+    KIND_UPLOAD,
+    KIND_LOCAL,
+    KIND_URL,
+    KIND_CONVERT,
+    KIND_REFRESH,
+    KIND_BATCH_CONVERT
+)
+from app.services.batch_converter import batch_converter, CONVERT_EXTENSIONS
+from pydantic import ValidationError
+from app.schemas.ingest import IngestJob, ConversionProfile
 
 router = APIRouter()
 
+def _queued(response: Response, job: IngestJob) -> dict:
+    response.status_code = 202
+    return {"message": "Ingest job queued", "job_id": job.id, "status": job.status}
+
+
 @router.post("/", status_code=201)
 def upload_dataset(
+    response: Response,
     file: UploadFile = File(...),
     table_name: str = Form(...),
     dashboard_id: Optional[str] = Form(None),
+    storage_mode: Optional[str] = Form(None),
+    append_key: Optional[str] = Form(None),
+    background: bool = Form(True),
     current_user: User = Depends(deps.get_current_active_superuser)
 ) -> Any:
     """
     Upload a CSV/Parquet file and register it as a table.
+    CSVs are converted to Parquet first; with storage_mode 'external' (the default)
+    the Parquet file is read in place instead of being copied into DuckDB.
+    Re-uploading the same content is a no-op; a CSV that only grew (or any file
+    with an append-only `append_key` column) only appends the new rows.
+    The conversion and registration run as an ingest job and the response (202)
+    only carries the job id (poll /datasets/jobs/{id}); background=false runs it
+    inside the request.
+    A file that another dataset reads in place is never overwritten (409).
     Only superusers (Admins) can upload datasets.
     """
     # Basic validation
     if not (file.filename.endswith(".csv") or file.filename.endswith(".parquet")):
         raise HTTPException(status_code=400, detail="Only .csv and .parquet files are supported")
     
-    file_path = data_loader.save_file(file)
-    final_path = file_path
-    
-    # Auto-convert CSV to Parquet for performance
-    if file_path.endswith(".csv"):
-        try:
-            final_path = data_converter.convert_csv_to_parquet(file_path)
-        except Exception as e:
-            print(f"Warning: CSV conversion failed, falling back to CSV. Error: {e}")
-            final_path = file_path
+    try:
+        data_loader.ensure_writable(data_loader.upload_targets(file.filename), table_name)
+    except FileInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    file_path = data_loader.upload_path(file.filename)
+    job = ingest_jobs.create(KIND_UPLOAD, {
+        "file_path": file_path,
+        "original_filename": file.filename,
+        "table_name": table_name,
+        "dashboard_id": dashboard_id,
+        "storage_mode": storage_mode,
+        "append_key": append_key,
+    }, current_user.email, phase="upload")
+    ingest_jobs.save_upload(job.id, file, file_path)
+
+    if background:
+        return _queued(response, ingest_jobs.submit(job.id))
 
     try:
-        data_loader.register_dataset(table_name, final_path, file.filename, dashboard_id)
+        result = ingest_jobs.run_inline(job.id, current_user.email)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load dataset: {str(e)}")
         
-    return {"message": "Dataset uploaded and registered successfully", "table": table_name}
+    return {
+        "message": "Dataset uploaded and registered successfully",
+        "table": table_name,
+        "job_id": job.id,
+        "action": result["action"],
+        "rows_appended": result["rows_appended"]
+    }
+
+def _conversion_profile(
+    compression: str = Form("snappy"),
+    compression_level: Optional[int] = Form(None),
+    row_group_size: Optional[int] = Form(None),
+    dictionary: bool = Form(True),
+    sort_by: Optional[str] = Form(None),
+    statistics: bool = Form(True),
+) -> ConversionProfile:
+    """Parquet layout form fields shared by the conversion endpoints"""
+    try:
+        return ConversionProfile(
+            compression=compression,
+            compression_level=compression_level,
+            row_group_size=row_group_size,
+            dictionary=dictionary,
+            sort_by=[c.strip() for c in sort_by.split(",") if c.strip()] if sort_by else [],
+            statistics=statistics,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/convert", status_code=200)
 def convert_dataset(
+    response: Response,
     file: UploadFile = File(...),
+    sheet_name: Optional[str] = Form(None),
+    profile: ConversionProfile = Depends(_conversion_profile),
+    background: bool = Form(True),
     current_user: User = Depends(deps.get_current_active_superuser)
 ) -> Any:
     """
     Convert various file formats to Parquet.
     Supported formats: CSV, TXT, JSON, Excel (.xlsx, .xls), Avro, ORC
+    For Excel, sheet_name selects a sheet (default: the first) or '*' for all sheets
+    stacked with a `_sheet` column.
+    compression, compression_level (zstd), row_group_size, dictionary, sort_by
+    (comma-separated columns) and statistics set the Parquet layout; the result
+    reports the compressed size of each column.
+    The conversion runs as an ingest job (202 + job id); background=false runs
+    it inside the request.
     """
     # Detect file type from extension
     file_ext = file.filename.rsplit('.', 1)[-1].lower()
@@ -59,39 +140,93 @@ def convert_dataset(
             detail=f"Unsupported file format. Supported: {', '.join(supported_formats)}"
         )
 
-    import os
-    file_path = data_loader.save_file(file)
     try:
-        parquet_path = data_converter.convert_to_parquet(file_path, file_ext)
-        
-        original_size = os.path.getsize(file_path)
-        parquet_size = os.path.getsize(parquet_path)
-        reduction_percent = ((original_size - parquet_size) / original_size * 100) if original_size > 0 else 0
-        
-        # Delete original file after successful conversion
-        try:
-            os.remove(file_path)
-        except Exception as cleanup_error:
-            print(f"Warning: Could not delete original file: {cleanup_error}")
-        
-        return {
-            "message": "Conversión exitosa", 
-            "original_file": file.filename,
-            "original_format": file_ext.upper(),
-            "parquet_file": os.path.basename(parquet_path),
-            "original_size": original_size,
-            "parquet_size": parquet_size,
-            "size_reduction_percent": round(reduction_percent, 2)
-        }
+        data_loader.ensure_writable(data_loader.upload_targets(file.filename, convert=True))
+    except FileInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    file_path = data_loader.upload_path(file.filename)
+    job = ingest_jobs.create(KIND_CONVERT, {
+        "file_path": file_path,
+        "file_ext": file_ext,
+        "original_filename": file.filename,
+        "sheet_name": sheet_name,
+        "profile": profile.dict(),
+    }, current_user.email, phase="upload")
+    ingest_jobs.save_upload(job.id, file, file_path)
+
+    if background:
+        return _queued(response, ingest_jobs.submit(job.id))
+
+    try:
+        return ingest_jobs.run_inline(job.id, current_user.email)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionError:
+        raise
     except Exception as e:
-        # If conversion fails, cleanup the uploaded file
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except:
-            pass
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
 
+@router.post("/convert-batch", status_code=200)
+def convert_datasets_batch(
+    response: Response,
+    files: Optional[List[UploadFile]] = File(None),
+    directory: Optional[str] = Form(None),
+    sheet_name: Optional[str] = Form(None),
+    delete_originals: bool = Form(False),
+    profile: ConversionProfile = Depends(_conversion_profile),
+    background: bool = Form(True),
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Convert many files to Parquet in parallel, one worker process per core
+    (CONVERTER_PROCESSES). Either upload the files or give a directory under
+    uploads/ whose convertible files (recursively) are converted in place.
+    Uploaded originals are deleted after conversion, as with /convert; server
+    files only when delete_originals=true. The layout fields are those of /convert.
+    Runs in the background by default; the job result lists each file as it
+    finishes and ends with a summary of sizes, durations and throughput (MB/s).
+    """
+    if bool(files) == bool(directory):
+        raise HTTPException(status_code=400, detail="Upload files or give a directory, not both")
+
+    try:
+        if directory:
+            paths = data_loader.list_directory_files(directory, tuple(f".{ext}" for ext in CONVERT_EXTENSIONS))
+        else:
+            paths = [data_loader.upload_path(file.filename) for file in files]
+        batch_converter.check_outputs(paths)
+        data_loader.ensure_writable(
+            [path.rsplit('.', 1)[0] + '.parquet' for path in paths] if directory
+            else [target for file in files for target in data_loader.upload_targets(file.filename, convert=True)]
+        )
+    except FileInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = ingest_jobs.create(KIND_BATCH_CONVERT, {
+        "files": paths,
+        "directory": directory,
+        "sheet_name": sheet_name,
+        "delete_originals": delete_originals or not directory,
+        "profile": profile.dict(),
+    }, current_user.email, phase="upload" if files else "convert")
+    for file, path in zip(files or [], paths):
+        ingest_jobs.save_upload(job.id, file, path)
+
+    if background:
+        return _queued(response, ingest_jobs.submit(job.id))
+
+    try:
+        return ingest_jobs.run_inline(job.id, current_user.email)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch conversion failed: {str(e)}")
+
 @router.get("/")
 def list_datasets(
     current_user: User = Depends(deps.get_current_user)
@@ -113,6 +248,8 @@ def delete_server_file(
     try:
         data_loader.delete_server_file(filename)
         return {"message": f"File '{filename}' deleted successfully"}
+    except FileInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -128,8 +265,8 @@ def delete_dataset(
     Only superusers (Admins) can delete datasets.
     """
     try:
-        data_loader.delete_dataset(table_name)
-        return {"message": f"Dataset '{table_name}' deleted successfully"}
+        broken = data_loader.delete_dataset(table_name)
+        return {"message": f"Dataset '{table_name}' deleted successfully", "broken_dependents": broken}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete dataset: {str(e)}")
 
@@ -139,41 +276,107 @@ class UrlImportRequest(BaseModel):
     url: str
     table_name: str
     dashboard_id: Optional[str] = None
+    background: bool = True
 
 class LocalImportRequest(BaseModel):
     file_path: str
     table_name: str
     dashboard_id: Optional[str] = None
+    storage_mode: Optional[str] = None
+    append_key: Optional[str] = None
+    hive_partitioning: Optional[bool] = None
+    background: bool = True
+
+class FileRefreshRequest(BaseModel):
+    # Ingest endpoints queue a job (202 + job id) unless background is false
+    background: bool = True
 
 @router.post("/import-url", status_code=201)
 def import_dataset_from_url(
     request: UrlImportRequest,
+    response: Response,
     current_user: User = Depends(deps.get_current_active_superuser)
 ) -> Any:
     """
     Import a dataset from a public URL (Parquet/CSV).
+    Runs as an ingest job (202 + job id) unless background=false.
     """
+    job = ingest_jobs.create(KIND_URL, {
+        "url": request.url,
+        "table_name": request.table_name,
+        "dashboard_id": request.dashboard_id,
+    }, current_user.email)
+    if request.background:
+        return _queued(response, ingest_jobs.submit(job.id))
+
     try:
-        data_loader.register_dataset_from_url(request.url, request.table_name, request.dashboard_id)
-        return {"message": "Dataset imported successfully from URL", "table": request.table_name}
+        result = ingest_jobs.run_inline(job.id, current_user.email)
+        return {"message": "Dataset imported successfully from URL", "table": request.table_name, "job_id": job.id, "action": result["action"]}
+    except AdmissionError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to import from URL: {str(e)}")
 
+@router.get("/remote-info")
+def remote_parquet_info(
+    url: str,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Schema and row count of a remote Parquet file, read from its footer only
+    (the blocks read stay in the remote cache for a later import).
+    """
+    if not url.lower().startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="Only http(s) URLs are supported")
+    try:
+        return remote_cache.parquet_metadata(url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to read remote file: {str(e)}")
+
 @router.post("/import-local", status_code=201)
 def import_dataset_from_local(
     request: LocalImportRequest,
+    response: Response,
     current_user: User = Depends(deps.get_current_active_superuser)
 ) -> Any:
     """
     Import a dataset from a file already on the server (in uploads/ directory).
+    Re-importing an unchanged file is a no-op, and a file that only grew is appended.
+    `file_path` may also be a glob ('sales/year=*/month=*/*.parquet') or a directory:
+    all matching files become one dataset, with key=value folders as partition columns.
+    Runs as an ingest job (202 + job id) unless background=false.
     """
     try:
-        
-        full_path = data_loader.get_full_path(request.file_path)
-        data_loader.register_dataset_from_local_path(full_path, request.table_name, None, request.dashboard_id)
-        return {"message": "Dataset imported successfully from local file", "table": request.table_name}
+        # Validate the path before queueing anything
+        if data_loader.is_multi_file(request.file_path):
+            data_loader.resolve_files(request.file_path)
+        else:
+            data_loader.get_full_path(request.file_path)
+        job = ingest_jobs.create(KIND_LOCAL, {
+            "file_path": request.file_path,
+            "table_name": request.table_name,
+            "dashboard_id": request.dashboard_id,
+            "storage_mode": request.storage_mode,
+            "append_key": request.append_key,
+            "hive_partitioning": request.hive_partitioning,
+        }, current_user.email)
+        if request.background:
+            return _queued(response, ingest_jobs.submit(job.id))
+
+        result = ingest_jobs.run_inline(job.id, current_user.email)
+        return {
+            "message": "Dataset imported successfully from local file",
+            "table": request.table_name,
+            "job_id": job.id,
+            "action": result["action"],
+            "rows_appended": result["rows_appended"]
+        }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to import from local file: {str(e)}")
 
@@ -185,7 +388,8 @@ class SqlImportRequest(BaseModel):
 @router.post("/create-from-sql", status_code=201)
 def create_dataset_from_sql(
     request: SqlImportRequest,
-    current_user: User = Depends(deps.get_current_active_superuser)
+    current_user: User = Depends(deps.get_current_active_superuser),
+    _slot = Depends(deps.admit(LANE_INGEST))
 ) -> Any:
     """
     Create a new dataset table from a SQL query.
@@ -196,6 +400,31 @@ def create_dataset_from_sql(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create dataset from SQL: {str(e)}")
 
+@router.post("/{table_name}/refresh-files")
+def refresh_dataset_files(
+    table_name: str,
+    response: Response,
+    request: FileRefreshRequest = FileRefreshRequest(),
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Pick up new files under a dataset registered from a glob or directory.
+    Only files added since the last load are read.
+    Runs as an ingest job (202 + job id) unless background=false.
+    """
+    job = ingest_jobs.create(KIND_REFRESH, {"table_name": table_name}, current_user.email)
+    if request.background:
+        return _queued(response, ingest_jobs.submit(job.id))
+
+    try:
+        return {**ingest_jobs.run_inline(job.id, current_user.email), "job_id": job.id}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to refresh dataset files: {str(e)}")
+
 @router.get("/server-files")
 def list_server_files(
     current_user: User = Depends(deps.get_current_active_superuser)
@@ -225,3 +454,41 @@ def list_dataset_columns(
         raise HTTPException(status_code=404, detail=f"Dataset {table_name} not found or inaccessible: {str(e)}")
 
 
+@router.get("/jobs", response_model=List[IngestJob])
+def list_ingest_jobs(
+    status: Optional[str] = None,
+    limit: int = 50,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    List recent ingest jobs, optionally filtered by status.
+    """
+    return ingest_jobs.list(status, limit)
+
+@router.get("/jobs/{job_id}", response_model=IngestJob)
+def get_ingest_job(
+    job_id: str,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Status and progress of an ingest job (phase, bytes read, rows written).
+    """
+    try:
+        return ingest_jobs.get(job_id)
+    except IngestJobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/jobs/{job_id}/retry", response_model=IngestJob, status_code=202)
+def retry_ingest_job(
+    job_id: str,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Queue a failed ingest job again.
+    """
+    try:
+        return ingest_jobs.retry(job_id)
+    except IngestJobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,9 +1,16 @@
-from typing import Any, List, Dict
-from fastapi import APIRouter, Depends, HTTPException, Body
-from pydantic import BaseModel
+from typing import Any, List, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Query
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
 from app.api import deps
+from app.core import result_formats
 from app.models.user import User
-from app.infra.database import get_db
+from app.core.config import settings
+from app.services.query_cache import query_cache
+from app.services.query_registry import query_registry, QueryCancelledError
+from app.services.query_scheduler import query_scheduler, LANE_INTERACTIVE, LANE_SANDBOX
+from app.services.result_cursors import result_cursors, CursorNotFoundError, CursorLimitError
 
 router = APIRouter()
 
@@ -11,47 +18,227 @@ class QueryRequest(BaseModel):
     query: str
     allow_unsafe: bool = False
 
+class CursorRequest(BaseModel):
+    query: str
+    page_size: int = Field(default=1000, ge=1, le=settings.RESULT_PAGE_MAX_ROWS)
+
+def _validate_sandbox_sql(sql: str):
+    """Reject anything that is not a single read-only statement"""
+    allowed_prefixes = ("select", "describe", "show", "explain", "with")
+    if not sql.lower().startswith(allowed_prefixes):
+        raise HTTPException(status_code=400, detail="Only SELECT, SHOW, DESCRIBE, EXPLAIN and WITH queries are allowed.")
+    
+    forbidden_keywords = ["drop", "delete", "insert", "update", "alter", "create", "truncate", "grant", "revoke"]
+    for word in forbidden_keywords:
+        if f" {word} " in f" {sql.lower()} ":
+            raise HTTPException(status_code=400, detail=f"Forbidden keyword '{word}' detected. Sandbox allows read-only operations.")
+    
+    if ";" in sql.replace(";", ""):
+        raise HTTPException(status_code=400, detail="Multiple statements (semicolons) are not allowed in Sandbox.")
+
+def _resolve_format(accept: Optional[str], format: Optional[str]) -> str:
+    try:
+        return result_formats.negotiate_format(accept, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _arrow_response(db_conn) -> StreamingResponse:
+    """
+    Stream the executed query's result as Arrow IPC; the connection is released when the
+    stream ends, or by the background task if the body is never iterated (client gone early)
+    """
+    stream_conn = db_conn.detach()
+    reader = stream_conn.fetch_record_batch(result_formats.ARROW_BATCH_ROWS)
+    return StreamingResponse(
+        result_formats.arrow_stream(reader, on_close=stream_conn.close),
+        media_type=result_formats.ARROW_STREAM_MEDIA_TYPE,
+        background=BackgroundTask(stream_conn.close)
+    )
+
+def _rows_response(columns: List[str], rows: List[tuple]) -> Response:
+    """Default row-dict JSON, encoded like the columnar and NDJSON formats"""
+    return Response(content=result_formats.dumps(result_formats.rows_payload(columns, rows)), media_type="application/json")
+
+def _columnar_response(columns: List[str], rows: List[tuple]) -> Response:
+    return Response(
+        content=result_formats.dumps(result_formats.columnar_payload(columns, rows)),
+        media_type=result_formats.COLUMNAR_JSON_MEDIA_TYPE
+    )
+
 @router.post("/execute", response_model=List[Dict[str, Any]])
 def execute_sql(
     query_req: QueryRequest,
+    format: Optional[str] = Query(None, description="rows (default), columnar or arrow"),
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(deps.get_current_user),
-    db_conn = Depends(get_db)
+    _slot = Depends(deps.admit(LANE_SANDBOX)),
+    db_conn = Depends(deps.get_query_db)
 ) -> Any:
     """
     Execute a query against the data warehouse.
     By default in Sandbox, restricted to SELECT only.
     If allow_unsafe is True, allows write operations.
+
+    Result format is negotiated via `format` or the Accept header:
+    row-dict JSON (default), column-oriented JSON or an Arrow IPC stream.
     """
+    result_format = _resolve_format(accept, format)
     sql = query_req.query.strip()
     
     if not query_req.allow_unsafe:
-        allowed_prefixes = ("select", "describe", "show", "explain", "with")
-        if not sql.lower().startswith(allowed_prefixes):
-            raise HTTPException(status_code=400, detail="Only SELECT, SHOW, DESCRIBE, EXPLAIN and WITH queries are allowed.")
-        
-        forbidden_keywords = ["drop", "delete", "insert", "update", "alter", "create", "truncate", "grant", "revoke"]
-        for word in forbidden_keywords:
-            if f" {word} " in f" {sql.lower()} ":
-                raise HTTPException(status_code=400, detail=f"Forbidden keyword '{word}' detected. Sandbox allows read-only operations.")
-        
-        if ";" in sql.replace(";", ""):
-            raise HTTPException(status_code=400, detail="Multiple statements (semicolons) are not allowed in Sandbox.")
+        _validate_sandbox_sql(sql)
 
     try:
 
         cursor = db_conn.execute(sql)
+
+        # Unrestricted statements may write to any table
+        if query_req.allow_unsafe:
+            query_cache.clear()
         
         if cursor.description:
+            if result_format == result_formats.FORMAT_ARROW:
+                return _arrow_response(db_conn)
             columns = [desc[0] for desc in cursor.description]
             rows = cursor.fetchall()
-            result = [dict(zip(columns, row)) for row in rows]
-            return result
+            if result_format == result_formats.FORMAT_COLUMNAR:
+                return _columnar_response(columns, rows)
+            return _rows_response(columns, rows)
         else:
             return [{"message": "Query executed successfully", "status": "ok"}]
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Query execution failed: {str(e)}")
 
+@router.post("/execute/stream")
+def execute_sql_stream(
+    query_req: CursorRequest,
+    current_user: User = Depends(deps.get_current_user),
+    _slot = Depends(deps.admit(LANE_SANDBOX)),
+    db_conn = Depends(deps.get_query_db)
+) -> Any:
+    """
+    Stream a read-only query as NDJSON (one JSON object per row).
+    Rows are fetched from DuckDB in chunks of `page_size`, so memory stays
+    flat regardless of the result size.
+    """
+    sql = query_req.query.strip()
+    _validate_sandbox_sql(sql)
+    try:
+        cursor = db_conn.execute(sql)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Query execution failed: {str(e)}")
+    if not cursor.description:
+        raise HTTPException(status_code=400, detail="Query did not return a result set")
+
+    columns = [desc[0] for desc in cursor.description]
+    stream_conn = db_conn.detach()
+
+    def generate():
+        try:
+            while True:
+                rows = stream_conn.fetchmany(query_req.page_size)
+                if not rows:
+                    break
+                yield b"".join(result_formats.dumps(row) + b"\n" for row in result_formats.rows_payload(columns, rows))
+        finally:
+            stream_conn.close()
+
+    # close() is idempotent: also runs when the generator never starts
+    return StreamingResponse(generate(), media_type="application/x-ndjson", background=BackgroundTask(stream_conn.close))
+
+@router.post("/cursors")
+def open_cursor(
+    query_req: CursorRequest,
+    current_user: User = Depends(deps.get_current_user),
+    _slot = Depends(deps.admit(LANE_SANDBOX)),
+    db_conn = Depends(deps.get_query_db)
+) -> Any:
+    """
+    Run a read-only query and keep its result open on the server.
+    Returns a cursor id plus the first page; fetch further pages with
+    GET /sql/cursors/{cursor_id}. Idle cursors expire automatically.
+    """
+    sql = query_req.query.strip()
+    _validate_sandbox_sql(sql)
+    try:
+        cursor = db_conn.execute(sql)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Query execution failed: {str(e)}")
+    if not cursor.description:
+        raise HTTPException(status_code=400, detail="Query did not return a result set")
+
+    try:
+        result_cursor = result_cursors.open(db_conn.detach(), current_user.email)
+    except CursorLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    try:
+        return result_cursors.fetch(result_cursor.id, current_user.email, query_req.page_size)
+    except QueryCancelledError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/cursors/{cursor_id}")
+def fetch_cursor_page(
+    cursor_id: str,
+    page_size: int = Query(1000, ge=1, le=settings.RESULT_PAGE_MAX_ROWS),
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Fetch the next page of an open cursor.
+    """
+    try:
+        return result_cursors.fetch(cursor_id, current_user.email, page_size)
+    except CursorNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except QueryCancelledError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/cursors/{cursor_id}")
+def close_cursor(
+    cursor_id: str,
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Close a cursor and release its connection.
+    """
+    try:
+        result_cursors.close(cursor_id, current_user.email)
+        return {"message": "Cursor closed", "cursor_id": cursor_id}
+    except CursorNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/running")
+def list_running_queries(
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    List queries currently executing. Admins see every query, other users only their own.
+    """
+    return query_registry.list(None if current_user.is_superuser else current_user.email)
+
+@router.delete("/running/{query_id}")
+def cancel_running_query(
+    query_id: str,
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Interrupt a running query. Users can cancel their own queries; admins any query.
+    """
+    query = query_registry.get(query_id)
+    if query is None or (not current_user.is_superuser and query.user != current_user.email):
+        raise HTTPException(status_code=404, detail="Query not found or already finished")
+    query_registry.cancel(query_id, f"cancelled by {current_user.email}")
+    return {"message": "Cancellation requested", "query_id": query_id}
+
+@router.get("/scheduler")
+def get_scheduler_stats(
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Admission-control metrics: active and queued queries per lane.
+    """
+    return query_scheduler.stats()
+
 def _auto_quote_identifiers(sql: str, db_conn) -> str:
     """
     Automatically quote identifiers (column/table names) that contain spaces.
@@ -123,32 +310,55 @@ def _auto_quote_identifiers(sql: str, db_conn) -> str:
 
 
 from app.schemas.query_builder import QueryBuilderRequest
-from app.core.query_builder import SecureQueryBuilder
+from app.services.query_service import query_service
 
 @router.post("/execute-secure", response_model=List[Dict[str, Any]])
 def execute_secure_query(
     query_req: QueryBuilderRequest,
+    format: Optional[str] = Query(None, description="rows (default), columnar or arrow"),
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(deps.get_current_user),
-    db_conn = Depends(get_db)
+    _slot = Depends(deps.admit(LANE_INTERACTIVE)),
+    db_conn = Depends(deps.get_query_db)
 ) -> Any:
     """
     Execute a secure query using query builder.
     100% safe against SQL injection.
+    Results are served from the result cache until a table they read changes.
+    Arrow streams are read straight from DuckDB and bypass the cache.
     """
-    builder = SecureQueryBuilder()
-    
+    result_format = _resolve_format(accept, format)
     try:
-        sql, params = builder.build_sql(query_req)
-        
-        cursor = db_conn.execute(sql, params)
-        if cursor.description:
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
-            result = [dict(zip(columns, row)) for row in rows]
-            return result
-        return []
+        if result_format == result_formats.FORMAT_ARROW:
+            sql, params = query_service.builder.build_sql(query_req)
+            db_conn.execute(sql, params)
+            return _arrow_response(db_conn)
+
+        columns, rows = query_service.execute_builder_query(db_conn, query_req)
+        if result_format == result_formats.FORMAT_COLUMNAR:
+            return _columnar_response(columns, rows)
+        return _rows_response(columns, rows)
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Query execution failed: {str(e)}")
+
+@router.get("/cache")
+def get_cache_stats(
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Result cache statistics (entries, bytes, hits/misses).
+    """
+    return query_cache.stats()
+
+@router.delete("/cache")
+def clear_cache(
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Drop every cached result.
+    """
+    query_cache.clear()
+    return {"message": "Cache cleared"}
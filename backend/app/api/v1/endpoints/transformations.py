@@ -1,6 +1,7 @@
-from typing import Any, List
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from app.api import deps
+from app.services.query_scheduler import LANE_SANDBOX, LANE_INGEST
 from app.models.user import User
 from app.models.transformation import (
     TransformationCreate,
@@ -8,6 +9,14 @@ from app.models.transformation import (
     TransformationResponse,
     TransformationPreview
 )
+from app.schemas.transformation import (
+    MaterializationConfig,
+    MaterializationStatus,
+    RefreshResult,
+    RefreshPlanResult,
+    LineageNode
+)
+from app.services.lineage_service import lineage_service
 from app.services.transformation_service import transformation_service
 
 router = APIRouter()
@@ -44,6 +53,32 @@ def list_transformations(
         raise HTTPException(status_code=500, detail=f"Error al listar transformaciones: {str(e)}")
 
 
+@router.get("/lineage", response_model=Dict[str, List[str]])
+def get_lineage_graph(
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Grafo de linaje: cada transformación con las tablas/vistas de las que lee.
+    """
+    return lineage_service.graph()
+
+
+@router.post("/refresh", response_model=RefreshPlanResult)
+def refresh_transformations(
+    names: Optional[List[str]] = None,
+    full: bool = False,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Refrescar transformaciones materializadas (todas si no se indican nombres)
+    en orden topológico, con las ramas independientes en paralelo.
+    """
+    try:
+        return transformation_service.refresh_many(names, full=full)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/{transformation_id}", response_model=TransformationResponse)
 def get_transformation(
     transformation_id: int,
@@ -100,19 +135,23 @@ def delete_transformation(
 @router.post("/preview", status_code=200)
 def preview_transformation(
     preview: TransformationPreview,
-    current_user: User = Depends(deps.get_current_user)
+    sample: Optional[bool] = None,
+    current_user: User = Depends(deps.get_current_user),
+    _slot = Depends(deps.admit(LANE_SANDBOX))
 ) -> Any:
     """
     Preview de una transformación sin guardarla.
     Retorna las primeras 100 filas del resultado.
+    Con `sample=true` se ejecuta sobre una muestra de la tabla origen; por
+    defecto se muestrea automáticamente si la tabla origen es muy grande.
     """
     try:
-        data = transformation_service.preview_transformation(
+        return transformation_service.preview_transformation(
             preview.source_table,
             preview.sql_definition,
-            limit=100
+            limit=100,
+            sample=sample
         )
-        return {"data": data, "count": len(data)}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -123,7 +162,8 @@ def preview_transformation(
 def get_transformation_data(
     transformation_id: int,
     limit: int = 1000,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: User = Depends(deps.get_current_user),
+    _slot = Depends(deps.admit(LANE_SANDBOX))
 ) -> Any:
     """
     Obtener datos de una transformación existente.
@@ -135,3 +175,73 @@ def get_transformation_data(
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener datos: {str(e)}")
+
+
+@router.get("/{transformation_id}/materialization", response_model=MaterializationStatus)
+def get_materialization(
+    transformation_id: int,
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Estado de materialización de una transformación.
+    """
+    status = transformation_service.get_materialization(transformation_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Transformación no encontrada")
+    return status
+
+
+@router.put("/{transformation_id}/materialization", response_model=MaterializationStatus)
+def set_materialization(
+    transformation_id: int,
+    config: MaterializationConfig,
+    current_user: User = Depends(deps.get_current_active_superuser),
+    _slot = Depends(deps.admit(LANE_INGEST))
+) -> Any:
+    """
+    Materializar una transformación como tabla (o volver a vista).
+    Refresco: manual, schedule (cada refresh_interval_seconds) u on_source_change.
+    Con watermark_column el refresco es incremental.
+    """
+    try:
+        status = transformation_service.set_materialization(transformation_id, config)
+        if not status:
+            raise HTTPException(status_code=404, detail="Transformación no encontrada")
+        return status
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/{transformation_id}/refresh", response_model=RefreshResult)
+def refresh_transformation(
+    transformation_id: int,
+    full: bool = False,
+    current_user: User = Depends(deps.get_current_active_superuser),
+    _slot = Depends(deps.admit(LANE_INGEST))
+) -> Any:
+    """
+    Refrescar una transformación materializada.
+    Usa `full=true` para reconstruir la tabla ignorando el watermark.
+    """
+    try:
+        result = transformation_service.refresh_transformation(transformation_id, full=full)
+        if not result:
+            raise HTTPException(status_code=404, detail="Transformación no encontrada")
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{transformation_id}/lineage", response_model=LineageNode)
+def get_transformation_lineage(
+    transformation_id: int,
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Dependencias de una transformación: de qué lee y qué se rompe o queda
+    desactualizado si cambia.
+    """
+    lineage = transformation_service.get_lineage(transformation_id)
+    if not lineage:
+        raise HTTPException(status_code=404, detail="Transformación no encontrada")
+    return lineage
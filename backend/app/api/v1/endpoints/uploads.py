@@ -0,0 +1,191 @@
+from typing import Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from app.api import deps
+from app.core.config import settings
+from app.models.user import User
+from app.schemas.ingest import ConversionProfile
+from app.services.data_loader import data_loader, FileInUseError
+from app.services.ingest_jobs import ingest_jobs, KIND_UPLOAD, KIND_CONVERT
+from app.services.query_scheduler import AdmissionError
+from app.services.upload_sessions import (
+    upload_sessions,
+    UploadSessionNotFoundError,
+    UploadChecksumError
+)
+
+router = APIRouter()
+
+REGISTER_FORMATS = ("csv", "parquet", "json")
+CONVERT_FORMATS = ("csv", "txt", "json", "xlsx", "xls", "avro", "orc")
+
+
+class UploadInitRequest(BaseModel):
+    filename: str
+    total_size: int = Field(..., gt=0)
+    chunk_size: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+class UploadCompleteRequest(BaseModel):
+    action: str = "register"  # 'register' or 'convert'
+    table_name: Optional[str] = None
+    dashboard_id: Optional[str] = None
+    storage_mode: Optional[str] = None
+    append_key: Optional[str] = None
+    sheet_name: Optional[str] = None  # Excel conversions: a sheet, or '*' for all
+    profile: Optional[ConversionProfile] = None  # Conversions: Parquet codec, row groups, sort order
+    background: bool = True  # False runs the job inside the request
+
+
+@router.post("/", status_code=201)
+def init_upload(
+    request: UploadInitRequest,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Start a chunked upload. The response says how many chunks of which size
+    to PUT; `sha256` (optional) is checked against the assembled file.
+    """
+    try:
+        return upload_sessions.init(
+            request.filename, request.total_size, request.chunk_size, request.sha256, current_user.email
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{session_id}")
+def get_upload(
+    session_id: str,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Upload progress. After a dropped connection, resend `missing_chunks`.
+    """
+    try:
+        return upload_sessions.status(session_id)
+    except UploadSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.put("/{session_id}/chunks/{index}")
+async def put_chunk(
+    session_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None),
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Upload chunk `index` as the raw request body (application/octet-stream).
+    The body is not spooled to a temp file: it goes straight to its offset in
+    the destination file. Send X-Chunk-SHA256 to have the chunk verified.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=413, detail="Chunk too large")
+    data = await request.body()
+    try:
+        return await run_in_threadpool(upload_sessions.put_chunk, session_id, index, data, x_chunk_sha256)
+    except UploadSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadChecksumError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/{session_id}/complete", status_code=201)
+def complete_upload(
+    session_id: str,
+    request: UploadCompleteRequest,
+    response: Response,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Verify the upload and hand the file to an ingest job: `register` loads it
+    as dataset `table_name` (CSVs are converted to Parquet first), `convert`
+    only converts it to Parquet. Returns 202 + job id (poll /datasets/jobs/{id})
+    unless background=false, which runs the job inside the request.
+    """
+    try:
+        status = upload_sessions.status(session_id)
+    except UploadSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    extension = status["filename"].rsplit(".", 1)[-1].lower()
+    if request.action == "register":
+        if not request.table_name:
+            raise HTTPException(status_code=400, detail="table_name is required to register a dataset")
+        if extension not in REGISTER_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Only {', '.join(REGISTER_FORMATS)} files can be registered")
+    elif request.action == "convert":
+        if extension not in CONVERT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file format. Supported: {', '.join(CONVERT_FORMATS)}")
+    else:
+        raise HTTPException(status_code=400, detail="action must be 'register' or 'convert'")
+
+    try:
+        data_loader.ensure_writable(
+            data_loader.upload_targets(status["filename"], convert=request.action == "convert"),
+            request.table_name if request.action == "register" else None
+        )
+    except FileInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    try:
+        file_path = upload_sessions.complete(session_id)
+    except UploadChecksumError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.action == "register":
+        job = ingest_jobs.create(KIND_UPLOAD, {
+            "file_path": file_path,
+            "original_filename": status["filename"],
+            "table_name": request.table_name,
+            "dashboard_id": request.dashboard_id,
+            "storage_mode": request.storage_mode,
+            "append_key": request.append_key,
+        }, current_user.email, phase="upload")
+    else:
+        job = ingest_jobs.create(KIND_CONVERT, {
+            "file_path": file_path,
+            "file_ext": extension,
+            "original_filename": status["filename"],
+            "sheet_name": request.sheet_name,
+            "profile": request.profile.dict() if request.profile else None,
+        }, current_user.email, phase="upload")
+
+    if request.background:
+        response.status_code = 202
+        job = ingest_jobs.submit(job.id)
+        return {"message": "Ingest job queued", "job_id": job.id, "status": job.status}
+
+    try:
+        result = ingest_jobs.run_inline(job.id, current_user.email)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process upload: {str(e)}")
+    return {**result, "job_id": job.id}
+
+
+@router.delete("/{session_id}", status_code=200)
+def abort_upload(
+    session_id: str,
+    current_user: User = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Abort an upload and delete the partial file.
+    """
+    try:
+        upload_sessions.abort(session_id)
+        return {"message": "Upload aborted"}
+    except UploadSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Dict, List, Union
 from pydantic import AnyHttpUrl, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -28,6 +28,83 @@ class Settings(BaseSettings):
     
     # DuckDB
     DUCKDB_PATH: str = ":memory:" # Use file path for persistence e.g., "bi_analytics.duckdb"
+    DUCKDB_POOL_SIZE: int = 16 # Max cursors checked out at once
+    DUCKDB_POOL_TIMEOUT: float = 30.0 # Seconds to wait for a free cursor before failing
+    DUCKDB_POOL_HEALTH_CHECK_INTERVAL: float = 60.0 # Idle seconds after which a cursor is pinged on checkout
+
+    # Statement timeouts enforced by the query watchdog, per user role (0 = no limit)
+    STATEMENT_TIMEOUTS: Dict[str, float] = {"admin": 0, "editor": 600, "viewer": 120}
+    STATEMENT_TIMEOUT_DEFAULT: float = 120.0
+
+    # Admission control: per-lane concurrency and wait-queue bounds (interactive > sandbox > ingest)
+    QUERY_LANE_CONCURRENCY: Dict[str, int] = {"interactive": 8, "sandbox": 2, "ingest": 2}
+    QUERY_LANE_QUEUE: Dict[str, int] = {"interactive": 64, "sandbox": 8, "ingest": 16}
+    QUERY_TOTAL_CONCURRENCY: int = 10 # Keep below DUCKDB_POOL_SIZE
+    QUERY_USER_CONCURRENCY: int = 4
+    QUERY_QUEUE_TIMEOUT: float = 30.0
+
+    # Query result cache (/sql/execute-secure)
+    QUERY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024 # 0 disables the cache
+    QUERY_CACHE_TTL_SECONDS: float = 600.0
+
+    # Server-side result cursors (/sql/cursors)
+    RESULT_CURSOR_IDLE_TIMEOUT: float = 300.0 # Seconds before an idle cursor is closed
+    RESULT_CURSOR_MAX_OPEN: int = 8 # Each open cursor holds a pooled connection
+    RESULT_CURSOR_MAX_PER_USER: int = 2
+    RESULT_PAGE_MAX_ROWS: int = 10000
+
+    # Dashboard render (/dashboards/{id}/render)
+    DASHBOARD_RENDER_WORKERS: int = 8
+
+    # Dataset registration: 'external' registers Parquet files as views read in place, 'table' copies them
+    DATASET_STORAGE_MODE: str = "external"
+
+    # Background ingest jobs (uploads, URL/local imports, conversions)
+    INGEST_WORKERS: int = 2
+    INGEST_MAX_QUEUED: int = 32
+
+    # Chunked, resumable uploads
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_MAX_CHUNK_SIZE: int = 64 * 1024 * 1024
+    UPLOAD_SESSION_TTL_HOURS: float = 24.0
+
+    # CSV schema inference: rows sampled by sniff_csv, and how many columns may be widened on load errors
+    CSV_INFERENCE_SAMPLE_ROWS: int = 20480
+    CSV_INFERENCE_MAX_WIDENINGS: int = 10
+
+    # Excel/Avro conversion streams rows into Parquet in chunks of this many rows
+    CONVERTER_CHUNK_ROWS: int = 65536
+    # Worker processes for batch conversions (0 = one per CPU core)
+    CONVERTER_PROCESSES: int = 0
+
+    # Disk cache of remote objects imported by URL, validated with ETag/Last-Modified
+    REMOTE_CACHE_DIR: str = "cache/remote"
+    REMOTE_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+    REMOTE_CACHE_BLOCK_SIZE: int = 1024 * 1024
+    REMOTE_CACHE_TIMEOUT: float = 30.0
+
+    # Loaded models kept in memory for predictions (LRU by count and by artifact bytes; 0 disables)
+    MODEL_CACHE_MAX_MODELS: int = 8
+    MODEL_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # Model training runs in worker processes; CPU threads each job may use (TF, XGBoost, sklearn)
+    TRAINING_WORKERS: int = 1
+    TRAINING_THREADS: int = 2
+    # Interrupted jobs (server restart) are queued again until they have been started this many times
+    TRAINING_MAX_ATTEMPTS: int = 2
+    # Rows sampled (in DuckDB) to train on; full_data TensorFlow jobs stream every row in minibatches
+    TRAINING_SAMPLE_ROWS: int = 50000
+    TRAINING_CHUNK_ROWS: int = 65536
+    TRAINING_BATCH_SIZE: int = 256
+    # Rows per record batch when a model scores a whole dataset table
+    SCORE_CHUNK_ROWS: int = 65536
+
+    # Materialized transformations
+    TRANSFORMATION_REFRESH_WORKERS: int = 2
+    TRANSFORMATION_SCHEDULER_INTERVAL: float = 30.0
+    # Previews over sources larger than the threshold run on a fixed-size sample
+    TRANSFORMATION_PREVIEW_SAMPLE_THRESHOLD: int = 1_000_000
+    TRANSFORMATION_PREVIEW_SAMPLE_ROWS: int = 100_000
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
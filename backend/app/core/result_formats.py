@@ -0,0 +1,150 @@
+import io
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import pyarrow as pa
+from pydantic_core import to_json
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.bi.columnar+json"
+
+FORMAT_ROWS = "rows"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_ARROW = "arrow"
+FORMATS = (FORMAT_ROWS, FORMAT_COLUMNAR, FORMAT_ARROW)
+
+# Rows per Arrow record batch pulled from DuckDB while streaming
+ARROW_BATCH_ROWS = 65536
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """
+    Pick the result format from an explicit `format` parameter or the Accept header.
+    Row-dict JSON stays the default.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in FORMATS:
+            raise ValueError(f"Unsupported format '{requested}'. Use one of: {', '.join(FORMATS)}")
+        return requested
+    accept = (accept or "").lower()
+    if ARROW_STREAM_MEDIA_TYPE in accept:
+        return FORMAT_ARROW
+    if COLUMNAR_JSON_MEDIA_TYPE in accept:
+        return FORMAT_COLUMNAR
+    return FORMAT_ROWS
+
+
+def dumps(payload: Any) -> bytes:
+    """
+    JSON encoding for query results with pydantic's serializer, skipping FastAPI's
+    per-value jsonable_encoder pass. Values come out as jsonable_encoder writes
+    them: timedeltas as seconds, DECIMAL as numbers (convert them first with
+    plain_rows, columnar_payload does it itself). NaN/inf become null.
+    """
+    return to_json(payload, timedelta_mode="float", inf_nan_mode="null", fallback=str)
+
+
+def _decimal_kind(value: Any) -> Optional[bool]:
+    """Whether a value is (or nests) a Decimal; None when it cannot tell (NULL, empty list)"""
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return True
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            kind = _decimal_kind(item)
+            if kind is not None:
+                return kind
+        return None
+    if isinstance(value, dict):
+        kinds = [_decimal_kind(item) for item in value.values()]
+        if any(kinds):
+            return True
+        return None if None in kinds else False
+    return False
+
+
+def _decimal_columns(rows: List[tuple]) -> List[int]:
+    """Indexes of the columns holding DECIMAL values (a column has a single type)"""
+    found = []
+    for index in range(len(rows[0]) if rows else 0):
+        for row in rows:
+            kind = _decimal_kind(row[index])
+            if kind is not None:
+                if kind:
+                    found.append(index)
+                break
+    return found
+
+
+def _plain(value: Any) -> Any:
+    """Decimal -> float, also inside lists and structs"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+
+def plain_rows(rows: List[tuple]) -> List[tuple]:
+    """Rows with their DECIMAL columns as floats; returned as is when there are none"""
+    indexes = set(_decimal_columns(rows))
+    if not indexes:
+        return rows
+    return [tuple(_plain(v) if i in indexes else v for i, v in enumerate(row)) for row in rows]
+
+
+def rows_payload(columns: List[str], rows: List[tuple]) -> List[Dict[str, Any]]:
+    """The default row-dict result, ready for dumps"""
+    return [dict(zip(columns, row)) for row in plain_rows(rows)]
+
+
+def columnar_payload(columns: List[str], rows: List[tuple]) -> Dict[str, Any]:
+    """{"columns": [...], "data": {col: [...]}} built without per-row dicts"""
+    if rows:
+        values = [list(col) for col in zip(*rows)]
+        for index in _decimal_columns(rows):
+            values[index] = [_plain(v) for v in values[index]]
+    else:
+        values = [[] for _ in columns]
+    return {"columns": columns, "data": dict(zip(columns, values))}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that collects what the Arrow IPC writer emits"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def arrow_stream(reader: pa.RecordBatchReader, on_close: Optional[Callable[[], None]] = None) -> Iterator[bytes]:
+    """
+    Encode a RecordBatchReader as an Arrow IPC stream, one chunk per record batch.
+    `on_close` runs once the stream ends or the client disconnects.
+    """
+    try:
+        sink = _ChunkSink()
+        with pa.ipc.new_stream(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                yield sink.drain()
+        # Schema-only streams (no batches) and the end-of-stream marker
+        tail = sink.drain()
+        if tail:
+            yield tail
+    finally:
+        if on_close is not None:
+            on_close()
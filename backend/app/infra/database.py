@@ -1,15 +1,257 @@
+import threading
+import time
 import duckdb
 from app.core.config import settings
 from app.core.security import get_password_hash
+from app.services.query_registry import query_registry, QueryCancelledError
+
+# Cursor methods that read a pending result: partial reads leave the rest of it
+# pending, lazy ones return a reader that keeps fetching after the call returns
+PARTIAL_FETCHES = frozenset({"fetchone", "fetchmany", "fetch_df_chunk"})
+LAZY_FETCHES = frozenset({"fetch_record_batch", "arrow", "to_arrow_reader"})
+FETCH_METHODS = PARTIAL_FETCHES | LAZY_FETCHES | frozenset({
+    "fetchall", "fetchdf", "fetch_df", "df", "fetchnumpy", "fetch_arrow_table",
+    "to_arrow_table", "pl", "tf", "torch",
+})
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection becomes free within the wait timeout"""
+
+
+class PooledConnection:
+    """
+    Proxy over a DuckDB cursor checked out from the pool.
+    Behaves like a regular connection, but close() hands the cursor back
+    to the pool instead of closing it.
+    """
+
+    def __init__(self, pool: "ConnectionPool", cursor):
+        self._pool = pool
+        self._cursor = cursor
+        # Request connections register their queries in the running-queries registry
+        self.tracked = False
+        self.user = None
+        self.role = None
+        self._query = None  # RunningQuery whose result is still being read
+
+    def _checked_out(self):
+        cursor = self.__dict__.get("_cursor")
+        if cursor is None:
+            raise duckdb.ConnectionException("Connection already returned to the pool")
+        return cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self._checked_out(), name)
+        if name in FETCH_METHODS and self.__dict__.get("_query") is not None:
+            return lambda *args, **kwargs: self._fetch(name, attr, *args, **kwargs)
+        return attr
+
+    def execute(self, query, parameters=None):
+        """
+        Tracked connections keep the query registered (cancellable, under the
+        statement timeout) until its result is drained or the connection is
+        released, and return this proxy so fetches go through _fetch.
+        """
+        cursor = self._checked_out()
+        if not self.tracked:
+            return cursor.execute(query, parameters)
+        self._finish()
+        self._query = query_registry.begin(cursor, query, self.user, self.role)
+        try:
+            cursor.execute(query, parameters)
+        except Exception as e:
+            self._finish(e)
+            raise
+        if cursor.description is None:
+            self._finish()
+        else:
+            self._query.pause()
+        return self
+
+    def _fetch(self, name, method, *args, **kwargs):
+        running = self._query
+        # DuckDB ignores interrupt() between fetches, so a cancel there is applied here
+        if running.cancel_reason:
+            self._finish()
+            raise QueryCancelledError(f"Query {running.cancel_reason}")
+        running.resume()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            self._finish(e)
+            raise
+        if name in LAZY_FETCHES:
+            # Read by the caller: stays running until the connection is released
+            return result
+        if name in PARTIAL_FETCHES and result is not None and len(result):
+            running.pause()
+        else:
+            self._finish()
+        return result
+
+    def _finish(self, error=None):
+        running, self._query = self.__dict__.get("_query"), None
+        if running is not None:
+            query_registry.finish(running, error)
+
+    def close(self):
+        # Unregister first: once released the cursor may run another request's query
+        self._finish()
+        cursor, self._cursor = self._cursor, None
+        if cursor is not None:
+            self._pool.release(cursor)
+
+    def detach(self) -> "PooledConnection":
+        """
+        Move the cursor (and its pending result) to a new handle that outlives
+        this one (e.g. for a streaming response); closing this handle then
+        becomes a no-op. Fetch the result through the new handle.
+        """
+        cursor, self._cursor = self._cursor, None
+        detached = PooledConnection(self._pool, cursor)
+        detached.tracked, detached.user, detached.role = self.tracked, self.user, self.role
+        detached._query, self._query = self._query, None
+        return detached
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DuckDB cursors over a single long-lived database handle.
+    Opening the database file and loading its catalog happens once; every
+    checkout only hands out an existing cursor (or creates a new one while
+    below the pool size).
+    """
+
+    def __init__(self, db_path: str, size: int, timeout: float, health_check_interval: float):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._root = None
+        self._idle = []  # (cursor, last_used) - LIFO keeps hot cursors in use
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    def _get_root(self):
+        # Opened lazily so importing the module never touches the database file
+        if self._root is None:
+            self._root = duckdb.connect(self.db_path)
+        return self._root
+
+    def _is_healthy(self, cursor) -> bool:
+        try:
+            cursor.execute("SELECT 1").fetchone()
+            return True
+        except duckdb.Error:
+            return False
+
+    def acquire(self, timeout: float = None) -> PooledConnection:
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"(pool size {self.size})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if self._idle:
+                cursor, last_used = self._idle.pop()
+            else:
+                cursor, last_used = None, None
+            self._in_use += 1
+
+        try:
+            stale = last_used is not None and time.monotonic() - last_used > self.health_check_interval
+            if cursor is not None and stale and not self._is_healthy(cursor):
+                self._discard(cursor)
+                cursor = None
+            if cursor is None:
+                with self._cond:
+                    cursor = self._get_root().cursor()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, cursor)
+
+    def release(self, cursor):
+        # Never hand a cursor with an open transaction to the next caller
+        try:
+            cursor.rollback()
+        except duckdb.TransactionException:
+            pass
+        except duckdb.Error:
+            self._discard(cursor)
+            cursor = None
+
+        with self._cond:
+            self._in_use -= 1
+            if cursor is not None:
+                if self._root is None:
+                    self._discard(cursor)
+                else:
+                    self._idle.append((cursor, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, cursor):
+        try:
+            cursor.close()
+        except duckdb.Error:
+            pass
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+            }
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            root, self._root = self._root, None
+        for cursor, _ in idle:
+            self._discard(cursor)
+        if root is not None:
+            root.close()
+
 
 class Database:
     def __init__(self):
         self.db_path = settings.DUCKDB_PATH
+        self.pool = ConnectionPool(
+            self.db_path,
+            size=settings.DUCKDB_POOL_SIZE,
+            timeout=settings.DUCKDB_POOL_TIMEOUT,
+            health_check_interval=settings.DUCKDB_POOL_HEALTH_CHECK_INTERVAL,
+        )
 
-    def get_connection(self):
-        # Create a new connection for each request/scope to ensure thread safety
-        conn = duckdb.connect(self.db_path)
-        return conn
+    def get_connection(self) -> PooledConnection:
+        # Check out a pooled cursor; conn.close() returns it to the pool
+        return self.pool.acquire()
+
+    def close(self):
+        self.pool.close()
 
     def init_db(self):
         conn = self.get_connection()
@@ -38,6 +280,85 @@ class Database:
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
             
+            CREATE TABLE IF NOT EXISTS transformation_lineage (
+                transformation_name VARCHAR NOT NULL,
+                upstream VARCHAR NOT NULL,
+                PRIMARY KEY (transformation_name, upstream)
+            );
+            
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                id VARCHAR PRIMARY KEY,
+                kind VARCHAR NOT NULL,
+                status VARCHAR NOT NULL,
+                phase VARCHAR NOT NULL,
+                params JSON,
+                bytes_total BIGINT,
+                bytes_read BIGINT DEFAULT 0,
+                rows_written BIGINT,
+                result JSON,
+                error VARCHAR,
+                attempts INTEGER DEFAULT 0,
+                created_by VARCHAR,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            );
+            
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id VARCHAR PRIMARY KEY,
+                filename VARCHAR NOT NULL,
+                total_size BIGINT NOT NULL,
+                chunk_size BIGINT NOT NULL,
+                sha256 VARCHAR,
+                detected_type VARCHAR,
+                status VARCHAR NOT NULL,
+                created_by VARCHAR,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS upload_chunks (
+                session_id VARCHAR NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                size BIGINT NOT NULL,
+                sha256 VARCHAR NOT NULL,
+                PRIMARY KEY (session_id, chunk_index)
+            );
+            
+            CREATE TABLE IF NOT EXISTS csv_schema_cache (
+                fingerprint VARCHAR PRIMARY KEY,
+                options JSON NOT NULL,
+                columns JSON NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            
+            CREATE TABLE IF NOT EXISTS remote_cache_entries (
+                url VARCHAR PRIMARY KEY,
+                etag VARCHAR,
+                last_modified VARCHAR,
+                size BIGINT,
+                accept_ranges BOOLEAN,
+                blocks INTEGER[],
+                fetched_at TIMESTAMP,
+                last_access TIMESTAMP
+            );
+            
+            CREATE TABLE IF NOT EXISTS training_jobs (
+                id VARCHAR PRIMARY KEY,
+                model_id VARCHAR NOT NULL,
+                kind VARCHAR NOT NULL,
+                status VARCHAR NOT NULL,
+                request JSON NOT NULL,
+                threads INTEGER,
+                pid INTEGER,
+                error VARCHAR,
+                attempts INTEGER DEFAULT 0,
+                cancel_requested BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            );
+            
             CREATE TABLE IF NOT EXISTS dashboards (
                 id VARCHAR PRIMARY KEY,
                 name VARCHAR NOT NULL,
@@ -68,6 +389,17 @@ class Database:
                 conn.execute("ALTER TABLE transformations ADD COLUMN dashboard_id VARCHAR")
             except:
                 pass
+
+            # Materialized transformations
+            for column in [
+                "materialized BOOLEAN DEFAULT FALSE",
+                "refresh_mode VARCHAR DEFAULT 'manual'",
+                "refresh_interval_seconds INTEGER",
+                "watermark_column VARCHAR",
+                "last_refreshed_at TIMESTAMP",
+                "last_watermark VARCHAR",
+            ]:
+                conn.execute(f"ALTER TABLE transformations ADD COLUMN IF NOT EXISTS {column}")
             
             # Seed Admin
             admin_email = "admin@dashboard.com"
@@ -87,6 +419,7 @@ db = Database()
 
 def get_db():
     conn = db.get_connection()
+    conn.tracked = True
     try:
         yield conn
     finally:
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -10,6 +10,14 @@ class TrainRequest(BaseModel):
     model_type: Optional[str] = "tensorflow" # 'random_forest', 'xgboost', 'tensorflow'
     epochs: Optional[int] = 10
     test_size: Optional[float] = 0.2
+    threads: Optional[int] = Field(default=None, ge=1, description="CPU threads for TF/XGBoost/sklearn (default TRAINING_THREADS)")
+    full_data: bool = Field(default=False, description="Train on every row in minibatches instead of a sample (tensorflow only)")
+
+    @validator('full_data')
+    def validate_full_data(cls, v, values):
+        if v and (values.get('model_type') or 'tensorflow') != 'tensorflow':
+            raise ValueError('full_data is only supported for tensorflow models')
+        return v
 
 class PredictionRequest(BaseModel):
     model_id: str
@@ -23,6 +31,15 @@ class PredictRangeRequest(BaseModel):
     # If not provided, will use mean/mode from training (if avail) or 0
     context_data: Optional[Dict[str, Any]] = None
 
+class ScoreTableRequest(BaseModel):
+    source_table: str
+    output_table: str
+    columns: Optional[List[str]] = Field(default=None, description="Source columns copied next to the predictions (default: all)")
+    prediction_column: str = "prediction"
+    dashboard_id: Optional[str] = None
+    storage_mode: Optional[str] = None  # 'table' or 'external'
+    background: bool = True  # False scores inside the request
+
 class ModelMetadata(BaseModel):
     id: str
     name: str
@@ -35,3 +52,18 @@ class ModelMetadata(BaseModel):
     created_at: datetime
     metrics: Optional[Dict[str, float]] = None
     error: Optional[str] = None
+
+class TrainingJob(BaseModel):
+    id: str
+    model_id: str
+    kind: str  # 'train', 'retrain'
+    status: str  # 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+    request: Dict[str, Any]
+    threads: Optional[int] = None
+    pid: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    cancel_requested: bool = False
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
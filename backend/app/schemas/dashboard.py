@@ -0,0 +1,20 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+
+class WidgetRenderResult(BaseModel):
+    """Resultado de la consulta de un widget dentro de un render de dashboard."""
+    id: str
+    type: str
+    title: Optional[str] = None
+    data: Optional[List[Dict[str, Any]]] = None
+    row_count: int = 0
+    elapsed_ms: float = 0
+    error: Optional[str] = None
+
+
+class DashboardRenderResponse(BaseModel):
+    """Datos de todos los widgets de un dashboard en una sola respuesta."""
+    dashboard_id: str
+    elapsed_ms: float
+    widgets: List[WidgetRenderResult]
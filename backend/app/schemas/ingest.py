@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field, validator
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+
+
+class IngestJob(BaseModel):
+    id: str
+    kind: str  # 'upload', 'local', 'url', 'convert', 'refresh', 'batch_convert', 'score'
+    status: str  # 'queued', 'running', 'succeeded', 'failed'
+    phase: str  # 'upload', 'compare', 'convert', 'register', 'append', 'score', 'done'
+    params: Dict[str, Any]
+    bytes_total: Optional[int] = None
+    bytes_read: int = 0
+    rows_written: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_by: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+COMPRESSION_CODECS = ["snappy", "zstd", "gzip", "lz4", "brotli", "none"]
+
+
+class ConversionProfile(BaseModel):
+    """Layout of the Parquet files written by the converter"""
+    compression: str = Field(default="snappy", description="snappy, zstd, gzip, lz4, brotli or none")
+    compression_level: Optional[int] = Field(default=None, description="Codec level, e.g. 1-22 for zstd")
+    row_group_size: Optional[int] = Field(default=None, ge=1024, description="Rows per row group")
+    dictionary: bool = True
+    sort_by: List[str] = Field(default=[], description="Columns to sort by, for tighter min/max statistics per row group")
+    statistics: bool = True
+
+    @validator('compression')
+    def validate_compression(cls, v):
+        v = v.lower()
+        if v not in COMPRESSION_CODECS:
+            raise ValueError(f'compression must be one of {COMPRESSION_CODECS}')
+        return v
+
+    @validator('compression_level')
+    def validate_compression_level(cls, v, values):
+        if v is not None and values.get('compression') != 'zstd':
+            raise ValueError('compression_level is only supported with zstd')
+        if v is not None and not 1 <= v <= 22:
+            raise ValueError('compression_level must be between 1 and 22')
+        return v
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, validator
+
+REFRESH_MODES = ["manual", "schedule", "on_source_change"]
+
+
+class MaterializationConfig(BaseModel):
+    """Cómo se materializa y refresca una transformación."""
+    materialized: bool = True
+    refresh_mode: str = Field(default="manual", description="manual, schedule u on_source_change")
+    refresh_interval_seconds: Optional[int] = Field(default=None, ge=60)
+    watermark_column: Optional[str] = Field(
+        default=None,
+        description="Columna creciente para refresco incremental de fuentes append-only"
+    )
+
+    @validator('refresh_mode')
+    def validate_refresh_mode(cls, v):
+        if v not in REFRESH_MODES:
+            raise ValueError(f'refresh_mode must be one of {REFRESH_MODES}')
+        return v
+
+    @validator('refresh_interval_seconds', always=True)
+    def validate_interval(cls, v, values):
+        if values.get('refresh_mode') == 'schedule' and not v:
+            raise ValueError('refresh_interval_seconds is required for scheduled refresh')
+        return v
+
+
+class MaterializationStatus(MaterializationConfig):
+    """Estado de materialización de una transformación."""
+    transformation_id: int
+    name: str
+    last_refreshed_at: Optional[datetime] = None
+    last_watermark: Optional[str] = None
+    row_count: Optional[int] = None
+
+
+class RefreshResult(BaseModel):
+    """Resultado de un refresco de una transformación materializada."""
+    transformation_id: int
+    name: str
+    mode: str  # 'full' | 'incremental'
+    rows_inserted: int
+    row_count: int
+    elapsed_ms: float
+
+
+class RefreshPlanResult(BaseModel):
+    """Resultado de refrescar varias transformaciones en orden de dependencias."""
+    order: List[str]
+    results: List[RefreshResult]
+    failed: Dict[str, str] = {}
+    skipped: List[str] = []
+    elapsed_ms: float
+
+
+class LineageNode(BaseModel):
+    """Dependencias de una transformación en el grafo de linaje."""
+    name: str
+    upstream: List[str]
+    downstream: List[str]
@@ -1,10 +1,15 @@
 import os
+import re
 import glob
 import json
+import time
 import uuid
 import joblib
 import pandas as pd
 import numpy as np
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
 import tensorflow as tf
 import xgboost as xgb
 from datetime import datetime
@@ -12,13 +17,32 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.metrics import mean_absolute_error, accuracy_score, r2_score
+from app.core.config import settings
 from app.infra.database import db
+from app.services.query_scheduler import query_scheduler, LANE_INGEST
+from app.services.model_registry import model_registry, InferenceBundle
+from app.services.feature_pipeline import FeaturePipeline
 from app.schemas.ai import TrainRequest, ModelMetadata
 
 MODELS_DIR = "models"
 if not os.path.exists(MODELS_DIR):
     os.makedirs(MODELS_DIR)
 
+# Up to this many rows a Keras model is called directly: model.predict() sets up a
+# batched input pipeline on every call, which dominates the latency of small requests
+KERAS_DIRECT_CALL_ROWS = 1024
+
+# Seed of the training sample and of the train/test split
+TRAINING_SEED = 42
+
+# full_data models hold out rows by hash of their values, in this many buckets;
+# sampled rows carry the flag so the test set is the held-out part of the sample
+HOLDOUT_BUCKETS = 10000
+HOLDOUT_COLUMN = "__holdout"
+
+# Table names accepted by score_table (they are interpolated into SQL)
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
 class TrainingProgressCallback(tf.keras.callbacks.Callback):
     def __init__(self, service, model_id, total_epochs):
         super().__init__()
@@ -54,6 +78,55 @@ class AIService:
     def _get_target_encoder_path(self, model_id: str):
         return os.path.join(self.models_dir, f"{model_id}_target_encoder.joblib")
 
+    def _artifact_paths(self, model_id: str):
+        return [self._get_metadata_path(model_id)] + [
+            os.path.join(self.models_dir, f"{model_id}{ext}")
+            for ext in ['.keras', '.joblib', '_scaler.joblib', '_scaler_y.joblib', '_encoders.joblib',
+                        '_target_encoder.joblib', '_feature_names.joblib', '_datetime_cols.joblib']
+        ]
+
+    def _load_bundle(self, model_id: str) -> InferenceBundle:
+        """Deserialize the model and its preprocessing artifacts from disk"""
+        with open(self._get_metadata_path(model_id), "r") as f:
+            meta = json.load(f)
+
+        if meta.get('model_type', 'tensorflow') == 'tensorflow':
+            model = tf.keras.models.load_model(os.path.join(self.models_dir, f"{model_id}.keras"))
+        else:
+            model = joblib.load(os.path.join(self.models_dir, f"{model_id}.joblib"))
+
+        scaler = joblib.load(self._get_scaler_path(model_id))
+        feature_names_path = os.path.join(self.models_dir, f"{model_id}_feature_names.joblib")
+        has_feature_names = os.path.exists(feature_names_path)
+        feature_names = joblib.load(feature_names_path) if has_feature_names else meta['feature_columns']
+        datetime_cols_path = os.path.join(self.models_dir, f"{model_id}_datetime_cols.joblib")
+        target_encoder_path = self._get_target_encoder_path(model_id)
+        scaler_y_path = self._get_scaler_y_path(model_id)
+
+        # Training means of the inputs, used by predict_range to fill features it is not given
+        feature_means = {}
+        if hasattr(scaler, 'mean_') and has_feature_names:
+            feature_means = {name: scaler.mean_[i] for i, name in enumerate(feature_names)}
+
+        encoders = joblib.load(self._get_encoders_path(model_id))
+        datetime_cols = joblib.load(datetime_cols_path) if os.path.exists(datetime_cols_path) else []
+        return InferenceBundle(
+            model_id=model_id,
+            meta=meta,
+            model=model,
+            scaler=scaler,
+            encoders=encoders,
+            feature_names=feature_names,
+            datetime_cols=datetime_cols,
+            target_encoder=joblib.load(target_encoder_path) if os.path.exists(target_encoder_path) else None,
+            scaler_y=joblib.load(scaler_y_path) if os.path.exists(scaler_y_path) else None,
+            feature_means=feature_means,
+            pipeline=FeaturePipeline(feature_names, encoders, datetime_cols, scaler),
+        )
+
+    def _get_bundle(self, model_id: str) -> InferenceBundle:
+        return model_registry.get(model_id, self._artifact_paths(model_id), lambda: self._load_bundle(model_id))
+
     def _update_progress(self, model_id: str, progress: float, status: str = "training", error: str = None):
         try:
             path = self._get_metadata_path(model_id)
@@ -98,6 +171,7 @@ class AIService:
         return model_id
 
     def retrain_model(self, model_id: str):
+        """Training request to retrain a model; does not touch it (see mark_retraining)"""
         metadata_path = self._get_metadata_path(model_id)
         if not os.path.exists(metadata_path):
             raise ValueError("Model not found")
@@ -105,7 +179,7 @@ class AIService:
         with open(metadata_path, "r") as f:
             data = json.load(f)
         
-        request = TrainRequest(
+        return TrainRequest(
             model_name=data['name'],
             dataset_name=data['dataset_name'],
             target_column=data['target_column'],
@@ -115,12 +189,14 @@ class AIService:
             epochs=data.get('epochs', 10) 
         )
 
-        metadata = ModelMetadata(**data)
+    def mark_retraining(self, model_id: str):
+        """Reset the model to training; only once its retrain job is accepted"""
+        with open(self._get_metadata_path(model_id), "r") as f:
+            metadata = ModelMetadata(**json.load(f))
         metadata.status = "training"
         metadata.progress = 0
         self._save_metadata(metadata)
-        
-        return request
+        model_registry.invalidate(model_id)
 
     def _determine_problem_type(self, df: pd.DataFrame, target_col: str) -> str:
         """
@@ -154,26 +230,120 @@ class AIService:
             print("DEBUG: Detected CLASSIFICATION (Textual/Categorical)")
             return "classification"
 
-    def _train_implementation(self, model_id: str, request: TrainRequest):
-        try:
-            # 1. Load Data
-            self._update_progress(model_id, 5) 
+    def training_query(self, request: TrainRequest, relation: str, sample: bool = True, exclude_holdout: bool = False) -> str:
+        """
+        SELECT of the columns a model trains on, with the sample drawn by DuckDB
+        (reservoir, seeded so retraining sees the same rows) instead of in pandas.
+        For full_data models a test_size share of rows is held out by hash of their
+        values: sampled rows carry HOLDOUT_COLUMN, and `exclude_holdout` drops the
+        held-out rows from the stream the network trains on.
+        """
+        columns = [c for c in request.feature_columns if c != request.target_column] + [request.target_column]
+        quoted = ['"' + c + '"' for c in columns]
+        select = ", ".join(quoted)
+        cut = int(round((request.test_size or 0) * HOLDOUT_BUCKETS))
+        holdout = f"(hash({', '.join(quoted)}) % {HOLDOUT_BUCKETS}) < {cut}"
+        if request.full_data and sample:
+            select += f', {holdout} AS "{HOLDOUT_COLUMN}"'
+        query = f"SELECT {select} FROM {relation}"
+        if request.full_data and exclude_holdout:
+            query += f" WHERE NOT {holdout}"
+        if sample:
+            query += f" USING SAMPLE reservoir({int(settings.TRAINING_SAMPLE_ROWS)} ROWS) REPEATABLE ({TRAINING_SEED})"
+        return query
+
+    def _to_frame(self, table: pa.Table) -> pd.DataFrame:
+        # DECIMAL columns would arrive as Python Decimal objects and be taken for categories
+        for i, field in enumerate(table.schema):
+            if pa.types.is_decimal(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+        return table.to_pandas()
+
+    def _load_training_data(self, request: TrainRequest, data_path: str = None, source_rows: int = None) -> tuple:
+        """
+        (sampled training frame, rows in the source). Workers read the Parquet
+        file staged for them (already projected; sampled unless full_data);
+        otherwise the dataset is read from the database.
+        """
+        if data_path:
+            conn = duckdb.connect()
+            try:
+                if source_rows is None:
+                    source_rows = conn.execute(f"SELECT count(*) FROM read_parquet('{data_path}')").fetchone()[0]
+                table = conn.execute(self.training_query(request, f"read_parquet('{data_path}')")).fetch_arrow_table()
+            finally:
+                conn.close()
+            return self._to_frame(table), source_rows
+
+        with query_scheduler.slot(LANE_INGEST):
             conn = db.get_connection()
             try:
-                query = f'SELECT * FROM "{request.dataset_name}"'
-                df = conn.execute(query).df()
+                source_rows = conn.execute(f'SELECT count(*) FROM "{request.dataset_name}"').fetchone()[0]
+                table = conn.execute(self.training_query(request, f'"{request.dataset_name}"')).fetch_arrow_table()
             finally:
                 conn.close()
+        return self._to_frame(table), source_rows
+
+    def _training_chunks(self, request: TrainRequest, data_path: str = None):
+        """Every training row (held-out rows excluded), as DataFrames of TRAINING_CHUNK_ROWS rows"""
+        if data_path:
+            conn = duckdb.connect()
+            relation = f"read_parquet('{data_path}')"
+        else:
+            conn = db.get_connection()
+            relation = f'"{request.dataset_name}"'
+        try:
+            query = self.training_query(request, relation, sample=False, exclude_holdout=True)
+            reader = conn.execute(query).fetch_record_batch(settings.TRAINING_CHUNK_ROWS)
+            for batch in reader:
+                yield self._to_frame(pa.Table.from_batches([batch]))
+        finally:
+            conn.close()
+
+    def _minibatches(self, request: TrainRequest, data_path: str, pipeline: FeaturePipeline, target_codes, scaler_y,
+                     rng: np.random.Generator):
+        """
+        (X, y) minibatches over the whole dataset for full_data training, preprocessed
+        with the encoders and scalers fitted on the sample. Rows whose class did not
+        appear in the sample are skipped. Rows are shuffled within each chunk so a
+        table sorted by time or class does not yield one-sided batches.
+        """
+        feature_cols = [c for c in request.feature_columns if c != request.target_column]
+        batch_size = settings.TRAINING_BATCH_SIZE
+        for chunk in self._training_chunks(request, data_path):
+            X = pipeline.transform(chunk[feature_cols]).astype(np.float32)
+            target = chunk[request.target_column]
+            if target_codes is not None:
+                y = target_codes.get_indexer(target.astype(str))
+                known = y >= 0
+                X, y = X[known], y[known]
+            else:
+                y = scaler_y.transform(pd.to_numeric(target, errors='coerce').fillna(0).values.reshape(-1, 1)).astype(np.float32)
+            order = rng.permutation(len(X))
+            X, y = X[order], y[order]
+            for start in range(0, len(X), batch_size):
+                yield X[start:start + batch_size], y[start:start + batch_size]
+
+    def _train_implementation(self, model_id: str, request: TrainRequest, data_path: str = None, threads: int = None,
+                              source_rows: int = None):
+        """
+        Train and save a model. Training workers pass `data_path`, a Parquet copy
+        of the dataset staged by the server process (workers cannot open the
+        database), `threads`, the CPU threads XGBoost/sklearn may use, and
+        `source_rows`, the size of the dataset the file was sampled from.
+        Only the feature and target columns are read, and the sample comes from
+        DuckDB. With full_data (TensorFlow) encoders and scalers are fitted on
+        the sample and the network then trains on every row in shuffled
+        minibatches, except the held-out rows its test metrics are computed on.
+        """
+        try:
+            # 1. Load Data
+            self._update_progress(model_id, 5) 
+            df, original_size = self._load_training_data(request, data_path, source_rows)
 
             if len(df) < 10:
                 raise ValueError(f"Dataset too small ({len(df)} rows). Need at least 10 rows.")
 
-            # --- OPTIMIZATION: Sampling for Large Datasets ---
-            original_size = len(df)
-            if len(df) > 50000:
-                print(f"Dataset too large ({len(df)} rows). Sampling 50k rows for training.")
-                df = df.sample(n=50000, random_state=42)
-            
             self._update_progress(model_id, 15) 
 
             # 2. Detect Problem Type
@@ -185,7 +355,7 @@ class AIService:
                 meta_dict = json.load(f)
             meta_dict['problem_type'] = problem_type
             meta_dict['original_rows'] = original_size
-            meta_dict['training_rows'] = len(df)
+            meta_dict['training_rows'] = original_size if request.full_data else len(df)
             with open(self._get_metadata_path(model_id), "w") as f:
                 json.dump(meta_dict, f)
 
@@ -247,7 +417,14 @@ class AIService:
                     y = y.ravel()
 
             # Split
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=request.test_size, random_state=42)
+            if request.full_data:
+                # The test set is the sampled rows the training stream leaves out
+                holdout = df[HOLDOUT_COLUMN].to_numpy(dtype=bool)
+                if holdout.all() or not holdout.any():
+                    raise ValueError("Not enough rows to hold out a test set; adjust test_size")
+                X_train, X_test, y_train, y_test = X[~holdout], X[holdout], y[~holdout], y[holdout]
+            else:
+                X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=request.test_size, random_state=42)
             self._update_progress(model_id, 35)
 
             # 5. Build & Train
@@ -257,26 +434,26 @@ class AIService:
 
             if model_type == 'xgboost':
                 if is_classification:
-                    trained_model = xgb.XGBClassifier(objective='multi:softmax' if output_units > 2 else 'binary:logistic', random_state=42)
+                    trained_model = xgb.XGBClassifier(objective='multi:softmax' if output_units > 2 else 'binary:logistic', random_state=42, n_jobs=threads)
                     self._update_progress(model_id, 40)
                     trained_model.fit(X_train, y_train)
                     y_pred = trained_model.predict(X_test)
                     metric_dict = {'accuracy': accuracy_score(y_test, y_pred)}
                 else:
-                    trained_model = xgb.XGBRegressor(objective='reg:squarederror', random_state=42)
+                    trained_model = xgb.XGBRegressor(objective='reg:squarederror', random_state=42, n_jobs=threads)
                     self._update_progress(model_id, 40)
                     trained_model.fit(X_train, y_train)
                     # Metrics calculated later with inverse transform
 
             elif model_type == 'random_forest':
                 if is_classification:
-                    trained_model = RandomForestClassifier(n_estimators=100, random_state=42)
+                    trained_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=threads)
                     self._update_progress(model_id, 40)
                     trained_model.fit(X_train, y_train)
                     y_pred = trained_model.predict(X_test)
                     metric_dict = {'accuracy': accuracy_score(y_test, y_pred)}
                 else:
-                    trained_model = RandomForestRegressor(n_estimators=100, random_state=42)
+                    trained_model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=threads)
                     self._update_progress(model_id, 40)
                     trained_model.fit(X_train, y_train)
 
@@ -298,13 +475,27 @@ class AIService:
                 trained_model.compile(optimizer='adam', loss=loss_fn, metrics=['accuracy'] if is_classification else ['mae'])
                 progress_callback = TrainingProgressCallback(self, model_id, request.epochs)
                 
-                history = trained_model.fit(
-                    X_train, y_train, 
-                    epochs=request.epochs, 
-                    validation_split=0.1, 
-                    verbose=0,
-                    callbacks=[progress_callback]
-                )
+                if request.full_data:
+                    # Every training row, streamed from DuckDB/Parquet; encoders and scalers were fitted on the sample
+                    pipeline = FeaturePipeline(features.columns.tolist(), encoders, datetime_cols, scaler)
+                    target_codes = pd.Index(le_target.classes_) if is_classification else None
+                    y_spec = tf.TensorSpec(shape=(None,), dtype=tf.int64) if is_classification else tf.TensorSpec(shape=(None, 1), dtype=tf.float32)
+                    rng = np.random.default_rng(TRAINING_SEED)
+                    # Batches are also mixed across a few chunks, in a new order every epoch
+                    shuffle_batches = max(1, 4 * settings.TRAINING_CHUNK_ROWS // settings.TRAINING_BATCH_SIZE)
+                    dataset = tf.data.Dataset.from_generator(
+                        lambda: self._minibatches(request, data_path, pipeline, target_codes, None if is_classification else scaler_y, rng),
+                        output_signature=(tf.TensorSpec(shape=(None, X.shape[1]), dtype=tf.float32), y_spec),
+                    ).shuffle(shuffle_batches, seed=TRAINING_SEED, reshuffle_each_iteration=True).prefetch(tf.data.AUTOTUNE)
+                    history = trained_model.fit(dataset, epochs=request.epochs, verbose=0, callbacks=[progress_callback])
+                else:
+                    history = trained_model.fit(
+                        X_train, y_train, 
+                        epochs=request.epochs, 
+                        validation_split=0.1, 
+                        verbose=0,
+                        callbacks=[progress_callback]
+                    )
 
                 if is_classification:
                     loss, acc = trained_model.evaluate(X_test, y_test, verbose=0)
@@ -354,6 +545,7 @@ class AIService:
             metadata.status = "completed"
             metadata.metrics = metric_dict
             self._save_metadata(metadata)
+            model_registry.invalidate(model_id)
             
             print(f"Model {model_id} completed. Metrics: {metric_dict}")
 
@@ -367,158 +559,172 @@ class AIService:
         except Exception as e:
             raise Exception(f"Prediction failed: {str(e)}")
 
-    def predict_batch(self, model_id: str, input_data: list):
-        try:
-            # Load Metadata
-            with open(self._get_metadata_path(model_id), "r") as f:
-                meta = json.load(f)
-            
-            model_type = meta.get('model_type', 'tensorflow')
-            problem_type = meta.get('problem_type', 'regression') # Default fallback
-            
-            # Load Model
-            if model_type == 'tensorflow':
-                model = tf.keras.models.load_model(os.path.join(self.models_dir, f"{model_id}.keras"))
-            else:
-                model = joblib.load(os.path.join(self.models_dir, f"{model_id}.joblib"))
-
-            # Load Artifacts
-            scaler = joblib.load(self._get_scaler_path(model_id))
-            encoders = joblib.load(self._get_encoders_path(model_id))
-            
-            feature_names_path = os.path.join(self.models_dir, f"{model_id}_feature_names.joblib")
-            if os.path.exists(feature_names_path):
-                final_feature_names = joblib.load(feature_names_path)
+    def _predict_arrays(self, bundle: InferenceBundle, X: np.ndarray) -> tuple:
+        """(decoded predictions, confidence scores) for rows already run through the pipeline"""
+        model = bundle.model
+        if bundle.model_type == 'tensorflow' and len(X) <= KERAS_DIRECT_CALL_ROWS:
+            raw_preds = model(X, training=False).numpy()
+        else:
+            raw_preds = model.predict(X)
+
+        # Force Classification if target encoder exists
+        if bundle.target_encoder is not None:
+            if bundle.model_type == 'tensorflow':
+                # Ensure 2D for argmax
+                if len(raw_preds.shape) == 1:
+                    raw_preds = raw_preds.reshape(1, -1)
+                pred_indices = np.argmax(raw_preds, axis=1)
+                confidences = np.max(raw_preds, axis=1)
             else:
-                final_feature_names = meta['feature_columns']
-
-            datetime_cols_path = os.path.join(self.models_dir, f"{model_id}_datetime_cols.joblib")
-            datetime_cols = joblib.load(datetime_cols_path) if os.path.exists(datetime_cols_path) else []
+                pred_indices = raw_preds.astype(int)
+                confidences = np.full(len(pred_indices), 0.8)
+            return bundle.target_encoder.inverse_transform(pred_indices), confidences
+
+        # Force Regression if Scaler Y exists OR if neither exists (Legacy Regression defaulting)
+        if bundle.scaler_y is not None:
+            if bundle.model_type != 'tensorflow':
+                raw_preds = raw_preds.reshape(-1, 1)
+            real_preds = bundle.scaler_y.inverse_transform(raw_preds).flatten()
+        else:
+            # Fallback for old regression models without Y-scaling or raw numeric prediction
+            real_preds = raw_preds.flatten()
+        real_preds = real_preds.astype(np.float64)
 
-            # Prepare DF
-            df = pd.DataFrame(input_data)
+        # Heuristic confidence from the test MAE
+        mae = (bundle.meta.get('metrics') or {}).get('mae', 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidences = np.where(real_preds != 0, np.maximum(0, 1 - mae / (np.abs(real_preds) + 1e-6)), 0.0)
+        return real_preds, confidences
 
-            # Preprocess Dates
-            for col in datetime_cols:
-                if col not in df.columns: continue
-                try:
-                    dt = pd.to_datetime(df[col], errors='coerce')
-                    df[f"{col}_month"] = dt.dt.month.fillna(1).astype(int)
-                    df[f"{col}_day"] = dt.dt.day.fillna(1).astype(int)
-                    df[f"{col}_dow"] = dt.dt.dayofweek.fillna(0).astype(int)
-                    df.drop(columns=[col], inplace=True)
-                except:
-                   pass
-
-            # Preprocess Encoders & Numerics
-            for col in df.columns:
-                if col in encoders:
-                    le = encoders[col]
-                    # Handle unseen labels by mapping to -1 or known class
-                    df[col] = df[col].astype(str).map(lambda x: le.transform([x])[0] if x in le.classes_ else -1).fillna(-1)
-                elif col in final_feature_names:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-            # Align Columns
-            for col in final_feature_names:
-                if col not in df.columns:
-                    df[col] = 0
-            df = df[final_feature_names]
+    def predict_batch(self, model_id: str, input_data: list):
+        try:
+            # Model and artifacts come from the registry; only a cold or changed model touches disk
+            bundle = self._get_bundle(model_id)
 
-            # Scale Input
-            X_input = scaler.transform(df)
+            # Dates, categorical codes, numerics, column order and scaling, vectorized per column
+            X_input = bundle.pipeline.transform(pd.DataFrame(input_data))
+            predictions, confidences = self._predict_arrays(bundle, X_input)
 
-            # Predict
-            raw_preds = model.predict(X_input)
-            results = []
+            if bundle.target_encoder is not None:
+                return [
+                    {"prediction": val, "confidence_score": float(conf)}
+                    for val, conf in zip(predictions, confidences)
+                ]
 
-            target_encoder_path = self._get_target_encoder_path(model_id)
-            scaler_y_path = self._get_scaler_y_path(model_id)
-            
-            # Force Classification if target encoder exists
-            if os.path.exists(target_encoder_path):
-                 le_target = joblib.load(target_encoder_path)
-                 
-                 if model_type == 'tensorflow':
-                      # Ensure 2D for argmax
-                      if len(raw_preds.shape) == 1:
-                           raw_preds = raw_preds.reshape(1, -1)
-                      pred_indices = np.argmax(raw_preds, axis=1)
-                      confidences = np.max(raw_preds, axis=1)
-                 else:
-                      pred_indices = raw_preds.astype(int)
-                      confidences = [0.8] * len(pred_indices)
-
-                 decoded = le_target.inverse_transform(pred_indices)
-                 
-                 for i, val in enumerate(decoded):
-                     results.append({
-                         "prediction": val,
-                         "confidence_score": float(confidences[i])
-                     })
-
-            # Force Regression if Scaler Y exists OR if neither exists (Legacy Regression defaulting)
-            else:
-                # REGRESSION
-                if os.path.exists(scaler_y_path):
-                     scaler_y = joblib.load(scaler_y_path)
-                     if model_type != 'tensorflow':
-                          raw_preds = raw_preds.reshape(-1, 1)
-                     real_preds = scaler_y.inverse_transform(raw_preds).flatten()
-                else:
-                     # Fallback for old regression models without Y-scaling or raw numeric prediction
-                     real_preds = raw_preds.flatten()
-                
-                # Metrics for confidence context
-                mae = meta.get('metrics', {}).get('mae', 0)
-                
-                for val in real_preds:
-                    val = float(val)
-                    # Heuristic confidence
-                    conf = max(0, 1 - (mae / (abs(val) + 1e-6))) if val != 0 else 0
-                    results.append({
-                        "prediction": val,
-                        "mae": mae,
-                        "confidence_score": conf
-                    })
-
-            return results
+            mae = (bundle.meta.get('metrics') or {}).get('mae', 0)
+            return [
+                {"prediction": float(val), "mae": mae, "confidence_score": float(conf)}
+                for val, conf in zip(predictions, confidences)
+            ]
 
         except Exception as e:
             raise Exception(f"Batch prediction failed: {str(e)}")
 
+    def score_table(self, model_id: str, source_table: str, output_table: str, columns: list = None,
+                    prediction_column: str = "prediction", dashboard_id: str = None, storage_mode: str = None,
+                    on_progress=None) -> dict:
+        """
+        Score every row of a dataset and register the predictions as a new dataset.
+        The source is streamed from DuckDB in record batches of SCORE_CHUNK_ROWS; each
+        batch goes through the cached pipeline and model and is appended to a Parquet
+        file, so memory stays bounded by one batch. `columns` (default: all) are copied
+        next to the prediction and its confidence. The caller holds the ingest lane.
+        """
+        # Not imported at module level: DataLoader opens the database, which training workers must not do
+        from app.services.data_loader import data_loader
+
+        for table_name in (source_table, output_table):
+            if not IDENTIFIER.match(table_name):
+                raise ValueError(f"Invalid table name '{table_name}'")
+        if output_table == source_table:
+            raise ValueError("The output table must be different from the source table")
+        try:
+            bundle = self._get_bundle(model_id)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Model '{model_id}' not found or not trained yet")
+        meta = bundle.meta
+        feature_cols = [c for c in meta['feature_columns'] if c != meta['target_column']]
+        confidence_column = f"{prediction_column}_confidence"
+
+        started = time.monotonic()
+        output_path = data_loader.upload_path(f"{output_table}.parquet")
+        data_loader.ensure_writable([output_path], output_table)
+        staged_path = output_path + ".tmp"
+        rows = 0
+        writer = None
+        conn = db.get_connection()
+        try:
+            try:
+                source_columns = [row[0] for row in conn.execute(f'DESCRIBE "{source_table}"').fetchall()]
+            except duckdb.CatalogException:
+                raise ValueError(f"Dataset '{source_table}' not found")
+            missing = [c for c in feature_cols if c not in source_columns]
+            if missing:
+                raise ValueError(f"Dataset '{source_table}' lacks the model's feature columns: {', '.join(missing)}")
+            keep = list(dict.fromkeys(columns)) if columns else source_columns
+            unknown = [c for c in keep if c not in source_columns]
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+            if prediction_column in keep or confidence_column in keep:
+                raise ValueError(f"Column '{prediction_column}' or '{confidence_column}' already exists; choose another prediction_column")
+
+            selected = keep + [c for c in feature_cols if c not in keep]
+            query = "SELECT " + ", ".join('"' + c.replace('"', '""') + '"' for c in selected) + f' FROM "{source_table}"'
+            reader = conn.execute(query).fetch_record_batch(settings.SCORE_CHUNK_ROWS)
+            for batch in reader:
+                table = pa.Table.from_batches([batch])
+                X = bundle.pipeline.transform(self._to_frame(table.select(feature_cols)))
+                predictions, confidences = self._predict_arrays(bundle, X)
+                scored = table.select(keep) \
+                    .append_column(prediction_column, pa.array(predictions)) \
+                    .append_column(confidence_column, pa.array(confidences, type=pa.float64()))
+                if writer is None:
+                    writer = pq.ParquetWriter(staged_path, scored.schema)
+                writer.write_table(scored)
+                rows += len(scored)
+                if on_progress:
+                    on_progress(rows)
+            if writer is None:
+                raise ValueError(f"Dataset '{source_table}' is empty")
+            writer.close()
+        except Exception:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+            raise
+        finally:
+            conn.close()
+        scoring_seconds = time.monotonic() - started
+
+        os.replace(staged_path, output_path)
+        data_loader.register_dataset_from_local_path(output_path, output_table, os.path.basename(output_path), dashboard_id, storage_mode)
+        seconds = time.monotonic() - started
+
+        return {
+            "table": output_table,
+            "source_table": source_table,
+            "model_id": model_id,
+            "rows": rows,
+            "columns": keep + [prediction_column, confidence_column],
+            "seconds": round(seconds, 3),
+            "scoring_seconds": round(scoring_seconds, 3),
+            "rows_per_second": round(rows / scoring_seconds, 1) if scoring_seconds > 0 else None,
+        }
+
     def _save_metadata(self, metadata: ModelMetadata):
         with open(self._get_metadata_path(metadata.id), "w") as f:
             f.write(metadata.model_dump_json())
 
     def predict_range(self, model_id: str, periods: int, frequency: str = 'D', context_data: dict = None):
         try:
-            # 1. Load Metadata & Artifacts
-            with open(self._get_metadata_path(model_id), "r") as f:
-                meta = json.load(f)
-            
-            model_type = meta.get('model_type', 'tensorflow')
-            # Load Model
-            if model_type == 'tensorflow':
-                model = tf.keras.models.load_model(os.path.join(self.models_dir, f"{model_id}.keras"))
-            else:
-                model = joblib.load(os.path.join(self.models_dir, f"{model_id}.joblib"))
+            # 1. Load Metadata & Artifacts (cached; predict_batch below reuses the same bundle)
+            bundle = self._get_bundle(model_id)
+            meta = bundle.meta
 
-            scaler = joblib.load(self._get_scaler_path(model_id))
-            
-            # Load Scalar Stats if available (for intelligent filling)
-            # We can use scaler.mean_ if it exists (for StandardScaler)
-            feature_means = {}
-            if hasattr(scaler, 'mean_'):
-                # We need feature names to map index to name
-                 feature_names_path = os.path.join(self.models_dir, f"{model_id}_feature_names.joblib")
-                 if os.path.exists(feature_names_path):
-                     feat_names = joblib.load(feature_names_path)
-                     for i, name in enumerate(feat_names):
-                         feature_means[name] = scaler.mean_[i]
-
-            datetime_cols_path = os.path.join(self.models_dir, f"{model_id}_datetime_cols.joblib")
-            datetime_cols = joblib.load(datetime_cols_path) if os.path.exists(datetime_cols_path) else []
+            # Scaler means (StandardScaler) fill the features that are not given
+            feature_means = bundle.feature_means
+            datetime_cols = bundle.datetime_cols
             
             # Relaxed check: If no datetime_cols, try to guess from feature columns or proceed without
             date_col = None
@@ -596,6 +802,7 @@ class AIService:
 
     def delete_model(self, model_id: str):
         try:
+            model_registry.invalidate(model_id)
             for ext in ['.keras', '.joblib', '_scaler.joblib', '_scaler_y.joblib', '_encoders.joblib', 
                        '_target_encoder.joblib', '_feature_names.joblib', '_datetime_cols.joblib', '_metadata.json']:
                 path = os.path.join(self.models_dir, f"{model_id}{ext}")
@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.schemas.ingest import ConversionProfile
+from app.services.data_converter import data_converter
+from app.services.schema_inference import schema_inference
+
+logger = logging.getLogger(__name__)
+
+CONVERT_EXTENSIONS = ("csv", "txt", "json", "xlsx", "xls", "avro", "orc")
+MB = 1024 * 1024
+
+
+def _init_worker(threads: int):
+    # Runs once in each worker process. Only the server process may open the
+    # application database, and DuckDB shares the cores with the other workers.
+    data_converter.threads = threads
+    schema_inference.persistent = False
+
+
+def _convert_file(input_path: str, file_type: str, sheet_name: Optional[str], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert one file inside a worker process; returns what the batch summary needs"""
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    parquet_path = data_converter.convert_to_parquet(
+        input_path, file_type, sheet_name=sheet_name, profile=ConversionProfile(**profile)
+    )
+    return {
+        "parquet_path": parquet_path,
+        "parquet_size": os.path.getsize(parquet_path),
+        "rows": data_converter.describe_layout(parquet_path)["rows"],
+        "seconds": time.monotonic() - started,
+        "cpu_seconds": time.process_time() - cpu_started,
+    }
+
+
+def file_type(path: str) -> str:
+    return path.rsplit('.', 1)[-1].lower()
+
+
+class BatchConverter:
+    """
+    Converts many files to Parquet at once. Excel and Avro decoding is pure
+    Python and holds the GIL, so files are fanned out across a pool of worker
+    processes (spawned, not forked: the server process holds DuckDB and thread
+    state) and every core converts a file. The pool is created on first use
+    and reused by later batches.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                threads = max(1, (os.cpu_count() or 1) // self.processes)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(threads,),
+                )
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        """Drop a pool whose worker died (e.g. killed for memory); the next batch starts a new one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def check_outputs(self, files: List[str]):
+        """Files that would write the same Parquet file (e.g. sales.csv and sales.json) cannot go in one batch"""
+        outputs: Dict[str, str] = {}
+        for path in files:
+            if file_type(path) not in CONVERT_EXTENSIONS:
+                raise ValueError(f"Unsupported file format: {os.path.basename(path)}")
+            output = path.rsplit('.', 1)[0] + '.parquet'
+            if output in outputs:
+                raise ValueError(f"'{outputs[output]}' and '{path}' would both be written to '{output}'")
+            outputs[output] = path
+
+    def convert(self, files: List[str], profile: ConversionProfile, sheet_name: Optional[str] = None,
+                on_file: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Convert `files` in parallel. `on_file` is called in this thread with each
+        file's outcome as it finishes. Failed files are reported, not raised.
+        """
+        self.check_outputs(files)
+        started = time.monotonic()
+        sizes = {path: os.path.getsize(path) for path in files}
+        pool = self._executor()
+        futures = {
+            pool.submit(_convert_file, path, file_type(path), sheet_name, profile.dict()): path
+            for path in files
+        }
+
+        entries = []
+        broken = False
+        for future in as_completed(futures):
+            path = futures[future]
+            entry: Dict[str, Any] = {"file": path, "format": file_type(path).upper(), "original_size": sizes[path]}
+            try:
+                outcome = future.result()
+                entry.update(
+                    status="succeeded",
+                    parquet_file=outcome["parquet_path"],
+                    parquet_size=outcome["parquet_size"],
+                    rows=outcome["rows"],
+                    seconds=round(outcome["seconds"], 3),
+                    cpu_seconds=round(outcome["cpu_seconds"], 3),
+                    throughput_mb_s=round(sizes[path] / MB / outcome["seconds"], 2) if outcome["seconds"] else None,
+                )
+            except BrokenProcessPool:
+                broken = True
+                entry.update(status="failed", error="Conversion worker process died")
+            except Exception as e:
+                entry.update(status="failed", error=str(e))
+            entries.append(entry)
+            if on_file:
+                on_file(entry)
+        if broken:
+            self._discard(pool)
+
+        elapsed = time.monotonic() - started
+        succeeded = [e for e in entries if e["status"] == "succeeded"]
+        original_bytes = sum(e["original_size"] for e in succeeded)
+        parquet_bytes = sum(e["parquet_size"] for e in succeeded)
+        entries.sort(key=lambda e: e["file"])
+        return {
+            "files": entries,
+            "summary": {
+                "files": len(entries),
+                "succeeded": len(succeeded),
+                "failed": len(entries) - len(succeeded),
+                "processes": min(self.processes, len(files)),
+                "rows": sum(e["rows"] for e in succeeded),
+                "original_size": original_bytes,
+                "parquet_size": parquet_bytes,
+                "size_reduction_percent": round((original_bytes - parquet_bytes) / original_bytes * 100, 2) if original_bytes else 0,
+                "seconds": round(elapsed, 3),
+                "cpu_seconds": round(sum(e["cpu_seconds"] for e in succeeded), 3),
+                "throughput_mb_s": round(sum(sizes.values()) / MB / elapsed, 2) if elapsed else None,
+            },
+        }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+batch_converter = BatchConverter(processes=settings.CONVERTER_PROCESSES)
@@ -1,12 +1,25 @@
 import uuid
 import json
-from typing import List, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+from app.core.config import settings
 from app.infra.database import db
 from app.models.dashboard import (
     Dashboard, DashboardCreate, DashboardUpdate,
     DashboardItem, DashboardItemCreate, DashboardLayoutUpdate
 )
+from app.schemas.dashboard import DashboardRenderResponse, WidgetRenderResult
+from app.schemas.query_builder import QueryBuilderRequest
+from app.services.query_service import query_service
+from app.services.query_scheduler import query_scheduler, LANE_INTERACTIVE
+
+# Pool compartido para ejecutar las consultas de los widgets en paralelo
+_render_executor = ThreadPoolExecutor(
+    max_workers=settings.DASHBOARD_RENDER_WORKERS,
+    thread_name_prefix="dashboard-render"
+)
 
 class DashboardService:
     """Servicio para gestionar dashboards y sus items"""
@@ -30,7 +43,7 @@ class DashboardService:
                 now
             ])
             
-            return self.get_dashboard(dashboard_id)
+            return self._fetch_dashboard(conn, dashboard_id)
         finally:
             conn.close()
 
@@ -38,40 +51,44 @@ class DashboardService:
         """Obtiene un dashboard y sus items por ID"""
         conn = db.get_connection()
         try:
-            # Obtener dashboard
-            query_dash = "SELECT id, name, description, created_at, updated_at FROM dashboards WHERE id = ?"
-            row = conn.execute(query_dash, [dashboard_id]).fetchone()
-            
-            if not row:
-                return None
-            
-            # Obtener items
-            query_items = "SELECT id, type, title, config, created_at FROM dashboard_items WHERE dashboard_id = ?"
-            item_rows = conn.execute(query_items, [dashboard_id]).fetchall()
-            
-            items = [
-                DashboardItem(
-                    id=item[0],
-                    dashboard_id=dashboard_id,
-                    type=item[1],
-                    title=item[2],
-                    config=json.loads(item[3]) if isinstance(item[3], str) else item[3],
-                    created_at=item[4]
-                )
-                for item in item_rows
-            ]
-            
-            return Dashboard(
-                id=row[0],
-                name=row[1],
-                description=row[2],
-                created_at=row[3],
-                updated_at=row[4],
-                items=items
-            )
+            return self._fetch_dashboard(conn, dashboard_id)
         finally:
             conn.close()
 
+    def _fetch_dashboard(self, conn, dashboard_id: str) -> Optional[Dashboard]:
+        """Lee un dashboard usando una conexión ya obtenida del pool"""
+        # Obtener dashboard
+        query_dash = "SELECT id, name, description, created_at, updated_at FROM dashboards WHERE id = ?"
+        row = conn.execute(query_dash, [dashboard_id]).fetchone()
+        
+        if not row:
+            return None
+        
+        # Obtener items
+        query_items = "SELECT id, type, title, config, created_at FROM dashboard_items WHERE dashboard_id = ?"
+        item_rows = conn.execute(query_items, [dashboard_id]).fetchall()
+        
+        items = [
+            DashboardItem(
+                id=item[0],
+                dashboard_id=dashboard_id,
+                type=item[1],
+                title=item[2],
+                config=json.loads(item[3]) if isinstance(item[3], str) else item[3],
+                created_at=item[4]
+            )
+            for item in item_rows
+        ]
+        
+        return Dashboard(
+            id=row[0],
+            name=row[1],
+            description=row[2],
+            created_at=row[3],
+            updated_at=row[4],
+            items=items
+        )
+
     def list_dashboards(self) -> List[Dashboard]:
         """Lista todos los dashboards (resumido, sin items)"""
         conn = db.get_connection()
@@ -130,7 +147,7 @@ class DashboardService:
             
             conn.commit()
             
-            return self.get_dashboard(dashboard_id)
+            return self._fetch_dashboard(conn, dashboard_id)
         except Exception as e:
             conn.rollback()
             raise e
@@ -159,7 +176,7 @@ class DashboardService:
                 dashboard_id
             ])
             
-            return self.get_dashboard(dashboard_id)
+            return self._fetch_dashboard(conn, dashboard_id)
         finally:
             conn.close()
 
@@ -188,4 +205,136 @@ class DashboardService:
         finally:
             conn.close()
 
+    def render_dashboard(self, dashboard_id: str, user: Optional[str] = None, role: Optional[str] = None) -> Optional[DashboardRenderResponse]:
+        """
+        Ejecuta las consultas de todos los widgets de un dashboard en paralelo.
+        Las consultas se atribuyen a `user`/`role`: cuentan para su límite de
+        concurrencia y para el registro y los timeouts de consultas en curso.
+        """
+        started = time.perf_counter()
+        dashboard = self.get_dashboard(dashboard_id)
+        if not dashboard:
+            return None
+
+        futures = [_render_executor.submit(self._render_item, item, user, role) for item in dashboard.items]
+        widgets = [future.result() for future in futures]
+
+        return DashboardRenderResponse(
+            dashboard_id=dashboard_id,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+            widgets=widgets
+        )
+
+    def _render_item(self, item: DashboardItem, user: Optional[str] = None, role: Optional[str] = None) -> WidgetRenderResult:
+        """Ejecuta la consulta de un widget; los errores quedan en el resultado del widget"""
+        started = time.perf_counter()
+        result = WidgetRenderResult(id=item.id, type=item.type, title=item.title)
+        if not item.config.get("dataset"):
+            return result
+
+        conn = None
+        try:
+            query_req = QueryBuilderRequest(**self.build_widget_query(item.config))
+            with query_scheduler.slot(LANE_INTERACTIVE, user):
+                conn = db.get_connection()
+                conn.tracked, conn.user, conn.role = True, user, role
+                columns, rows = query_service.execute_builder_query(conn, query_req)
+            result.data = [dict(zip(columns, row)) for row in rows]
+            result.row_count = len(rows)
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            if conn is not None:
+                conn.close()
+            result.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def build_widget_query(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Traduce la configuración de un widget a un QueryBuilderRequest.
+        Debe mantenerse alineado con buildSecureQuery (frontend/lib/utils.ts).
+        """
+        widget_type = config.get("type")
+        limit = config.get("limit")
+        query: Dict[str, Any] = {
+            "table": config.get("dataset"),
+            "columns": [],
+            "limit": limit if limit is not None else 100
+        }
+
+        order_by = config.get("orderBy")
+        has_order = bool(order_by) and order_by != "default_none"
+        direction = config.get("orderDirection") or "ASC"
+        aggregation = config.get("aggregation")
+        x_axis = config.get("xAxis")
+        y_axis = config.get("yAxis")
+        breakdown = config.get("breakdown")
+
+        if widget_type == "metric":
+            query["limit"] = 1
+            if aggregation == "COUNT":
+                query["columns"] = [{"function": "COUNT", "column": "*", "alias": "value"}]
+            elif aggregation == "NONE" or not aggregation:
+                query["columns"] = [{"column": y_axis, "alias": "value"}] if y_axis else ["*"]
+            else:
+                query["columns"] = [{"function": aggregation, "column": y_axis, "alias": "value"}]
+
+        elif widget_type == "chart":
+            query["columns"] = [x_axis]
+            if breakdown:
+                query["columns"].append(breakdown)
+
+            if aggregation == "NONE":
+                if y_axis:
+                    query["columns"].append({"column": y_axis, "alias": "value"})
+            else:
+                if aggregation == "COUNT":
+                    query["columns"].append({"function": "COUNT", "column": "*", "alias": "value"})
+                else:
+                    query["columns"].append({
+                        "function": aggregation or "SUM",
+                        "column": y_axis or "*",
+                        "alias": "value"
+                    })
+                query["groupBy"] = [x_axis] + ([breakdown] if breakdown else [])
+
+            if has_order:
+                sort_col = "value" if order_by == y_axis else order_by
+                query["orderBy"] = [{"column": sort_col, "direction": direction}]
+
+        elif widget_type == "table":
+            query["columns"] = ["*"]
+            if has_order:
+                query["orderBy"] = [{"column": order_by, "direction": direction}]
+            query["limit"] = limit if limit is not None else 10
+
+        elif widget_type == "map":
+            columns: List[Any] = []
+            lat_axis = config.get("latAxis")
+            lon_axis = config.get("lonAxis")
+            if lat_axis:
+                columns.append({"column": lat_axis, "alias": "lat"})
+            if lon_axis:
+                columns.append({"column": lon_axis, "alias": "lon"})
+            if config.get("labelAxis"):
+                columns.append({"column": config["labelAxis"], "alias": "label"})
+            else:
+                columns.append({"column": "'Point'", "alias": "label"})
+            if config.get("sizeAxis"):
+                columns.append({"column": config["sizeAxis"], "alias": "size"})
+            if config.get("colorColumn"):
+                columns.append({"column": config["colorColumn"], "alias": "color"})
+
+            tooltip_columns = config.get("tooltipColumns")
+            if tooltip_columns:
+                columns.extend(col for col in tooltip_columns if col not in (lat_axis, lon_axis))
+            elif tooltip_columns is None:
+                columns.append("*")
+
+            query["columns"] = columns
+            query["where"] = []
+            query["limit"] = limit if limit is not None else 1000
+
+        return query
+
 dashboard_service = DashboardService()
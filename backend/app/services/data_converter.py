@@ -1,21 +1,95 @@
 import duckdb
 import os
 import logging
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 import pandas as pd
 import pyarrow as pa
+import pyarrow.orc as orc
 import pyarrow.parquet as pq
 import fastavro
+import openpyxl
+from app.core.config import settings
+from app.schemas.ingest import ConversionProfile
+from app.services.schema_inference import schema_inference
+
+# sheet_name value that converts every sheet of a workbook, stacked, with the sheet name in SHEET_COLUMN
+SHEET_ALL = "*"
+SHEET_COLUMN = "_sheet"
+
+Chunk = Dict[str, List[Any]]
+
+# DuckDB spells "no compression" differently from the profile
+DUCKDB_CODECS = {"none": "uncompressed"}
+
+
+class _WidenColumn(Exception):
+    """A chunk has values that do not fit the column type inferred so far"""
+
+    def __init__(self, column: str, arrow_type: pa.DataType):
+        super().__init__(f"{column} -> {arrow_type}")
+        self.column = column
+        self.arrow_type = arrow_type
+
+
+class _ParquetSink:
+    """pq.ParquetWriter with the layout of a ConversionProfile, grouping batches into row groups of the requested size"""
+
+    def __init__(self, output_path: str, schema: pa.Schema, profile: ConversionProfile):
+        self.schema = schema
+        self._writer = pq.ParquetWriter(
+            output_path, schema,
+            compression=profile.compression,
+            compression_level=profile.compression_level,
+            use_dictionary=profile.dictionary,
+            write_statistics=profile.statistics,
+        )
+        self._row_group_size = profile.row_group_size
+        self._pending: List[pa.RecordBatch] = []
+        self._pending_rows = 0
+
+    def write(self, batch: pa.RecordBatch):
+        if not self._row_group_size:
+            # One row group per batch, as before profiles existed
+            self._writer.write_batch(batch)
+            return
+        self._pending.append(batch)
+        self._pending_rows += batch.num_rows
+        if self._pending_rows >= self._row_group_size:
+            table = pa.Table.from_batches(self._pending, schema=self.schema)
+            full = (table.num_rows // self._row_group_size) * self._row_group_size
+            self._writer.write_table(table.slice(0, full), row_group_size=self._row_group_size)
+            self._pending = table.slice(full).to_batches()
+            self._pending_rows = table.num_rows - full
+
+    def close(self):
+        try:
+            if self._pending_rows:
+                self._writer.write_table(pa.Table.from_batches(self._pending, schema=self.schema))
+        finally:
+            self._writer.close()
+
 
 class DataConverter:
-    def __init__(self):
+    def __init__(self, chunk_rows: int, threads: Optional[int] = None):
         self.logger = logging.getLogger(__name__)
+        self.chunk_rows = chunk_rows
+        # DuckDB threads per conversion; None lets DuckDB use every core
+        self.threads = threads
 
-    def convert_to_parquet(self, input_path: str, file_type: str, output_path: str = None) -> str:
+    def _connect(self):
+        return duckdb.connect(config={"threads": self.threads} if self.threads else {})
+
+    def convert_to_parquet(self, input_path: str, file_type: str, output_path: str = None, sheet_name: Optional[str] = None,
+                           profile: Optional[ConversionProfile] = None) -> str:
         """
         Converts various file formats to Parquet.
         Supported formats: csv, txt, json, xlsx, xls, avro, orc
+        For Excel, `sheet_name` picks a sheet (default: the first one) or '*' for all of them.
+        `profile` sets codec, row groups, dictionary, sort order and statistics (default: snappy).
         Returns the path to the generated Parquet file.
         """
+        profile = profile or ConversionProfile()
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Input file not found: {input_path}")
 
@@ -26,15 +100,11 @@ class DataConverter:
 
         try:
             if file_type in ['csv', 'txt']:
-                self._convert_csv(input_path, output_path)
+                self._convert_csv(input_path, output_path, profile)
             elif file_type == 'json':
-                self._convert_json(input_path, output_path)
-            elif file_type in ['xlsx', 'xls']:
-                self._convert_excel(input_path, output_path)
-            elif file_type == 'avro':
-                self._convert_avro(input_path, output_path)
-            elif file_type == 'orc':
-                self._convert_orc(input_path, output_path)
+                self._convert_json(input_path, output_path, profile)
+            elif file_type in ['xlsx', 'xls', 'avro', 'orc']:
+                self._convert_arrow(input_path, file_type, output_path, sheet_name, profile)
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
 
@@ -44,85 +114,311 @@ class DataConverter:
             self.logger.error(f"Conversion failed: {str(e)}")
             raise e
 
-    def _convert_csv(self, input_path: str, output_path: str):
+    # --- Layout ---
+
+    def _copy_statement(self, relation: str, output_path: str, profile: ConversionProfile) -> str:
+        """COPY of `relation` to Parquet with the sort order and writer options of the profile"""
+        order = ""
+        if profile.sort_by:
+            order = " ORDER BY " + ", ".join('"' + c.replace('"', '""') + '"' for c in profile.sort_by)
+        options = ["FORMAT 'parquet'", f"COMPRESSION '{DUCKDB_CODECS.get(profile.compression, profile.compression)}'"]
+        if profile.compression_level is not None:
+            options.append(f"COMPRESSION_LEVEL {int(profile.compression_level)}")
+        if profile.row_group_size:
+            options.append(f"ROW_GROUP_SIZE {int(profile.row_group_size)}")
+        if not profile.dictionary:
+            options.append("DICTIONARY_SIZE_LIMIT 0")
+        return f"COPY (SELECT * FROM {relation}{order}) TO '{output_path}' ({', '.join(options)})"
+
+    def _run_copy(self, run: Callable[[], Any], output_path: str, profile: ConversionProfile):
+        """Run a DuckDB COPY built with _copy_statement and apply what DuckDB cannot do itself"""
+        try:
+            run()
+        except duckdb.BinderException as e:
+            # Usually a sort_by column that does not exist
+            raise ValueError(str(e).splitlines()[0])
+        if not profile.statistics:
+            # DuckDB always writes column statistics; drop them with a pyarrow rewrite
+            self._rewrite(output_path, profile)
+
+    def _rewrite(self, parquet_path: str, profile: ConversionProfile):
+        """Write a Parquet file again through _ParquetSink, keeping its row group size"""
+        source = pq.ParquetFile(parquet_path)
+        if source.metadata.num_row_groups and not profile.row_group_size:
+            profile = profile.copy(update={"row_group_size": max(1024, source.metadata.row_group(0).num_rows)})
+        staged = parquet_path + ".rewrite"
+        sink = _ParquetSink(staged, source.schema_arrow, profile)
+        try:
+            for batch in source.iter_batches():
+                sink.write(batch)
+        finally:
+            sink.close()
+            source.close()
+        os.replace(staged, parquet_path)
+
+    def describe_layout(self, parquet_path: str) -> Dict[str, Any]:
+        """Row groups and per-column compressed/uncompressed sizes, codecs, encodings and statistics of a Parquet file"""
+        metadata = pq.ParquetFile(parquet_path).metadata
+        columns: Dict[str, Dict[str, Any]] = {}
+        for rg in range(metadata.num_row_groups):
+            row_group = metadata.row_group(rg)
+            for i in range(row_group.num_columns):
+                chunk = row_group.column(i)
+                entry = columns.setdefault(chunk.path_in_schema, {
+                    "name": chunk.path_in_schema,
+                    "compression": chunk.compression,
+                    "compressed_bytes": 0,
+                    "uncompressed_bytes": 0,
+                    "encodings": set(),
+                    "statistics": True,
+                })
+                entry["compressed_bytes"] += chunk.total_compressed_size
+                entry["uncompressed_bytes"] += chunk.total_uncompressed_size
+                entry["encodings"].update(chunk.encodings)
+                entry["statistics"] = entry["statistics"] and chunk.is_stats_set
+        for entry in columns.values():
+            entry["encodings"] = sorted(entry["encodings"])
+            entry["ratio"] = round(entry["uncompressed_bytes"] / entry["compressed_bytes"], 2) if entry["compressed_bytes"] else None
+        return {
+            "rows": metadata.num_rows,
+            "row_groups": metadata.num_row_groups,
+            "columns": list(columns.values()),
+        }
+
+    def _convert_csv(self, input_path: str, output_path: str, profile: ConversionProfile):
         """Convert CSV/TXT to Parquet using DuckDB (auto-detects delimiter: comma, semicolon, tab, pipe, etc.)"""
-        conn = duckdb.connect()
+        conn = self._connect()
         try:
-  
-            try:
-                query = f"""
-                COPY (
-                    SELECT * FROM read_csv_auto(
-                        '{input_path}',
-                        header=true,
-                        sample_size=-1,
-                        all_varchar=false
-                    )
-                )
-                TO '{output_path}' (FORMAT 'parquet');
-                """
-                conn.execute(query)
-                return
-            except Exception as e:
-                error_msg = str(e).lower()
-                if "invalid unicode" in error_msg or "utf-8" in error_msg:
-                    self.logger.warning(f"UTF-8 conversion failed, retrying with LATIN-1: {e}")
-                else:
-                    raise e
-
-            query = f"""
-            COPY (
-                SELECT * FROM read_csv_auto(
-                    '{input_path}',
-                    header=true,
-                    sample_size=-1,
-                    all_varchar=false,
-                    encoding='latin-1'
-                )
-            )
-            TO '{output_path}' (FORMAT 'parquet');
-            """
-            conn.execute(query)
-            
+            # Encoding, dialect and types come from a sample; see SchemaInferenceService
+            self._run_copy(lambda: schema_inference.load_csv(
+                conn, input_path,
+                lambda read_csv: self._copy_statement(read_csv, output_path, profile)
+            ), output_path, profile)
         finally:
             conn.close()
 
-    def _convert_json(self, input_path: str, output_path: str):
+    def _convert_json(self, input_path: str, output_path: str, profile: ConversionProfile):
         """Convert JSON to Parquet using DuckDB"""
-        conn = duckdb.connect()
+        conn = self._connect()
         try:
-            query = f"""
-            COPY (
-                SELECT * FROM read_json_auto('{input_path}')
-            )
-            TO '{output_path}' (FORMAT 'parquet');
-            """
-            conn.execute(query)
+            query = self._copy_statement(f"read_json_auto('{input_path}')", output_path, profile)
+            self._run_copy(lambda: conn.execute(query), output_path, profile)
         finally:
             conn.close()
 
-    def _convert_excel(self, input_path: str, output_path: str):
-        """Convert Excel to Parquet using pandas"""
+    def _convert_arrow(self, input_path: str, file_type: str, output_path: str, sheet_name: Optional[str], profile: ConversionProfile):
+        """Excel, Avro and ORC are written with pyarrow; a sort order goes through a DuckDB COPY of a staged file"""
+        target = output_path + ".unsorted" if profile.sort_by else output_path
+        write_profile = ConversionProfile() if profile.sort_by else profile
+        try:
+            if file_type in ['xlsx', 'xls']:
+                self._convert_excel(input_path, target, sheet_name, write_profile)
+            elif file_type == 'avro':
+                self._convert_avro(input_path, target, write_profile)
+            else:
+                self._convert_orc(input_path, target, write_profile)
+            if profile.sort_by:
+                conn = self._connect()
+                try:
+                    query = self._copy_statement(f"read_parquet('{target}')", output_path, profile)
+                    self._run_copy(lambda: conn.execute(query), output_path, profile)
+                finally:
+                    conn.close()
+        finally:
+            if target != output_path and os.path.exists(target):
+                os.remove(target)
+
+    # --- Streaming writer (Excel, Avro) ---
+
+    def _infer_type(self, values: List[Any]) -> Optional[pa.DataType]:
+        try:
+            arrow_type = pa.array(values).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            return pa.string()
+        return None if pa.types.is_null(arrow_type) else arrow_type
+
+    def _unify(self, a: Optional[pa.DataType], b: Optional[pa.DataType]) -> Optional[pa.DataType]:
+        """Narrowest type that holds values of both types"""
+        if a is None or b is None or a == b:
+            return a or b
+        if pa.types.is_integer(a) and pa.types.is_integer(b):
+            return pa.int64()
+        if (pa.types.is_integer(a) or pa.types.is_floating(a)) and (pa.types.is_integer(b) or pa.types.is_floating(b)):
+            return pa.float64()
+        if all(pa.types.is_timestamp(t) or pa.types.is_date(t) for t in (a, b)):
+            return pa.timestamp("us")
+        return pa.string()
+
+    def _to_array(self, values: List[Any], field: pa.Field) -> pa.Array:
+        if pa.types.is_string(field.type):
+            try:
+                return pa.array(values, type=field.type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                # Anything can go into a text column
+                return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+        try:
+            # Infer, then cast safely: pa.array(values, type=int64) would silently truncate floats
+            array = pa.array(values)
+            return array if array.type == field.type else array.cast(field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError):
+            widened = self._unify(field.type, self._infer_type(values))
+            raise _WidenColumn(field.name, pa.string() if widened == field.type else widened)
+
+    def _write_chunks(self, output_path: str, schema: pa.Schema, chunks: Iterable[Chunk], profile: ConversionProfile):
+        sink = _ParquetSink(output_path, schema, profile)
+        try:
+            for chunk in chunks:
+                rows = len(next(iter(chunk.values()), []))
+                arrays = [self._to_array(chunk.get(field.name) or [None] * rows, field) for field in schema]
+                sink.write(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        finally:
+            sink.close()
+
+    def _write_stream(self, output_path: str, columns: List[str], open_sources: Callable[[], List[Iterator[Chunk]]],
+                      profile: ConversionProfile):
+        """
+        Write chunks of rows to Parquet one record batch at a time, so memory
+        holds about one chunk per source whatever the file size. Column types
+        come from the first chunk of each source (e.g. each sheet); when a later
+        chunk does not fit, only that column is widened and the file is written again.
+        """
+        sources = open_sources()
+        heads = [next(source, None) for source in sources]
+        types: Dict[str, Optional[pa.DataType]] = {}
+        for chunk in heads:
+            for name in columns:
+                if chunk and chunk.get(name):
+                    types[name] = self._unify(types.get(name), self._infer_type(chunk[name]))
+        # The first pass goes on from the sampled chunks instead of reading them again
+        chunks = itertools.chain.from_iterable(
+            itertools.chain([head] if head else [], source) for head, source in zip(heads, sources)
+        )
+
+        # Each widening moves a column up the type lattice, so this terminates
+        while True:
+            schema = pa.schema([(name, types.get(name) or pa.string()) for name in columns])
+            try:
+                self._write_chunks(output_path, schema, chunks, profile)
+                return
+            except _WidenColumn as e:
+                self.logger.info(f"Column '{e.column}' widened to {e.arrow_type}, rewriting {output_path}")
+                types[e.column] = e.arrow_type
+                chunks = itertools.chain.from_iterable(open_sources())
+
+    def _chunked(self, rows: Iterable[Any], to_chunk: Callable[[List[Any]], Chunk]) -> Iterator[Chunk]:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.chunk_rows:
+                yield to_chunk(batch)
+                batch = []
+        if batch:
+            yield to_chunk(batch)
 
-        df = pd.read_excel(input_path)
-        df.to_parquet(output_path, engine='pyarrow', index=False)
+    # --- Excel ---
+
+    def _excel_header(self, worksheet) -> List[str]:
+        """Column names as pandas would give them: 'Unnamed: i' for blanks, '.n' suffix for duplicates"""
+        header = next(worksheet.iter_rows(max_row=1, values_only=True), ())
+        names, seen = [], {}
+        for i, value in enumerate(header):
+            name = f"Unnamed: {i}" if value is None else str(value)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            names.append(name)
+        return names
+
+    def _excel_chunks(self, workbook, sheets: List[str], headers: Dict[str, List[str]], stacked: bool) -> Iterator[Chunk]:
+        for sheet in sheets:
+            header = headers[sheet]
+            width = len(header)
+            # Blank rows are skipped, as pd.read_excel does
+            rows = (
+                row for row in workbook[sheet].iter_rows(min_row=2, max_col=width, values_only=True)
+                if any(value is not None for value in row)
+            )
 
-    def _convert_avro(self, input_path: str, output_path: str):
-        """Convert Avro to Parquet using fastavro and pandas"""
-        records = []
+            def to_chunk(batch: List[tuple], header=header, sheet=sheet) -> Chunk:
+                padded = [row + (None,) * (width - len(row)) for row in batch]
+                chunk = dict(zip(header, map(list, zip(*padded))))
+                if stacked:
+                    chunk[SHEET_COLUMN] = [sheet] * len(batch)
+                return chunk
+
+            yield from self._chunked(rows, to_chunk)
+
+    def _convert_excel(self, input_path: str, output_path: str, sheet_name: Optional[str], profile: ConversionProfile):
+        """Convert Excel to Parquet, streaming rows with openpyxl in read-only mode"""
+        if input_path.lower().endswith(".xls"):
+            # Legacy .xls has no streaming reader (and is capped at 65536 rows per sheet)
+            frames = pd.read_excel(input_path, sheet_name=None if sheet_name == SHEET_ALL else (sheet_name or 0))
+            if isinstance(frames, dict):
+                frames = pd.concat([df.assign(**{SHEET_COLUMN: name}) for name, df in frames.items()], ignore_index=True)
+            table = pa.Table.from_pandas(frames, preserve_index=False)
+            sink = _ParquetSink(output_path, table.schema, profile)
+            try:
+                for batch in table.to_batches(max_chunksize=self.chunk_rows):
+                    sink.write(batch)
+            finally:
+                sink.close()
+            return
+
+        workbook = openpyxl.load_workbook(input_path, read_only=True, data_only=True)
+        try:
+            if sheet_name == SHEET_ALL:
+                sheets = workbook.sheetnames
+            elif sheet_name:
+                if sheet_name not in workbook.sheetnames:
+                    raise ValueError(f"Sheet '{sheet_name}' not found. Available: {', '.join(workbook.sheetnames)}")
+                sheets = [sheet_name]
+            else:
+                sheets = workbook.sheetnames[:1]
+            stacked = sheet_name == SHEET_ALL
+
+            headers = {sheet: self._excel_header(workbook[sheet]) for sheet in sheets}
+            columns = list(dict.fromkeys(name for sheet in sheets for name in headers[sheet]))
+            if stacked:
+                columns.append(SHEET_COLUMN)
+            self._write_stream(output_path, columns, lambda: [
+                self._excel_chunks(workbook, [sheet], headers, stacked) for sheet in sheets
+            ], profile)
+        finally:
+            workbook.close()
+
+    # --- Avro ---
+
+    def _avro_chunks(self, input_path: str, columns: List[str]) -> Iterator[Chunk]:
+        with open(input_path, 'rb') as f:
+            records = (record for block in fastavro.block_reader(f) for record in block)
+            yield from self._chunked(records, lambda batch: {name: [r.get(name) for r in batch] for name in columns})
+
+    def _convert_avro(self, input_path: str, output_path: str, profile: ConversionProfile):
+        """Convert Avro to Parquet, decoding fastavro blocks into bounded chunks"""
         with open(input_path, 'rb') as f:
             reader = fastavro.reader(f)
-            for record in reader:
-                records.append(record)
-        
-        df = pd.DataFrame(records)
-        df.to_parquet(output_path, engine='pyarrow', index=False)
-
-    def _convert_orc(self, input_path: str, output_path: str):
-        """Convert ORC to Parquet using pyarrow"""
-   
-        table = pa.orc.ORCFile(input_path).read()
-        pq.write_table(table, output_path)
+            schema = reader.writer_schema
+            if isinstance(schema, dict) and schema.get("type") == "record":
+                columns = [field["name"] for field in schema["fields"]]
+            else:
+                first = next(reader, None)
+                columns = list(first) if isinstance(first, dict) else []
+        if not columns:
+            raise ValueError("Only Avro files of records can be converted")
+
+        self._write_stream(output_path, columns, lambda: [self._avro_chunks(input_path, columns)], profile)
+
+    def _convert_orc(self, input_path: str, output_path: str, profile: ConversionProfile):
+        """Convert ORC to Parquet using pyarrow, one stripe at a time"""
+        orc_file = orc.ORCFile(input_path)
+        sink = _ParquetSink(output_path, orc_file.schema, profile)
+        try:
+            for stripe in range(orc_file.nstripes):
+                sink.write(orc_file.read_stripe(stripe))
+        finally:
+            sink.close()
 
     def convert_csv_to_parquet(self, csv_path: str, output_path: str = None) -> str:
         """
@@ -130,4 +426,4 @@ class DataConverter:
         """
         return self.convert_to_parquet(csv_path, 'csv', output_path)
 
-data_converter = DataConverter()
+data_converter = DataConverter(chunk_rows=settings.CONVERTER_CHUNK_ROWS)
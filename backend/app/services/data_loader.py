@@ -1,12 +1,43 @@
 import os
+import glob
 import shutil
-from typing import List, Dict, Optional
+import hashlib
+import logging
+import tempfile
+from typing import Any, List, Dict, Optional
 from fastapi import UploadFile
+from app.core.config import settings
 from app.infra.database import db
+from app.services.lineage_service import lineage_service
+from app.services.remote_cache import remote_cache
+from app.services.schema_inference import schema_inference, CsvSchema
+from app.services.transformation_service import transformation_service
 from datetime import datetime
 
 UPLOAD_DIR = "uploads"
 
+# Storage modes: 'table' copies the data into DuckDB, 'external' is a view that reads the Parquet file in place
+STORAGE_TABLE = "table"
+STORAGE_EXTERNAL = "external"
+STORAGE_MODES = (STORAGE_TABLE, STORAGE_EXTERNAL)
+
+# Outcome of comparing a re-ingested file with what the dataset was loaded from
+REINGEST_UNCHANGED = "unchanged"
+REINGEST_APPEND = "append"
+REINGEST_REPLACE = "replace"
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+GLOB_CHARS = ("*", "?", "[")
+MULTI_FILE_EXTENSIONS = (".parquet", ".csv")
+
+logger = logging.getLogger(__name__)
+
+
+class FileInUseError(RuntimeError):
+    """The file backs an external dataset and cannot be deleted"""
+
+
 class DataLoader:
     def __init__(self):
         os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -30,53 +61,133 @@ class DataLoader:
                 conn.execute("ALTER TABLE dataset_metadata ADD COLUMN dashboard_id VARCHAR")
             except:
                 pass
+
+            conn.execute("ALTER TABLE dataset_metadata ADD COLUMN IF NOT EXISTS storage_mode VARCHAR DEFAULT 'table'")
+            conn.execute("ALTER TABLE dataset_metadata ADD COLUMN IF NOT EXISTS source_path VARCHAR")
+
+            # Content tracking for incremental re-ingest
+            for column in [
+                "content_hash VARCHAR",
+                "file_size BIGINT",
+                "file_mtime TIMESTAMP",
+                "row_count BIGINT",
+                "segment_paths VARCHAR[]",
+            ]:
+                conn.execute(f"ALTER TABLE dataset_metadata ADD COLUMN IF NOT EXISTS {column}")
+
+            # Multi-file datasets: the glob they were registered from and the files loaded so far
+            conn.execute("ALTER TABLE dataset_metadata ADD COLUMN IF NOT EXISTS source_pattern VARCHAR")
+            conn.execute("ALTER TABLE dataset_metadata ADD COLUMN IF NOT EXISTS hive_partitioning BOOLEAN")
+            conn.execute("ALTER TABLE dataset_metadata ADD COLUMN IF NOT EXISTS source_url VARCHAR")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dataset_files (
+                    table_name VARCHAR NOT NULL,
+                    path VARCHAR NOT NULL,
+                    size BIGINT,
+                    mtime TIMESTAMP,
+                    PRIMARY KEY (table_name, path)
+                )
+            """)
                 
         finally:
             conn.close()
 
+    def upload_path(self, filename: str) -> str:
+        return os.path.join(UPLOAD_DIR, filename)
+
+    def upload_targets(self, filename: str, convert: bool = False) -> List[str]:
+        """
+        Files written when `filename` is uploaded: the file itself plus its Parquet
+        conversion (CSVs are converted on registration; any format when `convert`)
+        """
+        file_path = self.upload_path(filename)
+        targets = [file_path]
+        extension = filename.rsplit(".", 1)[-1].lower()
+        if extension != "parquet" and (convert or extension == "csv"):
+            targets.append(file_path.rsplit(".", 1)[0] + ".parquet")
+        return targets
+
+    def file_owner(self, file_path: str, exclude_table: Optional[str] = None) -> Optional[str]:
+        """External dataset (other than `exclude_table`) that reads `file_path` in place, if any"""
+        full_path = os.path.abspath(file_path)
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT table_name FROM dataset_metadata WHERE storage_mode = 'external' "
+                "AND (source_path = ? OR list_contains(segment_paths, ?) OR table_name IN "
+                "(SELECT table_name FROM dataset_files WHERE path = ?)) "
+                "AND table_name IS DISTINCT FROM ? LIMIT 1",
+                (full_path, full_path, full_path, exclude_table)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def ensure_writable(self, file_paths: List[str], table_name: Optional[str] = None):
+        """
+        Raise FileInUseError if any of `file_paths` is read in place by a dataset other
+        than `table_name`: overwriting it would silently replace that dataset's data
+        without invalidating its cached results or dependents.
+        """
+        for file_path in file_paths:
+            owner = self.file_owner(file_path, table_name)
+            if owner:
+                raise FileInUseError(
+                    f"File '{os.path.basename(file_path)}' is read in place by dataset '{owner}'. "
+                    "Use another file name or delete the dataset first."
+                )
+
     def save_file(self, file: UploadFile) -> str:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+        file_path = self.upload_path(file.filename)
+        self.ensure_writable([file_path])
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         return file_path
 
-    def register_dataset(self, table_name: str, file_path: str, original_filename: str = None, dashboard_id: str = None):
-        self.register_dataset_from_local_path(file_path, table_name, original_filename, dashboard_id)
+    def register_dataset(self, table_name: str, file_path: str, original_filename: str = None, dashboard_id: str = None, storage_mode: str = None):
+        self.register_dataset_from_local_path(file_path, table_name, original_filename, dashboard_id, storage_mode)
+
+    def _replace_relation(self, conn, table_name: str, kind: str):
+        """Drop `table_name` if it exists as a different kind ('VIEW' or 'BASE TABLE')
+        since DuckDB cannot CREATE OR REPLACE a table over a view or vice versa"""
+        result = conn.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_name = ? AND table_schema = 'main'",
+            (table_name,)
+        ).fetchone()
+        if result and result[0] != kind:
+            conn.execute(f"DROP {'VIEW' if result[0] == 'VIEW' else 'TABLE'} {table_name}")
+
+    def register_dataset_from_local_path(self, file_path: str, table_name: str, original_filename: str = None, dashboard_id: str = None, storage_mode: str = None):
+        """
+        Register a dataset existing in the local filesystem.
+        Parquet files use DATASET_STORAGE_MODE by default: in 'external' mode the
+        dataset is a view over the file, so nothing is copied and DuckDB pushes
+        projections and filters down into the Parquet reader.
+        """
+        storage_mode = storage_mode or settings.DATASET_STORAGE_MODE
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Invalid storage mode '{storage_mode}'. Use one of: {', '.join(STORAGE_MODES)}")
+        # Only Parquet is cheap enough to read in place on every query
+        if not file_path.endswith(".parquet"):
+            storage_mode = STORAGE_TABLE
+        source_path = os.path.abspath(file_path) if storage_mode == STORAGE_EXTERNAL else None
 
-    def register_dataset_from_local_path(self, file_path: str, table_name: str, original_filename: str = None, dashboard_id: str = None):
-        """Register a dataset existing in the local filesystem"""
         conn = db.get_connection()
         try:
+            self._replace_relation(conn, table_name, 'VIEW' if storage_mode == STORAGE_EXTERNAL else 'BASE TABLE')
+
             # Determine file type
-            if file_path.endswith(".csv"):
- 
-                try:
-                    query = f"""
-                    CREATE OR REPLACE TABLE {table_name} AS 
-                    SELECT * FROM read_csv_auto(
-                        '{file_path}',
-                        header=true,
-                        sample_size=-1,
-                        all_varchar=false
-                    )
-                    """
-                    conn.execute(query)
-                except Exception as e:
-           
-                    if "invalid unicode" in str(e).lower() or "utf-8" in str(e).lower():
-                        query = f"""
-                        CREATE OR REPLACE TABLE {table_name} AS 
-                        SELECT * FROM read_csv_auto(
-                            '{file_path}',
-                            header=true,
-                            sample_size=-1,
-                            all_varchar=false,
-                            encoding='latin-1'
-                        )
-                        """
-                        conn.execute(query)
-                    else:
-                        raise e
+            if storage_mode == STORAGE_EXTERNAL:
+                query = f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM read_parquet('{source_path}')"
+                conn.execute(query)
+                # Binding the view only reads the Parquet footer, but fails early on a bad file
+                conn.execute(f"SELECT * FROM {table_name} LIMIT 0")
+            elif file_path.endswith(".csv"):
+                # Sampled inference with an explicit schema instead of a full-file sniff
+                schema_inference.load_csv(
+                    conn, file_path,
+                    lambda read_csv: f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM {read_csv}"
+                )
             elif file_path.endswith(".parquet"):
                 query = f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_parquet('{file_path}')"
                 conn.execute(query)
@@ -93,27 +204,69 @@ class DataLoader:
             file_extension = os.path.splitext(original_filename)[1]
             
             # Insert or update metadata
+            self._forget_files(conn, table_name)
             conn.execute("""
-                INSERT OR REPLACE INTO dataset_metadata (table_name, original_filename, file_extension, upload_date, dashboard_id)
-                VALUES (?, ?, ?, ?, ?)
-            """, (table_name, original_filename, file_extension, datetime.now(), dashboard_id))
+                INSERT OR REPLACE INTO dataset_metadata (table_name, original_filename, file_extension, upload_date, dashboard_id, storage_mode, source_path)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (table_name, original_filename, file_extension, datetime.now(), dashboard_id, storage_mode, source_path))
             
         finally:
             conn.close()
+            lineage_service.invalidate([table_name])
+        transformation_service.refresh_dependents(table_name)
 
-    def register_dataset_from_url(self, url: str, table_name: str, dashboard_id: str = None):
-        """Register a dataset directly from a URL (Parquet/CSV)"""
+    def _loaded_url_version(self, table_name: str, url: str) -> Optional[str]:
         conn = db.get_connection()
         try:
-            # Install httpfs extension just in case (though often builtin)
-            try:
-                conn.execute("INSTALL httpfs; LOAD httpfs;")
-            except:
-                pass # Might be already loaded or bundled
+            row = conn.execute(
+                "SELECT m.content_hash FROM dataset_metadata m "
+                "JOIN information_schema.tables t ON t.table_name = m.table_name AND t.table_schema = 'main' "
+                "WHERE m.table_name = ? AND m.source_url = ?",
+                (table_name, url)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def register_dataset_from_url(self, url: str, table_name: str, dashboard_id: str = None) -> str:
+        """
+        Register a dataset directly from a URL (Parquet/CSV).
+        http(s) URLs go through the remote object cache: if `table_name` was already
+        loaded from the same version of the object (ETag/Last-Modified) nothing is
+        downloaded or reloaded, and a changed object is read from the local copy.
+        Returns the reingest action ('unchanged' or 'replace').
+        """
+        if not url.lower().startswith(("http://", "https://")):
+            self._register_url_source(url, url, table_name, dashboard_id)
+            return REINGEST_REPLACE
+
+        if self._loaded_url_version(table_name, url) == remote_cache.version(url):
+            return REINGEST_UNCHANGED
+        with remote_cache.local_copy(url) as cached:
+            self._register_url_source(url, cached["path"], table_name, dashboard_id, cached["version"])
+        return REINGEST_REPLACE
+
+    def _register_url_source(self, url: str, source: str, table_name: str, dashboard_id: str = None, version: str = None):
+        """Load `source` (the URL itself, or its cached local copy) into `table_name`"""
+        conn = db.get_connection()
+        try:
+            if source == url:
+                # Install httpfs extension just in case (though often builtin)
+                try:
+                    conn.execute("INSTALL httpfs; LOAD httpfs;")
+                except:
+                    pass # Might be already loaded or bundled
+
+            self._replace_relation(conn, table_name, 'BASE TABLE')
 
             # Determine file type from URL extension
             # This is basic, might need improvement for URLs without extension
-            if url.endswith(".csv") or ".csv?" in url:
+            if (url.endswith(".csv") or ".csv?" in url) and source != url:
+                schema_inference.load_csv(
+                    conn, source,
+                    lambda read_csv: f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM {read_csv}"
+                )
+            elif url.endswith(".csv") or ".csv?" in url:
                 # Try UTF-8 first
                 try:
                     query = f"""
@@ -143,14 +296,14 @@ class DataLoader:
                     else:
                         raise e
             elif url.endswith(".parquet") or ".parquet?" in url:
-                query = f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_parquet('{url}')"
+                query = f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_parquet('{source}')"
                 conn.execute(query)
             elif url.endswith(".json") or ".json?" in url:
-                query = f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_json_auto('{url}')"
+                query = f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_json_auto('{source}')"
                 conn.execute(query)
             else:
                 # Default to parquet as fallback
-                query = f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_parquet('{url}')"
+                query = f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_parquet('{source}')"
                 conn.execute(query)
 
             # Metadata
@@ -159,29 +312,229 @@ class DataLoader:
             if not file_extension:
                 file_extension = '.parquet' # Assumption
                 
+            self._forget_files(conn, table_name)
             conn.execute("""
-                INSERT OR REPLACE INTO dataset_metadata (table_name, original_filename, file_extension, upload_date, dashboard_id)
-                VALUES (?, ?, ?, ?, ?)
-            """, (table_name, original_filename, file_extension, datetime.now(), dashboard_id))
+                INSERT OR REPLACE INTO dataset_metadata (table_name, original_filename, file_extension, upload_date, dashboard_id, source_url, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (table_name, original_filename, file_extension, datetime.now(), dashboard_id, url, version))
 
         finally:
             conn.close()
+            lineage_service.invalidate([table_name])
+        transformation_service.refresh_dependents(table_name)
 
     def register_dataset_from_sql(self, sql_query: str, table_name: str, dashboard_id: str = None):
         """Register a dataset created from a SQL query"""
         conn = db.get_connection()
         try:
-            
+            self._replace_relation(conn, table_name, 'BASE TABLE')
             full_query = f"CREATE OR REPLACE TABLE {table_name} AS {sql_query}"
             conn.execute(full_query)
             
             # Metadata
+            self._forget_files(conn, table_name)
             conn.execute("""
                 INSERT OR REPLACE INTO dataset_metadata (table_name, original_filename, file_extension, upload_date, dashboard_id)
                 VALUES (?, ?, ?, ?, ?)
             """, (table_name, "Generated from SQL", ".sql", datetime.now(), dashboard_id))
         finally:
             conn.close()
+            lineage_service.invalidate([table_name])
+        transformation_service.refresh_dependents(table_name)
+
+    # --- Incremental re-ingest ---
+
+    def file_stats(self, file_path: str, prefix_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        SHA-256, size and mtime of a file. With `prefix_size`, also the hash of
+        its first `prefix_size` bytes, taken in the same pass.
+        """
+        size = os.path.getsize(file_path)
+        hasher = hashlib.sha256()
+        prefix_hash = None
+        with open(file_path, "rb") as f:
+            if prefix_size and prefix_size < size:
+                remaining = prefix_size
+                while remaining:
+                    block = f.read(min(HASH_BLOCK_SIZE, remaining))
+                    hasher.update(block)
+                    remaining -= len(block)
+                prefix_hash = hasher.copy().hexdigest()
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                hasher.update(block)
+        return {
+            "content_hash": hasher.hexdigest(),
+            "prefix_hash": prefix_hash,
+            "file_size": size,
+            "file_mtime": datetime.fromtimestamp(os.path.getmtime(file_path)),
+        }
+
+    def _dataset_state(self, conn, table_name: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute("""
+            SELECT m.content_hash, m.file_size, m.row_count, m.storage_mode, m.source_path,
+                   m.segment_paths, t.table_type
+            FROM dataset_metadata m
+            JOIN information_schema.tables t ON t.table_name = m.table_name AND t.table_schema = 'main'
+            WHERE m.table_name = ?
+        """, (table_name,)).fetchone()
+        if not row:
+            return None
+        keys = ["content_hash", "file_size", "row_count", "storage_mode", "source_path", "segment_paths", "table_type"]
+        return dict(zip(keys, row))
+
+    def _relation_columns(self, conn, table_name: str) -> List[List[str]]:
+        return [[name, data_type] for name, data_type in conn.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_name = ? AND table_schema = 'main' ORDER BY ordinal_position",
+            (table_name,)
+        ).fetchall()]
+
+    def _ends_with_newline(self, file_path: str, offset: int) -> bool:
+        with open(file_path, "rb") as f:
+            f.seek(offset - 1)
+            return f.read(1) == b"\n"
+
+    def plan_reingest(self, table_name: str, file_path: str, append_key: str = None) -> Dict[str, Any]:
+        """
+        Compare `file_path` with the file `table_name` was last loaded from.
+        - unchanged: same content hash, nothing to do
+        - append: a CSV whose first bytes are exactly the previous file (only
+          the tail is new), or any file with an append-only key column (only
+          rows above the current maximum are new)
+        - replace: anything else, reload in full
+        """
+        conn = db.get_connection()
+        try:
+            state = self._dataset_state(conn, table_name)
+            columns = [name for name, _ in self._relation_columns(conn, table_name)] if state else []
+        finally:
+            conn.close()
+
+        if not state or not state["content_hash"]:
+            return {"action": REINGEST_REPLACE, "stats": self.file_stats(file_path), "previous": state}
+
+        stats = self.file_stats(file_path, prefix_size=state["file_size"])
+        plan = {"stats": stats, "previous": state}
+        if stats["content_hash"] == state["content_hash"]:
+            return {**plan, "action": REINGEST_UNCHANGED}
+
+        # A view over this very file already sees the new content; re-creating it is cheap
+        if state["storage_mode"] == STORAGE_EXTERNAL and state["source_path"] == os.path.abspath(file_path):
+            return {**plan, "action": REINGEST_REPLACE}
+
+        if (file_path.endswith(".csv") and stats["prefix_hash"] == state["content_hash"]
+                and self._ends_with_newline(file_path, state["file_size"])):
+            return {**plan, "action": REINGEST_APPEND, "mode": "tail"}
+
+        if append_key and append_key in columns:
+            return {**plan, "action": REINGEST_APPEND, "mode": "key", "append_key": append_key}
+        return {**plan, "action": REINGEST_REPLACE}
+
+    def _csv_schema(self, conn, table_name: str, file_path: str) -> CsvSchema:
+        """Dialect of the new file with the column types the dataset already has"""
+        inferred = schema_inference.infer(conn, file_path)
+        return CsvSchema(inferred.fingerprint, inferred.options, self._relation_columns(conn, table_name))
+
+    def _write_csv_tail(self, file_path: str, offset: int, skip: int) -> str:
+        """Header (and skipped preamble) of `file_path` followed by its bytes from `offset`, as a temp file"""
+        fd, tail_path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "wb") as out, open(file_path, "rb") as f:
+            for _ in range(skip + 1):
+                out.write(f.readline())
+            f.seek(offset)
+            shutil.copyfileobj(f, out, HASH_BLOCK_SIZE)
+        return tail_path
+
+    def _next_segment_path(self, state: Dict[str, Any]) -> str:
+        base = state["source_path"].rsplit(".", 1)[0]
+        index = len(state["segment_paths"] or []) + 1
+        while os.path.exists(f"{base}.part-{index:04d}.parquet"):
+            index += 1
+        return f"{base}.part-{index:04d}.parquet"
+
+    def append_dataset(self, table_name: str, file_path: str, plan: Dict[str, Any]) -> int:
+        """
+        Append only the new rows of `file_path` to the dataset, per a plan from
+        plan_reingest. Tables get an INSERT; external datasets get a new Parquet
+        segment that the view reads next to the original file.
+        Returns the number of rows appended.
+        """
+        state = plan["previous"]
+        tail_path = None
+        conn = db.get_connection()
+        try:
+            if plan["mode"] == "tail":
+                schema = self._csv_schema(conn, table_name, file_path)
+                tail_path = self._write_csv_tail(file_path, state["file_size"], int(schema.options.get("skip") or 0))
+                select = f"SELECT * FROM {schema.read_csv(tail_path)}"
+            else:
+                if file_path.endswith(".csv"):
+                    source = self._csv_schema(conn, table_name, file_path).read_csv(file_path)
+                elif file_path.endswith(".parquet"):
+                    source = f"read_parquet('{file_path}')"
+                elif file_path.endswith(".json"):
+                    source = f"read_json_auto('{file_path}')"
+                else:
+                    raise ValueError("Unsupported file format")
+                key = plan["append_key"]
+                select = f'SELECT * FROM {source} WHERE "{key}" > (SELECT max("{key}") FROM {table_name})'
+
+            segments = list(state["segment_paths"] or [])
+            conn.execute("BEGIN TRANSACTION")
+            if state["storage_mode"] == STORAGE_EXTERNAL:
+                segment = self._next_segment_path(state)
+                try:
+                    appended = conn.execute(f"COPY ({select}) TO '{segment}' (FORMAT 'parquet')").fetchone()[0]
+                    if appended:
+                        files = ", ".join(f"'{path}'" for path in [state["source_path"]] + segments + [segment])
+                        conn.execute(f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM read_parquet([{files}], union_by_name=true)")
+                        segments.append(segment)
+                finally:
+                    if segment not in segments and os.path.exists(segment):
+                        os.remove(segment)
+            else:
+                appended = conn.execute(f"INSERT INTO {table_name} BY NAME {select}").fetchone()[0]
+
+            stats = plan["stats"]
+            conn.execute("""
+                UPDATE dataset_metadata
+                SET content_hash = ?, file_size = ?, file_mtime = ?, row_count = row_count + ?,
+                    segment_paths = ?, upload_date = ?
+                WHERE table_name = ?
+            """, (stats["content_hash"], stats["file_size"], stats["file_mtime"], appended,
+                  segments or None, datetime.now(), table_name))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+            if tail_path:
+                os.remove(tail_path)
+
+        if appended:
+            lineage_service.invalidate([table_name])
+            transformation_service.refresh_dependents(table_name)
+        return appended
+
+    def record_content(self, table_name: str, stats: Dict[str, Any], row_count: int):
+        """Remember what a dataset was loaded from so the next re-ingest can be compared against it"""
+        conn = db.get_connection()
+        try:
+            conn.execute("""
+                UPDATE dataset_metadata
+                SET content_hash = ?, file_size = ?, file_mtime = ?, row_count = ?
+                WHERE table_name = ?
+            """, (stats["content_hash"], stats["file_size"], stats["file_mtime"], row_count, table_name))
+        finally:
+            conn.close()
+
+    def _forget_files(self, conn, table_name: str):
+        """Remove the Parquet segments appended to a dataset that is being replaced, and its tracked files"""
+        row = conn.execute("SELECT segment_paths FROM dataset_metadata WHERE table_name = ?", (table_name,)).fetchone()
+        for path in (row[0] if row and row[0] else []):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        conn.execute("DELETE FROM dataset_files WHERE table_name = ?", (table_name,))
 
     def list_server_files(self) -> List[str]:
         """List files in the uploads directory recursively"""
@@ -212,10 +565,192 @@ class DataLoader:
             
         return full_path
 
+    def list_directory_files(self, relative_path: str, extensions: tuple) -> List[str]:
+        """Absolute paths of the files under a directory of uploads/ (recursively) with one of `extensions`"""
+        full_path = self.get_full_path(relative_path)
+        if not os.path.isdir(full_path):
+            raise ValueError("Path is not a directory")
+        files = []
+        for root, _, filenames in os.walk(full_path):
+            for filename in filenames:
+                if filename.lower().endswith(extensions):
+                    files.append(os.path.join(root, filename))
+        if not files:
+            raise ValueError(f"No {', '.join(extensions)} files found in '{relative_path}'")
+        return sorted(files)
+
+    # --- Multi-file datasets ---
+
+    def is_multi_file(self, relative_path: str) -> bool:
+        """True for a glob pattern or a directory under uploads/"""
+        if any(c in relative_path for c in GLOB_CHARS):
+            return True
+        return os.path.isdir(os.path.join(os.path.abspath(UPLOAD_DIR), relative_path))
+
+    def resolve_files(self, relative_path: str) -> Dict[str, Any]:
+        """
+        Expand a glob (e.g. 'sales/year=*/month=*/*.parquet') or a directory under
+        uploads/ into its files. All files must share one format (Parquet or CSV).
+        Returns the absolute pattern, the matching files and their extension.
+        """
+        base_path = os.path.abspath(UPLOAD_DIR)
+        pattern = os.path.abspath(os.path.join(base_path, relative_path))
+        if not pattern.startswith(base_path):
+            raise ValueError("Invalid file path: Directory traversal attempt")
+
+        if os.path.isdir(pattern):
+            extensions = {
+                os.path.splitext(name)[1].lower()
+                for _, _, names in os.walk(pattern) for name in names
+            } & set(MULTI_FILE_EXTENSIONS)
+            if len(extensions) != 1:
+                raise ValueError("Directory must contain Parquet or CSV files, not both")
+            pattern = os.path.join(pattern, "**", f"*{extensions.pop()}")
+
+        files = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        if not files:
+            raise ValueError("No files match the given path")
+        extensions = {os.path.splitext(path)[1].lower() for path in files}
+        if len(extensions) != 1 or not extensions <= set(MULTI_FILE_EXTENSIONS):
+            raise ValueError("All matched files must be Parquet, or all CSV")
+        return {"pattern": pattern, "files": files, "extension": extensions.pop()}
+
+    def _file_entries(self, files: List[str]) -> List[tuple]:
+        return [(path, os.path.getsize(path), datetime.fromtimestamp(os.path.getmtime(path))) for path in files]
+
+    def _track_files(self, conn, table_name: str, entries: List[tuple], replace: bool = False):
+        if replace:
+            conn.execute("DELETE FROM dataset_files WHERE table_name = ?", (table_name,))
+        if entries:
+            conn.executemany(
+                "INSERT OR REPLACE INTO dataset_files (table_name, path, size, mtime) VALUES (?, ?, ?, ?)",
+                [(table_name, *entry) for entry in entries]
+            )
+
+    def _multi_file_select(self, conn, files: List[str], extension: str, hive_partitioning: bool,
+                           statement: callable):
+        """Run `statement(select)` over `files`; DuckDB scans them in parallel"""
+        if extension == ".csv":
+            return schema_inference.load_csv(
+                conn, files, lambda read_csv: statement(f"SELECT * FROM {read_csv}"), hive_partitioning
+            )
+        paths = ", ".join(f"'{path}'" for path in files)
+        return conn.execute(statement(
+            f"SELECT * FROM read_parquet([{paths}], hive_partitioning={str(hive_partitioning).lower()}, union_by_name=true)"
+        ))
+
+    def register_dataset_from_files(self, relative_path: str, table_name: str, dashboard_id: str = None,
+                                    storage_mode: str = None, hive_partitioning: bool = None):
+        """
+        Register one dataset over many files: a glob pattern or a directory under uploads/.
+        key=value folders (year=2024/month=01) become columns when hive_partitioning is on
+        (by default, when the path has such folders), so filters on them prune whole files.
+        In 'external' mode (Parquet only) the view re-expands the glob on every query and
+        new files show up as they arrive; otherwise the files are loaded into a table and
+        refresh_dataset_files appends only the ones added since.
+        """
+        source = self.resolve_files(relative_path)
+        storage_mode = storage_mode or settings.DATASET_STORAGE_MODE
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Invalid storage mode '{storage_mode}'. Use one of: {', '.join(STORAGE_MODES)}")
+        if source["extension"] != ".parquet":
+            storage_mode = STORAGE_TABLE
+        if hive_partitioning is None:
+            hive_partitioning = any("=" in part for path in source["files"] for part in os.path.dirname(path).split(os.sep))
+
+        conn = db.get_connection()
+        try:
+            self._replace_relation(conn, table_name, 'VIEW' if storage_mode == STORAGE_EXTERNAL else 'BASE TABLE')
+            if storage_mode == STORAGE_EXTERNAL:
+                hive = str(hive_partitioning).lower()
+                conn.execute(
+                    f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM "
+                    f"read_parquet('{source['pattern']}', hive_partitioning={hive}, union_by_name=true)"
+                )
+                conn.execute(f"SELECT * FROM {table_name} LIMIT 0")
+            else:
+                self._multi_file_select(
+                    conn, source["files"], source["extension"], hive_partitioning,
+                    lambda select: f"CREATE OR REPLACE TABLE {table_name} AS {select}"
+                )
+
+            self._forget_files(conn, table_name)
+            conn.execute("""
+                INSERT OR REPLACE INTO dataset_metadata (table_name, original_filename, file_extension, upload_date, dashboard_id,
+                    storage_mode, source_path, source_pattern, hive_partitioning)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (table_name, relative_path, source["extension"], datetime.now(), dashboard_id,
+                  storage_mode, source["pattern"] if storage_mode == STORAGE_EXTERNAL else None,
+                  source["pattern"], hive_partitioning))
+            self._track_files(conn, table_name, self._file_entries(source["files"]))
+        finally:
+            conn.close()
+            lineage_service.invalidate([table_name])
+        transformation_service.refresh_dependents(table_name)
+        return {"files": len(source["files"]), "hive_partitioning": hive_partitioning, "storage_mode": storage_mode}
+
+    def refresh_dataset_files(self, table_name: str) -> Dict[str, Any]:
+        """
+        Pick up files added under a multi-file dataset's pattern. New files are
+        appended; if a loaded file changed or disappeared the dataset is reloaded.
+        """
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT source_pattern, storage_mode, hive_partitioning, original_filename, dashboard_id "
+                "FROM dataset_metadata WHERE table_name = ?",
+                (table_name,)
+            ).fetchone()
+            if not row or not row[0]:
+                raise ValueError(f"Dataset '{table_name}' was not registered from a pattern or directory")
+            pattern, storage_mode, hive_partitioning, relative_path, dashboard_id = row
+            known = {
+                path: (size, mtime) for path, size, mtime in conn.execute(
+                    "SELECT path, size, mtime FROM dataset_files WHERE table_name = ?", (table_name,)
+                ).fetchall()
+            }
+        finally:
+            conn.close()
+
+        entries = self._file_entries(sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p)))
+        current = {path: (size, mtime) for path, size, mtime in entries}
+        new = [entry for entry in entries if entry[0] not in known]
+        stale = [path for path, stat in known.items() if current.get(path, stat) != stat or path not in current]
+        result = {"files": len(entries), "new_files": len(new), "changed_files": len(stale), "rows_appended": 0, "reloaded": False}
+
+        if stale and storage_mode != STORAGE_EXTERNAL:
+            self.register_dataset_from_files(relative_path, table_name, dashboard_id, storage_mode, hive_partitioning)
+            return {**result, "reloaded": True}
+        if not new and not stale:
+            return result
+
+        conn = db.get_connection()
+        try:
+            if storage_mode != STORAGE_EXTERNAL:
+                extension = os.path.splitext(new[0][0])[1].lower()
+                conn.execute("BEGIN TRANSACTION")
+                result["rows_appended"] = self._multi_file_select(
+                    conn, [entry[0] for entry in new], extension, hive_partitioning,
+                    lambda select: f"INSERT INTO {table_name} BY NAME {select}"
+                ).fetchone()[0]
+                self._track_files(conn, table_name, new)
+                conn.execute("COMMIT")
+            else:
+                # The view already reads them; only the bookkeeping and caches need updating
+                self._track_files(conn, table_name, entries, replace=True)
+        finally:
+            conn.close()
+            lineage_service.invalidate([table_name])
+        transformation_service.refresh_dependents(table_name)
+        return result
+
     def delete_server_file(self, filename: str):
         """Delete a file from the uploads directory"""
         try:
             full_path = self.get_full_path(filename)
+            owner = self.file_owner(full_path)
+            if owner:
+                raise FileInUseError(f"File is read in place by dataset '{owner}'. Delete the dataset first.")
             if os.path.exists(full_path):
                 os.remove(full_path)
             else:
@@ -231,15 +766,16 @@ class DataLoader:
                 SELECT 
                     t.table_name,
                     COALESCE(m.original_filename, t.table_name) as filename,
-                    COALESCE(m.file_extension, CASE WHEN t.table_type = 'VIEW' THEN 'view' ELSE '' END) as extension,
+                    COALESCE(m.file_extension, CASE WHEN t.table_type = 'VIEW' OR tf.name IS NOT NULL THEN 'view' ELSE '' END) as extension,
                     COALESCE(m.upload_date, tf.created_at) as upload_date,
                     tf.source_table,
-                    COALESCE(m.dashboard_id, tf.dashboard_id) as dashboard_id
+                    COALESCE(m.dashboard_id, tf.dashboard_id) as dashboard_id,
+                    m.storage_mode
                 FROM (
                     SELECT table_name, table_type 
                     FROM information_schema.tables 
                     WHERE table_schema = 'main' 
-                    AND table_name NOT IN ('users', 'user_id_seq', 'dataset_metadata', 'transformations', 'transformation_id_seq', 'dashboards', 'dashboard_items')
+                    AND table_name NOT IN ('users', 'user_id_seq', 'dataset_metadata', 'transformations', 'transformation_id_seq', 'transformation_lineage', 'ingest_jobs', 'upload_sessions', 'upload_chunks', 'csv_schema_cache', 'dataset_files', 'remote_cache_entries', 'training_jobs', 'dashboards', 'dashboard_items')
                 ) t
                 LEFT JOIN dataset_metadata m ON t.table_name = m.table_name
                 LEFT JOIN transformations tf ON t.table_name = tf.name
@@ -255,17 +791,23 @@ class DataLoader:
                     "upload_date": str(row[3]) if row[3] else None,
                     "type": "view" if row[2] == 'view' else "table",
                     "source_table": row[4],
-                    "dashboard_id": row[5]
+                    "dashboard_id": row[5],
+                    "storage_mode": row[6]
                 }
                 for row in results
             ]
         finally:
             conn.close()
 
-    def delete_dataset(self, table_name: str):
-        """Delete a dataset table and its metadata"""
+    def delete_dataset(self, table_name: str) -> List[str]:
+        """
+        Delete a dataset table and its metadata.
+        Returns the downstream transformations that read from it and are now broken.
+        """
         conn = db.get_connection()
         try:
+            broken = lineage_service.downstream(conn, [table_name])
+
             # Check object type (Table or View)
             # information_schema.tables contains both tables and views
             type_query = f"SELECT table_type FROM information_schema.tables WHERE table_name = '{table_name}' AND table_schema = 'main'"
@@ -273,15 +815,19 @@ class DataLoader:
             
             if result and result[0] == 'VIEW':
                 conn.execute(f"DROP VIEW IF EXISTS {table_name}")
-                # Also delete from transformations table if it exists there
-                conn.execute("DELETE FROM transformations WHERE name = ?", (table_name,))
             else:
                 conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+            # Also delete from transformations table if it exists there (materialized ones are tables)
+            conn.execute("DELETE FROM transformations WHERE name = ?", (table_name,))
+            lineage_service.forget(conn, table_name)
+            self._forget_files(conn, table_name)
             
             # Delete metadata
             conn.execute("DELETE FROM dataset_metadata WHERE table_name = ?", (table_name,))
         finally:
             conn.close()
+            lineage_service.invalidate([table_name])
+        return broken
 
 data_loader = DataLoader()
 
@@ -0,0 +1,53 @@
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+
+
+class FeaturePipeline:
+    """
+    Prediction preprocessing of a trained model, compiled once when the model
+    is loaded: datetime columns become month/day/day-of-week, categorical
+    columns are mapped to their LabelEncoder codes through a hashed lookup
+    (unseen categories get -1), numerics are coerced, and the columns are
+    aligned to the training order and scaled. Every step works on whole
+    columns, so the cost per row is NumPy's, not Python's.
+    """
+
+    def __init__(self, feature_names: List[str], encoders: Dict[str, Any], datetime_cols: List[str], scaler: Any):
+        self.feature_names = list(feature_names)
+        self.datetime_cols = list(datetime_cols)
+        self.scaler = scaler
+        # LabelEncoder.classes_ is sorted and unique, so a class's position is its code
+        self.category_index: Dict[str, pd.Index] = {col: pd.Index(le.classes_) for col, le in encoders.items()}
+        self._features = set(self.feature_names)
+
+    def encode(self, col: str, values: pd.Series) -> np.ndarray:
+        """Codes of `values` for categorical column `col`; -1 for categories not seen in training"""
+        return self.category_index[col].get_indexer(values.astype(str))
+
+    def _expand_dates(self, df: pd.DataFrame):
+        for col in self.datetime_cols:
+            if col not in df.columns:
+                continue
+            try:
+                dt = pd.to_datetime(df[col], errors='coerce')
+                df[f"{col}_month"] = dt.dt.month.fillna(1).astype(int)
+                df[f"{col}_day"] = dt.dt.day.fillna(1).astype(int)
+                df[f"{col}_dow"] = dt.dt.dayofweek.fillna(0).astype(int)
+                df.drop(columns=[col], inplace=True)
+            except Exception:
+                pass
+
+    def frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Model inputs before scaling, columns in training order (missing ones are 0)"""
+        df = df.copy()
+        self._expand_dates(df)
+        for col in df.columns:
+            if col in self.category_index:
+                df[col] = self.encode(col, df[col])
+            elif col in self._features:
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+        return df.reindex(columns=self.feature_names, fill_value=0)
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        return self.scaler.transform(self.frame(df))
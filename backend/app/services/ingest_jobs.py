@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import duckdb
+from fastapi import UploadFile
+from app.core.config import settings
+from app.infra.database import db
+from app.services.data_loader import data_loader, REINGEST_UNCHANGED, REINGEST_APPEND
+from app.services.data_converter import data_converter
+from app.services.batch_converter import batch_converter
+from app.services.query_scheduler import query_scheduler, AdmissionError, QueueFullError, LANE_INGEST
+from app.schemas.ingest import IngestJob, ConversionProfile
+
+logger = logging.getLogger(__name__)
+
+KIND_UPLOAD = "upload"
+KIND_LOCAL = "local"
+KIND_URL = "url"
+KIND_CONVERT = "convert"
+KIND_REFRESH = "refresh"
+KIND_BATCH_CONVERT = "batch_convert"
+KIND_SCORE = "score"
+
+# Progress is written to DuckDB at most this often while copying bytes
+PROGRESS_INTERVAL = 0.5
+COPY_CHUNK_SIZE = 1024 * 1024
+
+JOB_COLUMNS = "id, kind, status, phase, params, bytes_total, bytes_read, rows_written, result, error, attempts, created_by, created_at, started_at, finished_at"
+
+
+class IngestJobNotFoundError(LookupError):
+    """The job does not exist"""
+
+
+class IngestJobService:
+    """
+    Persistent ingest jobs. Each job is a row in `ingest_jobs` that records its
+    phase and progress; a bounded thread pool runs them in the ingest lane of
+    the query scheduler. Endpoints either run a job inline (the original
+    synchronous behaviour) or queue it and return the job id immediately.
+    """
+
+    def __init__(self, workers: int, max_queued: int):
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, Callable[[str, Dict[str, Any]], Dict[str, Any]]] = {
+            KIND_UPLOAD: self._run_upload,
+            KIND_LOCAL: self._run_local,
+            KIND_URL: self._run_url,
+            KIND_CONVERT: self._run_convert,
+            KIND_REFRESH: self._run_refresh,
+            KIND_BATCH_CONVERT: self._run_batch_convert,
+            KIND_SCORE: self._run_score,
+        }
+
+    # --- Persistence ---
+
+    def _row_to_job(self, row) -> IngestJob:
+        return IngestJob(
+            id=row[0],
+            kind=row[1],
+            status=row[2],
+            phase=row[3],
+            params=json.loads(row[4]) if row[4] else {},
+            bytes_total=row[5],
+            bytes_read=row[6] or 0,
+            rows_written=row[7],
+            result=json.loads(row[8]) if row[8] else None,
+            error=row[9],
+            attempts=row[10] or 0,
+            created_by=row[11],
+            created_at=row[12],
+            started_at=row[13],
+            finished_at=row[14],
+        )
+
+    def _update(self, job_id: str, **fields):
+        for key in ("params", "result"):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key], default=str)
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conn = db.get_connection()
+        try:
+            conn.execute(f"UPDATE ingest_jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+        finally:
+            conn.close()
+
+    def create(self, kind: str, params: Dict[str, Any], created_by: Optional[str] = None, phase: str = "register") -> IngestJob:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown ingest job kind '{kind}'")
+        job_id = uuid.uuid4().hex
+        conn = db.get_connection()
+        try:
+            conn.execute(
+                "INSERT INTO ingest_jobs (id, kind, status, phase, params, created_by, created_at) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                [job_id, kind, phase, json.dumps(params), created_by, datetime.now()]
+            )
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> IngestJob:
+        conn = db.get_connection()
+        try:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE id = ?", [job_id]).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            raise IngestJobNotFoundError(f"Ingest job '{job_id}' not found")
+        return self._row_to_job(row)
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[IngestJob]:
+        query = f"SELECT {JOB_COLUMNS} FROM ingest_jobs"
+        params: List[Any] = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        conn = db.get_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return [self._row_to_job(row) for row in rows]
+
+    def recover(self) -> int:
+        """Jobs left queued or running by a previous process can never finish; mark them failed so they can be retried"""
+        conn = db.get_connection()
+        try:
+            return conn.execute(
+                "UPDATE ingest_jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ? "
+                "WHERE status IN ('queued', 'running')",
+                [datetime.now()]
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    # --- Execution ---
+
+    def submit(self, job_id: str) -> IngestJob:
+        """Queue a job on the worker pool; raises QueueFullError when too many are pending"""
+        with self._lock:
+            if self._pending >= self.max_queued:
+                self._update(job_id, status="failed", error="Ingest queue is full", finished_at=datetime.now())
+                raise QueueFullError("Too many ingest jobs pending, try again later")
+            self._pending += 1
+        self._executor.submit(self._run_queued, job_id)
+        return self.get(job_id)
+
+    def _admit(self, job_id: str, user: Optional[str] = None):
+        """Take an ingest lane slot for the job; if none is granted the job is marked failed (retryable)"""
+        try:
+            query_scheduler.acquire(LANE_INGEST, user)
+        except AdmissionError as e:
+            self._update(job_id, status="failed", error=f"{e}; retry the job", finished_at=datetime.now())
+            raise
+
+    def _run_queued(self, job_id: str):
+        try:
+            self._admit(job_id)
+        except AdmissionError as e:
+            logger.warning("Ingest job %s not admitted: %s", job_id, e)
+            with self._lock:
+                self._pending -= 1
+            return
+        try:
+            self.run(job_id)
+        except Exception:
+            logger.exception("Ingest job %s failed", job_id)
+        finally:
+            query_scheduler.release(LANE_INGEST)
+            with self._lock:
+                self._pending -= 1
+
+    def run(self, job_id: str) -> Dict[str, Any]:
+        """Run a job in the calling thread, recording its outcome. Errors are re-raised."""
+        job = self.get(job_id)
+        self._update(job_id, status="running", started_at=datetime.now(), error=None, attempts=job.attempts + 1)
+        try:
+            result = self._handlers[job.kind](job_id, job.params)
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=datetime.now())
+            raise
+        self._update(job_id, status="succeeded", phase="done", result=result, finished_at=datetime.now())
+        return result
+
+    def run_inline(self, job_id: str, user: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run a job inside the request (background=false) in the ingest lane.
+        Queued requests do not take a slot: only the worker running the job does.
+        Raises AdmissionError (HTTP 429) when the lane is saturated.
+        """
+        self._admit(job_id, user)
+        try:
+            return self.run(job_id)
+        finally:
+            query_scheduler.release(LANE_INGEST, user)
+
+    def retry(self, job_id: str) -> IngestJob:
+        job = self.get(job_id)
+        if job.status != "failed":
+            raise ValueError(f"Only failed jobs can be retried (job is '{job.status}')")
+        if job.kind in (KIND_UPLOAD, KIND_CONVERT) and not os.path.exists(job.params.get("file_path", "")):
+            raise ValueError("The uploaded file no longer exists; upload it again")
+        self._update(job_id, status="queued", error=None, finished_at=None)
+        return self.submit(job_id)
+
+    # --- Upload phase (runs in the request, the body is already spooled) ---
+
+    def save_upload(self, job_id: str, file: UploadFile, file_path: str):
+        """Copy the uploaded file to `file_path` reporting bytes written"""
+        file.file.seek(0, os.SEEK_END)
+        total = file.file.tell()
+        file.file.seek(0)
+        self._update(job_id, phase="upload", bytes_total=total, bytes_read=0)
+
+        copied = 0
+        last_report = time.monotonic()
+        try:
+            with open(file_path, "wb") as buffer:
+                while True:
+                    chunk = file.file.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    buffer.write(chunk)
+                    copied += len(chunk)
+                    if time.monotonic() - last_report > PROGRESS_INTERVAL:
+                        self._update(job_id, bytes_read=copied)
+                        last_report = time.monotonic()
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), bytes_read=copied, finished_at=datetime.now())
+            raise
+        self._update(job_id, bytes_read=copied)
+
+    # --- Handlers ---
+
+    def _count_rows(self, table_name: str) -> int:
+        conn = db.get_connection()
+        try:
+            return conn.execute(f"SELECT count(*) FROM {table_name}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _register(self, job_id: str, table_name: str, register: Callable[[], None]) -> Dict[str, Any]:
+        self._update(job_id, phase="register")
+        register()
+        rows = self._count_rows(table_name)
+        self._update(job_id, rows_written=rows)
+        return {"table": table_name, "rows": rows}
+
+    def _reingest(self, job_id: str, params: Dict[str, Any], file_path: str,
+                  load: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Skip the load when the file is the one the dataset already holds, append
+        only the new rows when it extends it, otherwise run `load` in full.
+        """
+        table_name = params["table_name"]
+        self._update(job_id, phase="compare")
+        plan = data_loader.plan_reingest(table_name, file_path, params.get("append_key"))
+
+        if plan["action"] == REINGEST_UNCHANGED:
+            self._update(job_id, rows_written=0)
+            return {"table": table_name, "rows": plan["previous"]["row_count"], "action": "unchanged", "rows_appended": 0}
+
+        if plan["action"] == REINGEST_APPEND:
+            self._update(job_id, phase="append")
+            try:
+                appended = data_loader.append_dataset(table_name, file_path, plan)
+                self._update(job_id, rows_written=appended)
+                return {
+                    "table": table_name,
+                    "rows": (plan["previous"]["row_count"] or 0) + appended,
+                    "action": "appended",
+                    "rows_appended": appended,
+                }
+            except (duckdb.Error, ValueError, OSError) as e:
+                logger.warning("Incremental append to %s failed, reloading it in full: %s", table_name, e)
+
+        result = load()
+        data_loader.record_content(table_name, plan["stats"], result["rows"])
+        return {**result, "action": "replaced", "rows_appended": None}
+
+    def _run_upload(self, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        file_path = params["file_path"]
+
+        def load() -> Dict[str, Any]:
+            final_path = file_path
+            # Auto-convert CSV to Parquet for performance
+            if file_path.endswith(".csv"):
+                self._update(job_id, phase="convert")
+                try:
+                    final_path = data_converter.convert_csv_to_parquet(file_path)
+                except Exception as e:
+                    logger.warning("CSV conversion failed, falling back to CSV: %s", e)
+                    final_path = file_path
+
+            return self._register(job_id, params["table_name"], lambda: data_loader.register_dataset(
+                params["table_name"], final_path, params.get("original_filename"),
+                params.get("dashboard_id"), params.get("storage_mode")
+            ))
+
+        return self._reingest(job_id, params, file_path, load)
+
+    def _run_local(self, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if data_loader.is_multi_file(params["file_path"]):
+            files = data_loader.resolve_files(params["file_path"])["files"]
+            self._update(job_id, bytes_total=sum(os.path.getsize(path) for path in files))
+            result = self._register(job_id, params["table_name"], lambda: data_loader.register_dataset_from_files(
+                params["file_path"], params["table_name"], params.get("dashboard_id"),
+                params.get("storage_mode"), params.get("hive_partitioning")
+            ))
+            return {**result, "files": len(files), "action": "replaced", "rows_appended": None}
+
+        full_path = data_loader.get_full_path(params["file_path"])
+        self._update(job_id, bytes_total=os.path.getsize(full_path))
+        return self._reingest(job_id, params, full_path, lambda: self._register(
+            job_id, params["table_name"], lambda: data_loader.register_dataset_from_local_path(
+                full_path, params["table_name"], None, params.get("dashboard_id"), params.get("storage_mode")
+            )
+        ))
+
+    def _run_url(self, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._update(job_id, phase="compare")
+        action = data_loader.register_dataset_from_url(params["url"], params["table_name"], params.get("dashboard_id"))
+        if action == REINGEST_UNCHANGED:
+            self._update(job_id, rows_written=0)
+            return {"table": params["table_name"], "rows": self._count_rows(params["table_name"]), "action": "unchanged"}
+        rows = self._count_rows(params["table_name"])
+        self._update(job_id, rows_written=rows)
+        return {"table": params["table_name"], "rows": rows, "action": "replaced"}
+
+    def _run_refresh(self, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._update(job_id, phase="append")
+        result = data_loader.refresh_dataset_files(params["table_name"])
+        self._update(job_id, rows_written=result["rows_appended"])
+        return {"table": params["table_name"], **result}
+
+    def _run_convert(self, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        file_path = params["file_path"]
+        self._update(job_id, phase="convert", bytes_total=os.path.getsize(file_path))
+        # On failure the uploaded file is kept so the job can be retried
+        profile = ConversionProfile(**(params.get("profile") or {}))
+        parquet_path = data_converter.convert_to_parquet(
+            file_path, params["file_ext"], sheet_name=params.get("sheet_name"), profile=profile
+        )
+
+        original_size = os.path.getsize(file_path)
+        parquet_size = os.path.getsize(parquet_path)
+        reduction_percent = ((original_size - parquet_size) / original_size * 100) if original_size > 0 else 0
+
+        # Delete original file after successful conversion
+        try:
+            os.remove(file_path)
+        except OSError as cleanup_error:
+            logger.warning("Could not delete original file: %s", cleanup_error)
+
+        layout = data_converter.describe_layout(parquet_path)
+        self._update(job_id, rows_written=layout["rows"])
+
+        return {
+            "message": "Conversión exitosa",
+            "original_file": params.get("original_filename"),
+            "original_format": params["file_ext"].upper(),
+            "parquet_file": os.path.basename(parquet_path),
+            "original_size": original_size,
+            "parquet_size": parquet_size,
+            "size_reduction_percent": round(reduction_percent, 2),
+            "profile": profile.dict(),
+            "layout": layout
+        }
+
+    def _run_batch_convert(self, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        files = [path for path in params["files"] if os.path.exists(path)]
+        if not files:
+            raise ValueError("None of the files to convert exist anymore")
+        profile = ConversionProfile(**(params.get("profile") or {}))
+        self._update(job_id, phase="convert", bytes_total=sum(os.path.getsize(path) for path in files), bytes_read=0, rows_written=0)
+
+        # Per-file progress: the result grows as files finish, so GET /ingest-jobs/{id} shows it while running
+        progress = {"bytes": 0, "rows": 0, "files": []}
+
+        def on_file(entry: Dict[str, Any]):
+            progress["bytes"] += entry["original_size"]
+            progress["rows"] += entry.get("rows") or 0
+            progress["files"].append(entry)
+            self._update(job_id, bytes_read=progress["bytes"], rows_written=progress["rows"], result={"files": progress["files"]})
+
+        result = batch_converter.convert(files, profile, params.get("sheet_name"), on_file)
+        if not result["summary"]["succeeded"]:
+            raise ValueError(f"No file could be converted: {result['files'][0]['error']}")
+
+        if params.get("delete_originals"):
+            for entry in result["files"]:
+                if entry["status"] == "succeeded":
+                    try:
+                        os.remove(entry["file"])
+                    except OSError as cleanup_error:
+                        logger.warning("Could not delete original file: %s", cleanup_error)
+
+        for entry in result["files"]:
+            entry["file"] = os.path.basename(entry["file"])
+            if entry.get("parquet_file"):
+                entry["parquet_file"] = os.path.basename(entry["parquet_file"])
+        return {"message": "Conversión por lotes finalizada", "profile": profile.dict(), **result}
+
+    def _run_score(self, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        # Imported here so ingest jobs do not load TensorFlow until a model is used
+        from app.services.ai_service import ai_service
+
+        self._update(job_id, phase="score", rows_written=0)
+        last_report = [time.monotonic()]
+
+        def on_progress(rows: int):
+            if time.monotonic() - last_report[0] > PROGRESS_INTERVAL:
+                self._update(job_id, rows_written=rows)
+                last_report[0] = time.monotonic()
+
+        result = ai_service.score_table(
+            params["model_id"], params["source_table"], params["table_name"],
+            columns=params.get("columns"),
+            prediction_column=params.get("prediction_column") or "prediction",
+            dashboard_id=params.get("dashboard_id"),
+            storage_mode=params.get("storage_mode"),
+            on_progress=on_progress,
+        )
+        self._update(job_id, rows_written=result["rows"])
+        return result
+
+ingest_jobs = IngestJobService(
+    workers=settings.INGEST_WORKERS,
+    max_queued=settings.INGEST_MAX_QUEUED,
+)
@@ -0,0 +1,160 @@
+import json
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from app.infra.database import db
+from app.services.query_cache import query_cache
+
+
+class LineageService:
+    """
+    Grafo de dependencias entre transformaciones y tablas.
+    Las aristas (transformación -> tabla/vista que lee) se obtienen parseando
+    cada sql_definition con json_serialize_sql y se guardan en transformation_lineage.
+    Los cambios en un nodo se propagan como eventos de invalidación a todo
+    lo que depende de él; las cachés se suscriben a esos eventos.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._lock = threading.Lock()
+
+    # --- Parseo ---
+
+    def extract_tables(self, conn, sql: str) -> Set[str]:
+        """Tablas y vistas referenciadas por una consulta (sin los nombres de CTE)"""
+        serialized = conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0]
+        tree = json.loads(serialized)
+        if tree.get("error"):
+            raise ValueError(f"No se pudo analizar el SQL: {tree.get('error_message')}")
+
+        tables: Set[str] = set()
+        ctes: Set[str] = set()
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                if node.get("type") == "BASE_TABLE" and node.get("table_name"):
+                    tables.add(node["table_name"])
+                cte_map = node.get("cte_map")
+                if isinstance(cte_map, dict):
+                    ctes.update(entry["key"] for entry in cte_map.get("map", []))
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                stack.extend(node)
+        return tables - ctes
+
+    def record(self, conn, name: str, sql: str, source_table: Optional[str] = None):
+        """Guarda las dependencias de la transformación `name`"""
+        try:
+            upstream = self.extract_tables(conn, sql)
+        except ValueError:
+            upstream = set()
+        if source_table:
+            upstream.add(source_table)
+        upstream.discard(name)
+
+        conn.execute("DELETE FROM transformation_lineage WHERE transformation_name = ?", [name])
+        if upstream:
+            conn.executemany(
+                "INSERT INTO transformation_lineage (transformation_name, upstream) VALUES (?, ?)",
+                [(name, table) for table in sorted(upstream)]
+            )
+
+    def forget(self, conn, name: str):
+        conn.execute("DELETE FROM transformation_lineage WHERE transformation_name = ?", [name])
+
+    def rebuild(self):
+        """Recalcula el grafo completo a partir de las transformaciones guardadas"""
+        conn = db.get_connection()
+        try:
+            rows = conn.execute("SELECT name, sql_definition, source_table FROM transformations").fetchall()
+            conn.execute("DELETE FROM transformation_lineage")
+            for name, sql, source_table in rows:
+                self.record(conn, name, sql, source_table)
+        finally:
+            conn.close()
+
+    # --- Consultas sobre el grafo ---
+
+    def edges(self, conn) -> Dict[str, Set[str]]:
+        """transformación -> conjunto de nodos de los que lee"""
+        graph: Dict[str, Set[str]] = {}
+        for name, upstream in conn.execute(
+            "SELECT transformation_name, upstream FROM transformation_lineage"
+        ).fetchall():
+            graph.setdefault(name, set()).add(upstream)
+        return graph
+
+    def _reverse(self, graph: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+        children: Dict[str, Set[str]] = {}
+        for name, upstream in graph.items():
+            for parent in upstream:
+                children.setdefault(parent, set()).add(name)
+        return children
+
+    def _closure(self, adjacency: Dict[str, Set[str]], names: Iterable[str]) -> Set[str]:
+        seen: Set[str] = set()
+        queue = deque(names)
+        while queue:
+            for node in adjacency.get(queue.popleft(), ()):
+                if node not in seen:
+                    seen.add(node)
+                    queue.append(node)
+        return seen
+
+    def downstream(self, conn, names: Iterable[str]) -> List[str]:
+        """Todos los nodos que dependen (directa o transitivamente) de `names`"""
+        names = list(names)
+        return sorted(self._closure(self._reverse(self.edges(conn)), names) - set(names))
+
+    def upstream(self, conn, name: str) -> List[str]:
+        """Todos los nodos de los que depende `name`"""
+        return sorted(self._closure(self.edges(conn), [name]) - {name})
+
+    def dependencies_within(self, conn, names: Iterable[str]) -> Dict[str, Set[str]]:
+        """
+        Para cada nodo de `names`, los otros nodos de `names` de los que depende,
+        aunque sea a través de vistas intermedias que no están en el conjunto.
+        """
+        names = set(names)
+        graph = self.edges(conn)
+        return {name: (self._closure(graph, [name]) & names) - {name} for name in names}
+
+    def graph(self) -> Dict[str, List[str]]:
+        conn = db.get_connection()
+        try:
+            return {name: sorted(upstream) for name, upstream in sorted(self.edges(conn).items())}
+        finally:
+            conn.close()
+
+    # --- Eventos de invalidación ---
+
+    def subscribe(self, listener: Callable[[List[str]], None]):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def invalidate(self, names: Iterable[str], conn=None) -> List[str]:
+        """
+        Notifica que `names` cambiaron. El evento incluye todos los nodos
+        aguas abajo, que quedan desactualizados o rotos.
+        Devuelve la lista completa de nodos afectados.
+        """
+        names = [n for n in names if n]
+        owns_conn = conn is None
+        if owns_conn:
+            conn = db.get_connection()
+        try:
+            affected = names + self.downstream(conn, names)
+        finally:
+            if owns_conn:
+                conn.close()
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(affected)
+        return affected
+
+
+lineage_service = LineageService()
+lineage_service.subscribe(query_cache.invalidate_tables)
@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+# (path, mtime_ns, size) of every artifact present; any retrain or delete changes it
+Version = Tuple[Tuple[str, int, int], ...]
+
+
+@dataclass
+class InferenceBundle:
+    """Everything predict needs for one model, deserialized once"""
+    model_id: str
+    meta: Dict[str, Any]
+    model: Any
+    scaler: Any
+    encoders: Dict[str, Any]
+    feature_names: List[str]
+    datetime_cols: List[str]
+    target_encoder: Any = None
+    scaler_y: Any = None
+    feature_means: Dict[str, float] = field(default_factory=dict)
+    pipeline: Any = None  # FeaturePipeline compiled from the artifacts above
+    version: Version = ()
+    size: int = 0
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def model_type(self) -> str:
+        return self.meta.get('model_type', 'tensorflow')
+
+
+def artifact_version(paths: List[str]) -> Version:
+    """Stat of the artifacts that exist; a few stat calls, cheap enough for every prediction"""
+    version = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        version.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(version)
+
+
+class ModelRegistry:
+    """
+    In-process LRU of assembled inference bundles (model + scalers, encoders,
+    feature names). A bundle is served while the mtimes and sizes of its
+    artifact files match the ones it was loaded from, so a retrain or delete
+    is picked up even without an explicit invalidate(). Bounded by model count
+    and by bytes (artifact size on disk as an estimate of memory use).
+    """
+
+    def __init__(self, max_models: int, max_bytes: int):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, InferenceBundle]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # One loader per model at a time; concurrent requests for a cold model wait for it
+        self._loading: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_models > 0 and self.max_bytes > 0
+
+    def _lookup(self, model_id: str, version: Version) -> Optional[InferenceBundle]:
+        with self._lock:
+            bundle = self._entries.get(model_id)
+            if bundle is None:
+                return None
+            if bundle.version != version:
+                self._remove(model_id)
+                self.invalidations += 1
+                return None
+            self._entries.move_to_end(model_id)
+            self.hits += 1
+            return bundle
+
+    def get(self, model_id: str, artifact_paths: List[str], load: Callable[[], InferenceBundle]) -> InferenceBundle:
+        """Cached bundle for the current artifacts of `model_id`, loading it with `load` on a miss"""
+        version = artifact_version(artifact_paths)
+        bundle = self._lookup(model_id, version)
+        if bundle is not None:
+            return bundle
+
+        with self._lock:
+            loading = self._loading.setdefault(model_id, threading.Lock())
+        with loading:
+            # Another request may have loaded it while this one waited
+            bundle = self._lookup(model_id, version)
+            if bundle is not None:
+                return bundle
+            with self._lock:
+                self.misses += 1
+            bundle = load()
+            bundle.version = version
+            bundle.size = sum(size for _, _, size in version)
+            self._put(bundle)
+            return bundle
+
+    def _put(self, bundle: InferenceBundle):
+        # A model larger than the whole budget is served but not kept
+        if not self.enabled or bundle.size > self.max_bytes:
+            return
+        with self._lock:
+            if bundle.model_id in self._entries:
+                self._remove(bundle.model_id)
+            self._entries[bundle.model_id] = bundle
+            self._bytes += bundle.size
+            while self._entries and (len(self._entries) > self.max_models or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, model_id: str):
+        bundle = self._entries.pop(model_id)
+        self._bytes -= bundle.size
+
+    def invalidate(self, model_id: str) -> bool:
+        with self._lock:
+            self._loading.pop(model_id, None)
+            if model_id not in self._entries:
+                return False
+            self._remove(model_id)
+            self.invalidations += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "models": len(self._entries),
+                "max_models": self.max_models,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "loaded": list(self._entries.keys()),
+            }
+
+
+model_registry = ModelRegistry(settings.MODEL_CACHE_MAX_MODELS, settings.MODEL_CACHE_MAX_BYTES)
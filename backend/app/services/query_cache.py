@@ -0,0 +1,133 @@
+import re
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set
+from app.core.config import settings
+
+
+@dataclass
+class CachedResult:
+    columns: List[str]
+    rows: List[tuple]
+    tables: Set[str]
+    size: int
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class QueryResultCache:
+    """
+    In-process LRU cache of query results keyed by normalized SQL + params.
+    Entries are tagged with the tables they read so that any write to one
+    of those tables drops them. Bounded by a byte budget and a TTL.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(sql: str, params: Iterable[Any]) -> str:
+        normalized = re.sub(r"\s+", " ", sql).strip()
+        return normalized + "\x00" + json.dumps(list(params), default=str)
+
+    @staticmethod
+    def _estimate_size(columns: List[str], rows: List[tuple]) -> int:
+        size = sys.getsizeof(rows) + sum(sys.getsizeof(c) for c in columns)
+        for row in rows:
+            size += sys.getsizeof(row)
+            for value in row:
+                size += sys.getsizeof(value)
+        return size
+
+    def epoch(self) -> int:
+        """Snapshot to pass to put(); results computed across an invalidation are not cached"""
+        return self._epoch
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry.created_at > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, columns: List[str], rows: List[tuple], tables: Iterable[str], epoch: int) -> bool:
+        if not self.enabled:
+            return False
+        size = self._estimate_size(columns, rows)
+        # A single result may not take more than a quarter of the budget
+        if size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            if epoch != self._epoch:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedResult(columns, rows, {t.lower() for t in tables}, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every entry that reads any of the given tables/views"""
+        names = {t.lower() for t in tables if t}
+        with self._lock:
+            self._epoch += 1
+            stale = [k for k, e in self._entries.items() if e.tables & names]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+query_cache = QueryResultCache(settings.QUERY_CACHE_MAX_BYTES, settings.QUERY_CACHE_TTL_SECONDS)
@@ -0,0 +1,139 @@
+import uuid
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+
+class QueryCancelledError(RuntimeError):
+    """A running query was interrupted by a user or by the statement timeout"""
+
+
+class RunningQuery:
+    def __init__(self, conn, sql: str, user: Optional[str], role: Optional[str], timeout: float):
+        self.id = uuid.uuid4().hex
+        self.conn = conn
+        self.sql = sql
+        self.user = user
+        self.role = role
+        self.timeout = timeout
+        self.started_at = datetime.now()
+        self.cancel_reason: Optional[str] = None
+        # Only time spent executing or fetching counts towards the timeout, not the
+        # idle gaps between fetches (e.g. between the pages of a result cursor)
+        self.state = "running"
+        self._active = 0.0
+        self._resumed = time.monotonic()
+
+    def elapsed(self) -> float:
+        if self.state == "running":
+            return self._active + time.monotonic() - self._resumed
+        return self._active
+
+    def pause(self):
+        if self.state == "running":
+            self._active += time.monotonic() - self._resumed
+            self.state = "idle"
+
+    def resume(self):
+        if self.state == "idle":
+            self._resumed = time.monotonic()
+            self.state = "running"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "sql": self.sql,
+            "user": self.user,
+            "role": self.role,
+            "state": self.state,
+            "started_at": self.started_at.isoformat(),
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "timeout_seconds": self.timeout or None,
+            "cancel_reason": self.cancel_reason,
+        }
+
+
+class QueryRegistry:
+    """
+    In-process registry of queries running on request connections. A query stays
+    registered from execute() until its result is drained or its connection is
+    released, so fetches and streamed results can be cancelled too.
+    Queries are cancelled through conn.interrupt(); a watchdog thread
+    interrupts those whose execute and fetch time exceeds their role's
+    statement timeout.
+    """
+
+    def __init__(self, role_timeouts: Dict[str, float], default_timeout: float, poll_interval: float = 0.5):
+        self.role_timeouts = role_timeouts
+        self.default_timeout = default_timeout
+        self.poll_interval = poll_interval
+        self._running: Dict[str, RunningQuery] = {}
+        self._lock = threading.Lock()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def timeout_for(self, role: Optional[str]) -> float:
+        if role is None:
+            return self.default_timeout
+        return self.role_timeouts.get(role, self.default_timeout)
+
+    def begin(self, conn, sql: str, user: Optional[str] = None, role: Optional[str] = None) -> RunningQuery:
+        query = RunningQuery(conn, sql, user, role, self.timeout_for(role))
+        with self._lock:
+            self._running[query.id] = query
+        if query.timeout:
+            self._ensure_watchdog()
+        return query
+
+    def finish(self, query: RunningQuery, error: Optional[BaseException] = None):
+        """
+        Unregister a query. With `error` (raised while executing or fetching),
+        raises QueryCancelledError if the query had been cancelled.
+        """
+        with self._lock:
+            self._running.pop(query.id, None)
+        if error is not None and query.cancel_reason:
+            raise QueryCancelledError(f"Query {query.cancel_reason}") from error
+
+    def list(self, user: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            queries = list(self._running.values())
+        return [q.to_dict() for q in queries if user is None or q.user == user]
+
+    def get(self, query_id: str) -> Optional[RunningQuery]:
+        with self._lock:
+            return self._running.get(query_id)
+
+    def cancel(self, query_id: str, reason: str = "cancelled by user") -> bool:
+        # Check and interrupt under the lock: once track() has popped the query its
+        # pooled cursor may already run another request's query
+        with self._lock:
+            query = self._running.get(query_id)
+            if query is None:
+                return False
+            query.cancel_reason = reason
+            query.conn.interrupt()
+            return True
+
+    def _ensure_watchdog(self):
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(target=self._watch, name="query-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                expired = [
+                    q for q in self._running.values()
+                    if q.timeout and q.cancel_reason is None and q.elapsed() > q.timeout
+                ]
+            for q in expired:
+                self.cancel(q.id, f"exceeded the {q.timeout:g}s statement timeout")
+
+
+query_registry = QueryRegistry(
+    role_timeouts=settings.STATEMENT_TIMEOUTS,
+    default_timeout=settings.STATEMENT_TIMEOUT_DEFAULT,
+)
@@ -0,0 +1,171 @@
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+# Lanes in priority order: a freed slot goes to the highest-priority eligible waiter
+LANE_INTERACTIVE = "interactive"
+LANE_SANDBOX = "sandbox"
+LANE_INGEST = "ingest"
+LANES = (LANE_INTERACTIVE, LANE_SANDBOX, LANE_INGEST)
+
+
+class AdmissionError(RuntimeError):
+    """A query was not admitted; maps to HTTP 429"""
+    retry_after = 1
+
+
+class QueueFullError(AdmissionError):
+    """The lane's wait queue is full"""
+
+
+class QueueTimeoutError(AdmissionError):
+    """Waited too long for a slot"""
+
+
+class _Waiter:
+    def __init__(self, ticket: int, lane: str, user: Optional[str]):
+        self.ticket = ticket
+        self.lane = lane
+        self.priority = LANES.index(lane)
+        self.user = user
+
+
+class _LaneStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+
+
+class QueryScheduler:
+    """
+    Admission control for DuckDB work. Each lane has its own concurrency
+    limit and bounded wait queue, all lanes share a global limit, and a
+    user can only run a few queries at once. Heavy sandbox or ingest work
+    therefore cannot take every slot away from dashboard widgets.
+    """
+
+    def __init__(
+        self,
+        lane_concurrency: Dict[str, int],
+        lane_queue: Dict[str, int],
+        total_concurrency: int,
+        user_concurrency: int,
+        queue_timeout: float,
+    ):
+        self.lane_concurrency = lane_concurrency
+        self.lane_queue = lane_queue
+        self.total_concurrency = total_concurrency
+        self.user_concurrency = user_concurrency
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._waiting: List[_Waiter] = []
+        self._active: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._user_active: Dict[str, int] = {}
+        self._stats: Dict[str, _LaneStats] = {lane: _LaneStats() for lane in LANES}
+
+    def _has_capacity(self, lane: str, user: Optional[str]) -> bool:
+        if sum(self._active.values()) >= self.total_concurrency:
+            return False
+        if self._active[lane] >= self.lane_concurrency.get(lane, 1):
+            return False
+        if user is not None and self._user_active.get(user, 0) >= self.user_concurrency:
+            return False
+        return True
+
+    def _is_next(self, waiter: _Waiter) -> bool:
+        # Only yield to higher-priority (or older same-lane) waiters that could actually run now
+        for other in self._waiting:
+            if other is waiter:
+                continue
+            ahead = (other.priority, other.ticket) < (waiter.priority, waiter.ticket)
+            if ahead and self._has_capacity(other.lane, other.user):
+                return False
+        return True
+
+    def acquire(self, lane: str, user: Optional[str] = None, timeout: Optional[float] = None):
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}'")
+        timeout = self.queue_timeout if timeout is None else timeout
+        stats = self._stats[lane]
+        started = time.monotonic()
+        with self._cond:
+            waiter = _Waiter(next(self._tickets), lane, user)
+            if not (self._has_capacity(lane, user) and self._is_next(waiter)):
+                queued = sum(1 for w in self._waiting if w.lane == lane)
+                if queued >= self.lane_queue.get(lane, 0):
+                    stats.rejected += 1
+                    raise QueueFullError(f"Too many queued queries in the '{lane}' lane, try again later")
+                self._waiting.append(waiter)
+                try:
+                    while not (self._has_capacity(lane, user) and self._is_next(waiter)):
+                        remaining = timeout - (time.monotonic() - started)
+                        if remaining <= 0:
+                            stats.timed_out += 1
+                            raise QueueTimeoutError(f"Timed out waiting for a '{lane}' query slot")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting.remove(waiter)
+                    # Our departure may unblock lower-priority waiters
+                    self._cond.notify_all()
+
+            self._active[lane] += 1
+            if user is not None:
+                self._user_active[user] = self._user_active.get(user, 0) + 1
+            stats.admitted += 1
+            stats.total_wait += time.monotonic() - started
+
+    def release(self, lane: str, user: Optional[str] = None):
+        with self._cond:
+            self._active[lane] -= 1
+            if user is not None:
+                remaining = self._user_active.get(user, 1) - 1
+                if remaining:
+                    self._user_active[user] = remaining
+                else:
+                    self._user_active.pop(user, None)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, lane: str, user: Optional[str] = None):
+        self.acquire(lane, user)
+        try:
+            yield
+        finally:
+            self.release(lane, user)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            lanes = {}
+            for lane in LANES:
+                s = self._stats[lane]
+                lanes[lane] = {
+                    "active": self._active[lane],
+                    "queued": sum(1 for w in self._waiting if w.lane == lane),
+                    "concurrency": self.lane_concurrency.get(lane, 1),
+                    "max_queue": self.lane_queue.get(lane, 0),
+                    "admitted": s.admitted,
+                    "rejected": s.rejected,
+                    "timed_out": s.timed_out,
+                    "avg_wait_ms": round(s.total_wait / s.admitted * 1000, 2) if s.admitted else 0.0,
+                }
+            return {
+                "total_active": sum(self._active.values()),
+                "total_concurrency": self.total_concurrency,
+                "user_concurrency": self.user_concurrency,
+                "lanes": lanes,
+            }
+
+
+query_scheduler = QueryScheduler(
+    lane_concurrency=settings.QUERY_LANE_CONCURRENCY,
+    lane_queue=settings.QUERY_LANE_QUEUE,
+    total_concurrency=settings.QUERY_TOTAL_CONCURRENCY,
+    user_concurrency=settings.QUERY_USER_CONCURRENCY,
+    queue_timeout=settings.QUERY_QUEUE_TIMEOUT,
+)
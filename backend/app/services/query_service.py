@@ -0,0 +1,59 @@
+from typing import Any, List, Set, Tuple
+from app.core.query_builder import SecureQueryBuilder
+from app.schemas.query_builder import QueryBuilderRequest
+from app.services.query_cache import query_cache
+
+
+class QueryService:
+    """Ejecuta consultas del query builder pasando por la caché de resultados"""
+
+    def __init__(self):
+        self.builder = SecureQueryBuilder()
+
+    def resolve_tables(self, conn, table: str) -> Set[str]:
+        """
+        Tablas/vistas que lee una consulta sobre `table`.
+        Si `table` es una transformación se incluyen sus tablas origen (recursivo).
+        """
+        table = table.strip('"')
+        tables = {table}
+        pending = [table]
+        while pending:
+            name = pending.pop()
+            row = conn.execute(
+                "SELECT source_table FROM transformations WHERE name = ?", [name]
+            ).fetchone()
+            if row and row[0] and row[0] not in tables:
+                tables.add(row[0])
+                pending.append(row[0])
+        return tables
+
+    def execute_builder_query(self, conn, query_req: QueryBuilderRequest) -> Tuple[List[str], List[tuple]]:
+        """
+        Construye y ejecuta la consulta segura.
+        Returns: (columns, rows)
+        """
+        sql, params = self.builder.build_sql(query_req)
+
+        if not query_cache.enabled:
+            return self._run(conn, sql, params)
+
+        key = query_cache.make_key(sql, params)
+        cached = query_cache.get(key)
+        if cached is not None:
+            return cached.columns, cached.rows
+
+        epoch = query_cache.epoch()
+        columns, rows = self._run(conn, sql, params)
+        query_cache.put(key, columns, rows, self.resolve_tables(conn, query_req.table), epoch)
+        return columns, rows
+
+    def _run(self, conn, sql: str, params: List[Any]) -> Tuple[List[str], List[tuple]]:
+        cursor = conn.execute(sql, params)
+        if not cursor.description:
+            return [], []
+        columns = [desc[0] for desc in cursor.description]
+        return columns, cursor.fetchall()
+
+
+query_service = QueryService()
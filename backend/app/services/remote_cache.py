@@ -0,0 +1,372 @@
+import io
+import os
+import hashlib
+import logging
+import threading
+import urllib.request
+import urllib.error
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import pyarrow.parquet as pq
+from app.core.config import settings
+from app.infra.database import db
+
+logger = logging.getLogger(__name__)
+
+ENTRY_COLUMNS = "url, etag, last_modified, size, accept_ranges, blocks, fetched_at, last_access"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class RemoteObjectChangedError(RuntimeError):
+    """The remote object changed while its blocks were being fetched"""
+
+
+class _Entry:
+    def __init__(self, url: str, path: str, etag: Optional[str], last_modified: Optional[str],
+                 size: Optional[int], accept_ranges: bool, blocks: Set[int]):
+        self.url = url
+        self.path = path
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.accept_ranges = accept_ranges
+        self.blocks = blocks
+
+    @property
+    def version(self) -> str:
+        """Identifies this version of the object: its ETag, or Last-Modified and size"""
+        if self.etag:
+            return f"etag:{self.etag}"
+        return f"modified:{self.last_modified}:{self.size}"
+
+
+class RemoteFile(io.RawIOBase):
+    """Seekable read-only file over a cached remote object; missing blocks are fetched on read"""
+
+    def __init__(self, cache: "RemoteObjectCache", entry: _Entry):
+        self._cache = cache
+        self._entry = entry
+        self._pos = 0
+        self.size = entry.size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._entry.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = self._entry.size if size is None or size < 0 else min(self._entry.size, self._pos + size)
+        if end <= self._pos:
+            return b""
+        data = self._cache.read_range(self._entry, self._pos, end - self._pos)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class RemoteObjectCache:
+    """
+    Disk cache of remote objects imported by URL. Each object is a sparse file
+    filled block by block: whole downloads, and range reads such as a Parquet
+    footer or a few row groups, only fetch the blocks not cached yet (merged
+    into as few Range requests as possible). A cached object is revalidated
+    with a conditional HEAD (If-None-Match / If-Modified-Since), so importing
+    an unchanged URL again costs one round trip. The total size is capped and
+    the least recently used objects are evicted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, block_size: int, timeout: float):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.timeout = timeout
+        self._entries: Dict[str, _Entry] = {}
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._pinned: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # --- HTTP ---
+
+    def _request(self, url: str, method: str = "GET", headers: Optional[Dict[str, str]] = None):
+        request = urllib.request.Request(url, method=method, headers=headers or {})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _headers(self, message) -> Dict[str, str]:
+        return {key.lower(): value for key, value in message.items()}
+
+    def _head(self, url: str, entry: Optional[_Entry]) -> Tuple[int, Dict[str, str]]:
+        """Conditional HEAD; servers that refuse HEAD get a one-byte range GET instead. Header names are lowercased."""
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        elif entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        try:
+            with self._request(url, "HEAD", headers) as response:
+                return response.status, self._headers(response.headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, self._headers(e.headers)
+            if e.code not in (403, 405, 501):
+                raise
+        with self._request(url, "GET", {**headers, "Range": "bytes=0-0"}) as response:
+            found = self._headers(response.headers)
+            content_range = found.get("content-range", "")
+            if response.status == 206 and "/" in content_range:
+                found["content-length"] = content_range.rsplit("/", 1)[1]
+                found["accept-ranges"] = "bytes"
+            return response.status, found
+
+    # --- Entries ---
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest() + ".bin")
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _load(self, url: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry:
+            return entry
+        conn = db.get_connection()
+        try:
+            row = conn.execute(f"SELECT {ENTRY_COLUMNS} FROM remote_cache_entries WHERE url = ?", [url]).fetchone()
+        finally:
+            conn.close()
+        if not row or not os.path.exists(self._path(url)):
+            return None
+        entry = _Entry(url, self._path(url), row[1], row[2], row[3], bool(row[4]), set(row[5] or []))
+        with self._lock:
+            self._entries[url] = entry
+        return entry
+
+    def _save(self, entry: _Entry, fetched: bool = False):
+        now = datetime.now()
+        conn = db.get_connection()
+        try:
+            conn.execute(
+                f"INSERT OR REPLACE INTO remote_cache_entries ({ENTRY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, "
+                "COALESCE(?, (SELECT fetched_at FROM remote_cache_entries WHERE url = ?)), ?)",
+                [entry.url, entry.etag, entry.last_modified, entry.size, entry.accept_ranges,
+                 sorted(entry.blocks), now if fetched else None, entry.url, now]
+            )
+        finally:
+            conn.close()
+        with self._lock:
+            self._entries[entry.url] = entry
+
+    def _block_count(self, entry: _Entry) -> int:
+        return -(-entry.size // self.block_size) if entry.size else 0
+
+    def validate(self, url: str) -> Tuple[_Entry, bool]:
+        """
+        Revalidate the cached copy of `url`. Returns the entry and whether the
+        remote object is new or changed (in which case its old blocks are dropped).
+        """
+        entry = self._load(url)
+        status, headers = self._head(url, entry)
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        length = headers.get("content-length")
+        size = int(length) if length and length.isdigit() else None
+
+        if entry and (status == 304 or (etag and etag == entry.etag)
+                      or (not etag and last_modified and last_modified == entry.last_modified and size == entry.size)):
+            self._save(entry)
+            return entry, False
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = _Entry(url, self._path(url), etag, last_modified, size,
+                       headers.get("accept-ranges", "").lower() == "bytes" and size is not None, set())
+        # Sparse file: blocks are written at their offsets as they arrive
+        with open(entry.path, "wb") as f:
+            if size:
+                f.truncate(size)
+        self._save(entry)
+        return entry, True
+
+    # --- Blocks ---
+
+    def _download_all(self, entry: _Entry):
+        """For servers without range support: one plain GET of the whole object"""
+        written = 0
+        with self._request(entry.url) as response, open(entry.path, "wb") as f:
+            while True:
+                data = response.read(COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+        entry.size = written
+        entry.blocks = set(range(self._block_count(entry)))
+
+    def _fetch_blocks(self, entry: _Entry, first: int, last: int):
+        missing = [b for b in range(first, last + 1) if b not in entry.blocks]
+        if not missing:
+            return
+        if not entry.accept_ranges:
+            self._download_all(entry)
+            self._save(entry, fetched=True)
+            return
+
+        # Merge consecutive missing blocks into one Range request each
+        runs: List[List[int]] = []
+        for block in missing:
+            if runs and runs[-1][1] == block - 1:
+                runs[-1][1] = block
+            else:
+                runs.append([block, block])
+
+        headers = {"If-Match": entry.etag} if entry.etag else {}
+        with open(entry.path, "r+b") as f:
+            for start_block, end_block in runs:
+                start = start_block * self.block_size
+                end = min(entry.size, (end_block + 1) * self.block_size) - 1
+                try:
+                    response = self._request(entry.url, "GET", {**headers, "Range": f"bytes={start}-{end}"})
+                except urllib.error.HTTPError as e:
+                    if e.code == 412:
+                        raise RemoteObjectChangedError(f"Remote object changed while reading it: {entry.url}")
+                    raise
+                with response:
+                    if response.status != 206:
+                        # Range ignored: the body is the whole object
+                        start, start_block, end_block = 0, 0, self._block_count(entry) - 1
+                    f.seek(start)
+                    while True:
+                        data = response.read(COPY_BUFFER_SIZE)
+                        if not data:
+                            break
+                        f.write(data)
+                entry.blocks.update(range(start_block, end_block + 1))
+        self._save(entry, fetched=True)
+
+    def read_range(self, entry: _Entry, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        with self._url_lock(entry.url):
+            self._fetch_blocks(entry, offset // self.block_size, (offset + length - 1) // self.block_size)
+        with open(entry.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    # --- Public API ---
+
+    def version(self, url: str) -> str:
+        """Current version of the remote object (one conditional HEAD, nothing downloaded)"""
+        with self._url_lock(url):
+            entry, _ = self.validate(url)
+        return entry.version
+
+    @contextmanager
+    def local_copy(self, url: str) -> Iterator[Dict[str, Any]]:
+        """
+        Revalidate and complete the cached copy of `url`, and keep it from being
+        evicted while the caller reads it. Yields its local path, the version of
+        the remote object and whether it changed since it was last cached.
+        """
+        self._pin(url, 1)
+        try:
+            with self._url_lock(url):
+                entry, changed = self.validate(url)
+                if entry.size is None:
+                    self._download_all(entry)
+                    self._save(entry, fetched=True)
+                else:
+                    self._fetch_blocks(entry, 0, max(0, self._block_count(entry) - 1))
+            self.evict()
+            yield {"path": entry.path, "version": entry.version, "changed": changed, "size": entry.size}
+        finally:
+            self._pin(url, -1)
+
+    @contextmanager
+    def open(self, url: str) -> Iterator[RemoteFile]:
+        """Seekable file over `url` that only downloads (and caches) the blocks that are read"""
+        self._pin(url, 1)
+        try:
+            with self._url_lock(url):
+                entry, _ = self.validate(url)
+            if entry.size is None:
+                raise ValueError("The server did not report the object size; range reads are not possible")
+            yield RemoteFile(self, entry)
+        finally:
+            self._pin(url, -1)
+            self.evict()
+
+    def parquet_metadata(self, url: str) -> Dict[str, Any]:
+        """Schema and row counts of a remote Parquet file, reading only its footer"""
+        with self.open(url) as f:
+            metadata = pq.ParquetFile(f).metadata
+            schema = metadata.schema.to_arrow_schema()
+            return {
+                "url": url,
+                "size": f.size,
+                "num_rows": metadata.num_rows,
+                "num_row_groups": metadata.num_row_groups,
+                "columns": [{"name": field.name, "type": str(field.type)} for field in schema],
+            }
+
+    def _pin(self, url: str, delta: int):
+        with self._lock:
+            count = self._pinned.get(url, 0) + delta
+            if count > 0:
+                self._pinned[url] = count
+            else:
+                self._pinned.pop(url, None)
+
+    def evict(self) -> List[str]:
+        """Drop least recently used objects until the cache fits in max_bytes"""
+        conn = db.get_connection()
+        try:
+            rows = conn.execute(
+                "SELECT url, len(blocks) FROM remote_cache_entries ORDER BY last_access"
+            ).fetchall()
+            total = sum((blocks or 0) * self.block_size for _, blocks in rows)
+            evicted = []
+            for url, blocks in rows:
+                if total <= self.max_bytes:
+                    break
+                with self._lock:
+                    if self._pinned.get(url):
+                        continue
+                    self._entries.pop(url, None)
+                conn.execute("DELETE FROM remote_cache_entries WHERE url = ?", [url])
+                try:
+                    os.remove(self._path(url))
+                except FileNotFoundError:
+                    pass
+                total -= (blocks or 0) * self.block_size
+                evicted.append(url)
+            if evicted:
+                logger.info("Evicted %d objects from the remote cache", len(evicted))
+            return evicted
+        finally:
+            conn.close()
+
+
+remote_cache = RemoteObjectCache(
+    cache_dir=settings.REMOTE_CACHE_DIR,
+    max_bytes=settings.REMOTE_CACHE_MAX_BYTES,
+    block_size=settings.REMOTE_CACHE_BLOCK_SIZE,
+    timeout=settings.REMOTE_CACHE_TIMEOUT,
+)
@@ -0,0 +1,154 @@
+import uuid
+import time
+import threading
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+
+class CursorNotFoundError(LookupError):
+    """The cursor does not exist, expired, or belongs to another user"""
+
+
+class CursorLimitError(RuntimeError):
+    """Too many open cursors"""
+
+
+class ResultCursor:
+    """A live DuckDB result, read through the pooled connection it runs on"""
+
+    def __init__(self, conn, owner: str):
+        self.id = uuid.uuid4().hex
+        self.conn = conn
+        self.owner = owner
+        self.columns = [desc[0] for desc in conn.description]
+        self.created_at = time.time()
+        self.last_access = time.monotonic()
+        self.rows_fetched = 0
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def fetch_page(self, size: int) -> List[tuple]:
+        with self.lock:
+            # Closed by the reaper or a concurrent DELETE: the connection is back in the pool
+            if self.conn is None:
+                raise CursorNotFoundError(f"Cursor '{self.id}' not found or expired")
+            self.last_access = time.monotonic()
+            if self.exhausted:
+                return []
+            rows = self.conn.fetchmany(size)
+            self.rows_fetched += len(rows)
+            if len(rows) < size:
+                self.exhausted = True
+            return rows
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class ResultCursorRegistry:
+    """
+    Server-side cursors for paging through large ad-hoc results.
+    Each open cursor keeps a pooled connection checked out, so the number of
+    open cursors is capped and idle ones are closed by a reaper thread.
+    """
+
+    def __init__(self, idle_timeout: float, max_open: int, max_per_user: int):
+        self.idle_timeout = idle_timeout
+        self.max_open = max_open
+        self.max_per_user = max_per_user
+        self._cursors: Dict[str, ResultCursor] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _ensure_reaper(self):
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name="result-cursor-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 4))
+            self.reap()
+
+    def reap(self) -> int:
+        """Close cursors idle for longer than the timeout"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [c for c in self._cursors.values() if now - c.last_access > self.idle_timeout]
+            for c in expired:
+                del self._cursors[c.id]
+        for c in expired:
+            c.close()
+        return len(expired)
+
+    def open(self, conn, owner: str) -> ResultCursor:
+        """Register the result pending on `conn` (a detached pooled connection) and take ownership of it"""
+        with self._lock:
+            owned = sum(1 for c in self._cursors.values() if c.owner == owner)
+            if len(self._cursors) >= self.max_open or owned >= self.max_per_user:
+                conn.close()
+                raise CursorLimitError(
+                    "Too many open cursors. Close unused cursors or wait for them to expire."
+                )
+            result_cursor = ResultCursor(conn, owner)
+            self._cursors[result_cursor.id] = result_cursor
+        self._ensure_reaper()
+        return result_cursor
+
+    def get(self, cursor_id: str, owner: str) -> ResultCursor:
+        with self._lock:
+            result_cursor = self._cursors.get(cursor_id)
+            if result_cursor is None or result_cursor.owner != owner:
+                raise CursorNotFoundError(f"Cursor '{cursor_id}' not found or expired")
+            # Touched under the registry lock so the reaper cannot expire it before it is used
+            result_cursor.last_access = time.monotonic()
+        return result_cursor
+
+    def fetch(self, cursor_id: str, owner: str, size: int) -> Dict[str, Any]:
+        result_cursor = self.get(cursor_id, owner)
+        try:
+            rows = result_cursor.fetch_page(size)
+        except CursorNotFoundError:
+            raise
+        except Exception:
+            # Cancelled or failed mid-read: the result is gone
+            with self._lock:
+                self._cursors.pop(cursor_id, None)
+            result_cursor.close()
+            raise
+        # Release the connection as soon as the result is fully read
+        if result_cursor.exhausted:
+            with self._lock:
+                self._cursors.pop(cursor_id, None)
+            result_cursor.close()
+        return self.page(result_cursor, rows)
+
+    def page(self, result_cursor: ResultCursor, rows: List[tuple]) -> Dict[str, Any]:
+        return {
+            "cursor_id": result_cursor.id,
+            "columns": result_cursor.columns,
+            "rows": [dict(zip(result_cursor.columns, row)) for row in rows],
+            "rows_fetched": result_cursor.rows_fetched,
+            "has_more": not result_cursor.exhausted,
+            "expires_in": self.idle_timeout,
+        }
+
+    def close(self, cursor_id: str, owner: str):
+        result_cursor = self.get(cursor_id, owner)
+        with self._lock:
+            self._cursors.pop(cursor_id, None)
+        result_cursor.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"open": len(self._cursors), "max_open": self.max_open}
+
+
+result_cursors = ResultCursorRegistry(
+    idle_timeout=settings.RESULT_CURSOR_IDLE_TIMEOUT,
+    max_open=settings.RESULT_CURSOR_MAX_OPEN,
+    max_per_user=settings.RESULT_CURSOR_MAX_PER_USER,
+)
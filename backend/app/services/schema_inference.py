@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import codecs
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Union
+import duckdb
+from app.core.config import settings
+from app.infra.database import db
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BLOCK = 1024 * 1024
+ENCODING_SAMPLE_BLOCK = 256 * 1024
+ENCODING_SAMPLES = 4
+
+# One step wider for each type; a column that still fails ends up as VARCHAR
+WIDEN = {
+    "BOOLEAN": "VARCHAR",
+    "TINYINT": "BIGINT",
+    "SMALLINT": "BIGINT",
+    "INTEGER": "BIGINT",
+    "BIGINT": "DOUBLE",
+    "HUGEINT": "DOUBLE",
+    "FLOAT": "DOUBLE",
+    "DOUBLE": "VARCHAR",
+    "DATE": "TIMESTAMP",
+    "TIME": "VARCHAR",
+    "TIMESTAMP": "VARCHAR",
+    "TIMESTAMP WITH TIME ZONE": "VARCHAR",
+}
+
+_CONVERSION_COLUMN = re.compile(r'converting column "(.+?)"')
+_CONVERSION_VALUE = re.compile(r'Could not convert string "(.*?)" to')
+INTEGER_TYPES = {"TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT"}
+
+
+def _is_encoding_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return "invalid unicode" in message or "utf-8" in message
+
+
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class CsvSchema:
+    """Dialect and column types of a CSV file, as passed explicitly to read_csv"""
+
+    def __init__(self, fingerprint: str, options: Dict[str, Any], columns: List[List[str]]):
+        self.fingerprint = fingerprint
+        self.options = options
+        self.columns = columns
+
+    def read_csv(self, path: Union[str, List[str]], hive_partitioning: bool = False) -> str:
+        """read_csv(...) expression with auto-detection disabled, over one file or a list of files"""
+        o = self.options
+        if isinstance(path, str):
+            source = _sql_string(path)
+        else:
+            source = "[" + ", ".join(_sql_string(p) for p in path) + "]"
+        args = [
+            source,
+            "auto_detect=false",
+            "header=true",
+            f"delim={_sql_string(o['delim'])}",
+            f"quote={_sql_string(o['quote'])}",
+            f"escape={_sql_string(o['escape'])}",
+            f"skip={int(o.get('skip') or 0)}",
+            f"encoding={_sql_string(o['encoding'])}",
+        ]
+        if o.get("dateformat"):
+            args.append(f"dateformat={_sql_string(o['dateformat'])}")
+        if o.get("timestampformat"):
+            args.append(f"timestampformat={_sql_string(o['timestampformat'])}")
+        if hive_partitioning:
+            args.append("hive_partitioning=true")
+        columns = ", ".join(f"{_sql_string(name)}: {_sql_string(col_type)}" for name, col_type in self.columns)
+        args.append(f"columns={{{columns}}}")
+        return f"read_csv({', '.join(args)})"
+
+
+class SchemaInferenceService:
+    """
+    Adaptive CSV schema inference. Instead of read_csv_auto(sample_size=-1),
+    which scans the whole file to infer types and then reads it again to load
+    it, the encoding is detected from a few byte samples, the dialect and types
+    come from sniff_csv over a row sample, and the result is cached by file
+    fingerprint. The load passes explicit columns; if a value in the unsampled
+    part does not fit, only the offending column is widened and the load retried.
+    """
+
+    def __init__(self, sample_rows: int, max_widenings: int):
+        self.sample_rows = sample_rows
+        self.max_widenings = max_widenings
+        self._memo: Dict[str, CsvSchema] = {}
+        self._lock = threading.Lock()
+        # Conversion worker processes cannot open the application database; they keep schemas in memory only
+        self.persistent = True
+
+    # --- Sampling ---
+
+    def fingerprint(self, path: str) -> str:
+        """Hash of the size and the first and last MB: cheap, and stable across re-uploads"""
+        size = os.path.getsize(path)
+        hasher = hashlib.sha256(str(size).encode())
+        with open(path, "rb") as f:
+            hasher.update(f.read(FINGERPRINT_BLOCK))
+            if size > FINGERPRINT_BLOCK:
+                f.seek(max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK))
+                hasher.update(f.read(FINGERPRINT_BLOCK))
+        return hasher.hexdigest()
+
+    def detect_encoding(self, path: str) -> str:
+        """UTF-8 unless a byte sample from the start, middle or end says otherwise"""
+        size = os.path.getsize(path)
+        offsets = [0] + [size * i // ENCODING_SAMPLES for i in range(1, ENCODING_SAMPLES)] + [max(0, size - ENCODING_SAMPLE_BLOCK)]
+        with open(path, "rb") as f:
+            for offset in sorted(set(offsets)):
+                f.seek(offset)
+                block = f.read(ENCODING_SAMPLE_BLOCK if offset else FINGERPRINT_BLOCK)
+                if offset:
+                    # Skip continuation bytes of a character cut by the offset
+                    block = block.lstrip(bytes(range(0x80, 0xC0)))
+                if offset == 0 and block.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                    return "utf-16"
+                try:
+                    # final=False tolerates a character cut at the end of the block
+                    codecs.getincrementaldecoder("utf-8")().decode(block, final=False)
+                except UnicodeDecodeError:
+                    return "latin-1"
+        return "utf-8"
+
+    # --- Schema cache ---
+
+    def _load_cached(self, fingerprint: str) -> Optional[CsvSchema]:
+        with self._lock:
+            schema = self._memo.get(fingerprint)
+        if schema or not self.persistent:
+            return schema
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT options, columns FROM csv_schema_cache WHERE fingerprint = ?", [fingerprint]
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        schema = CsvSchema(fingerprint, json.loads(row[0]), json.loads(row[1]))
+        with self._lock:
+            self._memo[fingerprint] = schema
+        return schema
+
+    def _store(self, schema: CsvSchema):
+        with self._lock:
+            self._memo[schema.fingerprint] = schema
+        if not self.persistent:
+            return
+        conn = db.get_connection()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO csv_schema_cache (fingerprint, options, columns, updated_at) VALUES (?, ?, ?, ?)",
+                [schema.fingerprint, json.dumps(schema.options), json.dumps(schema.columns), datetime.now()]
+            )
+        finally:
+            conn.close()
+
+    # --- Inference ---
+
+    def _sniff(self, conn, path: str, encoding: str) -> Dict[str, Any]:
+        row = conn.execute(
+            f"SELECT Delimiter, Quote, Escape, SkipRows, Columns, DateFormat, TimestampFormat "
+            f"FROM sniff_csv({_sql_string(path)}, header=true, sample_size={int(self.sample_rows)}, encoding={_sql_string(encoding)})"
+        ).fetchone()
+        delim, quote, escape, skip, columns, dateformat, timestampformat = row
+        empty = (None, "", "(empty)")
+        return {
+            # Quotes absent from the sample can still appear later on; keep the standard ones
+            "options": {
+                "delim": delim,
+                "quote": '"' if quote in empty else quote,
+                "escape": '"' if escape in empty else escape,
+                "skip": skip,
+                "encoding": encoding,
+                "dateformat": None if dateformat in empty else dateformat,
+                "timestampformat": None if timestampformat in empty else timestampformat,
+            },
+            "columns": [[c["name"], c["type"]] for c in columns],
+        }
+
+    def infer(self, conn, path: str) -> CsvSchema:
+        """Schema of a CSV file, from the cache or from a sampled sniff"""
+        fingerprint = self.fingerprint(path)
+        schema = self._load_cached(fingerprint)
+        if schema:
+            return schema
+        encoding = self.detect_encoding(path)
+        try:
+            sniffed = self._sniff(conn, path, encoding)
+        except duckdb.Error as e:
+            if encoding == "latin-1" or not _is_encoding_error(e):
+                raise
+            sniffed = self._sniff(conn, path, "latin-1")
+        schema = CsvSchema(fingerprint, sniffed["options"], sniffed["columns"])
+        self._store(schema)
+        return schema
+
+    def widen(self, schema: CsvSchema, error: Exception) -> Optional[CsvSchema]:
+        """A wider schema that may get past `error`, or None if it cannot be fixed by widening"""
+        if _is_encoding_error(error) and schema.options["encoding"] != "latin-1":
+            return CsvSchema(schema.fingerprint, {**schema.options, "encoding": "latin-1"}, schema.columns)
+
+        match = _CONVERSION_COLUMN.search(str(error))
+        if not match:
+            return None
+        name = match.group(1)
+        value = _CONVERSION_VALUE.search(str(error))
+        columns = []
+        widened = False
+        for col_name, col_type in schema.columns:
+            if col_name == name and col_type in WIDEN:
+                col_type = self._wider_type(col_type, value.group(1) if value else None)
+                widened = True
+            columns.append([col_name, col_type])
+        if not widened:
+            return None
+        return CsvSchema(schema.fingerprint, schema.options, columns)
+
+    def _wider_type(self, col_type: str, value: Optional[str]) -> str:
+        """Narrowest type above `col_type` that can hold the value that failed, so each retry counts"""
+        if value is None:
+            return WIDEN[col_type]
+        if col_type in INTEGER_TYPES or col_type in ("FLOAT", "DOUBLE"):
+            try:
+                int(value)
+                return "BIGINT" if col_type in INTEGER_TYPES and col_type != "BIGINT" else "DOUBLE"
+            except ValueError:
+                pass
+            try:
+                float(value)
+                return "DOUBLE"
+            except ValueError:
+                return "VARCHAR"
+        return WIDEN[col_type]
+
+    def load_csv(self, conn, path: Union[str, List[str]], statement: Callable[[str], str], hive_partitioning: bool = False):
+        """
+        Run `statement(read_csv_expression)` with an explicit schema, widening
+        the failing column (or switching to latin-1) only when the load fails.
+        For a list of files the schema is inferred from the first one.
+        """
+        schema = self.infer(conn, path if isinstance(path, str) else path[0])
+        for _ in range(self.max_widenings + 1):
+            try:
+                return conn.execute(statement(schema.read_csv(path, hive_partitioning)))
+            except duckdb.Error as e:
+                widened = self.widen(schema, e)
+                if widened is None:
+                    raise
+                logger.info("CSV load of %s failed (%s); retrying with a wider schema", path, str(e).splitlines()[0])
+                schema = widened
+                # Next time this file loads with the schema that worked
+                self._store(schema)
+        return conn.execute(statement(schema.read_csv(path, hive_partitioning)))
+
+
+schema_inference = SchemaInferenceService(
+    sample_rows=settings.CSV_INFERENCE_SAMPLE_ROWS,
+    max_widenings=settings.CSV_INFERENCE_MAX_WIDENINGS,
+)
@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.infra.database import db
+from app.services.query_scheduler import query_scheduler, LANE_INGEST
+from app.schemas.ai import TrainRequest, TrainingJob
+
+# ai_service (and with it TensorFlow) is imported where it is used: a worker
+# process must set its thread limits before TensorFlow is loaded.
+
+logger = logging.getLogger(__name__)
+
+KIND_TRAIN = "train"
+KIND_RETRAIN = "retrain"
+
+STAGING_DIR = os.path.join("models", "staging")
+# How often a worker checks that the server that started it is still alive
+PARENT_CHECK_INTERVAL = 2.0
+
+JOB_COLUMNS = "id, model_id, kind, status, request, threads, pid, error, attempts, cancel_requested, created_at, started_at, finished_at"
+
+
+class TrainingJobNotFoundError(LookupError):
+    """The job does not exist"""
+
+
+def _watch_parent(parent_pid: int):
+    # A worker must not outlive the server (e.g. killed with SIGKILL): its job is queued again on restart
+    while True:
+        if os.getppid() != parent_pid:
+            os._exit(1)
+        time.sleep(PARENT_CHECK_INTERVAL)
+
+
+def _train_worker(model_id: str, request: Dict[str, Any], data_path: str, source_rows: int, threads: int, parent_pid: int):
+    """Entry point of a training worker process"""
+    threading.Thread(target=_watch_parent, args=(parent_pid,), daemon=True).start()
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = str(min(2, threads))
+
+    import tensorflow as tf
+    from threadpoolctl import threadpool_limits
+    from app.services.ai_service import ai_service
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(min(2, threads))
+    except (RuntimeError, AttributeError):
+        pass
+    # BLAS/OpenMP pools of NumPy and scikit-learn
+    with threadpool_limits(limits=threads):
+        ai_service._train_implementation(model_id, TrainRequest(**request), data_path, threads, source_rows)
+
+
+class TrainingJobService:
+    """
+    Persistent queue of model training jobs. Each job is a row in
+    `training_jobs`; up to `workers` run at once, each in its own spawned
+    process so training does not compete with request handling for the GIL,
+    and a crash only takes the worker down. The server process stages the
+    dataset to Parquet (workers cannot open the database) and the worker
+    trains from that file under the job's thread limit. Progress is still
+    written to the model metadata by the training code itself.
+    """
+
+    def __init__(self, workers: int, threads: int, max_attempts: int):
+        self.workers = max(1, workers)
+        self.threads = max(1, threads)
+        self.max_attempts = max_attempts
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._processes: Dict[str, multiprocessing.Process] = {}
+        self._active = 0
+        # Jobs are dispatched once recover() has run at startup, and no longer while shutting down
+        self._started = False
+        self._stopping = False
+
+    # --- Persistence ---
+
+    def _row_to_job(self, row) -> TrainingJob:
+        return TrainingJob(
+            id=row[0],
+            model_id=row[1],
+            kind=row[2],
+            status=row[3],
+            request=json.loads(row[4]) if row[4] else {},
+            threads=row[5],
+            pid=row[6],
+            error=row[7],
+            attempts=row[8] or 0,
+            cancel_requested=bool(row[9]),
+            created_at=row[10],
+            started_at=row[11],
+            finished_at=row[12],
+        )
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conn = db.get_connection()
+        try:
+            conn.execute(f"UPDATE training_jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+        finally:
+            conn.close()
+
+    def get(self, job_id: str) -> TrainingJob:
+        conn = db.get_connection()
+        try:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM training_jobs WHERE id = ?", [job_id]).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            raise TrainingJobNotFoundError(f"Training job '{job_id}' not found")
+        return self._row_to_job(row)
+
+    def list(self, status: Optional[str] = None, model_id: Optional[str] = None, limit: int = 50) -> List[TrainingJob]:
+        query = f"SELECT {JOB_COLUMNS} FROM training_jobs"
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if model_id:
+            conditions.append("model_id = ?")
+            params.append(model_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        conn = db.get_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return [self._row_to_job(row) for row in rows]
+
+    def _active_job(self, model_id: str) -> Optional[str]:
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT id FROM training_jobs WHERE model_id = ? AND status IN ('queued', 'running')", [model_id]
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def submit(self, model_id: str, kind: str, request: TrainRequest, prepare: Optional[Callable[[], None]] = None) -> TrainingJob:
+        """
+        Queue training of `model_id`; a model has at most one queued or running job.
+        `prepare` runs once the job is accepted, before it can be dispatched.
+        """
+        with self._lock:
+            if self._active_job(model_id):
+                raise ValueError("This model already has a training job queued or running")
+            if prepare is not None:
+                prepare()
+            job_id = uuid.uuid4().hex
+            conn = db.get_connection()
+            try:
+                conn.execute(
+                    "INSERT INTO training_jobs (id, model_id, kind, status, request, threads, created_at) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                    [job_id, model_id, kind, request.model_dump_json(), request.threads or self.threads, datetime.now()]
+                )
+            finally:
+                conn.close()
+        self._dispatch()
+        return self.get(job_id)
+
+    # --- Scheduling ---
+
+    def _claim_next(self) -> Optional[TrainingJob]:
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM training_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE training_jobs SET status = 'running', started_at = ?, attempts = attempts + 1, error = NULL WHERE id = ?",
+                [datetime.now(), row[0]]
+            )
+        finally:
+            conn.close()
+        return self._row_to_job(row)
+
+    def _dispatch(self):
+        """Start queued jobs while fewer than `workers` are running"""
+        with self._lock:
+            while self._started and not self._stopping and self._active < self.workers:
+                job = self._claim_next()
+                if job is None:
+                    break
+                self._active += 1
+                threading.Thread(target=self._run, args=(job,), name=f"training-{job.id[:8]}", daemon=True).start()
+
+    def _stage(self, job: TrainingJob, path: str) -> int:
+        """
+        Copy the training columns to Parquet for the worker (a sample, unless
+        full_data), in the ingest lane like any bulk read. Returns the row count
+        of the whole dataset.
+        """
+        from app.services.ai_service import ai_service
+        request = TrainRequest(**job.request)
+        relation = f'"{request.dataset_name}"'
+        os.makedirs(STAGING_DIR, exist_ok=True)
+        with query_scheduler.slot(LANE_INGEST):
+            conn = db.get_connection()
+            try:
+                source_rows = conn.execute(f"SELECT count(*) FROM {relation}").fetchone()[0]
+                query = ai_service.training_query(request, relation, sample=not request.full_data)
+                conn.execute(f"COPY ({query}) TO '{path}' (FORMAT 'parquet')")
+            finally:
+                conn.close()
+        return source_rows
+
+    def _outcome(self, job: TrainingJob, exitcode: Optional[int]) -> tuple:
+        from app.services.ai_service import ai_service
+        if self.get(job.id).cancel_requested:
+            return "cancelled", "Training cancelled"
+        if exitcode != 0:
+            return "failed", f"Training worker exited with code {exitcode}"
+        # The training code records its own failures in the model metadata
+        try:
+            with open(ai_service._get_metadata_path(job.model_id), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return "failed", "Model metadata not found after training"
+        if meta.get("status") != "completed":
+            return "failed", meta.get("error") or "Training did not complete"
+        return "succeeded", None
+
+    def _run(self, job: TrainingJob):
+        from app.services.ai_service import ai_service
+        staged = os.path.join(STAGING_DIR, f"{job.id}.parquet")
+        status, error = "failed", None
+        process = None
+        try:
+            source_rows = self._stage(job, staged)
+            with self._lock:
+                cancelled = self.get(job.id).cancel_requested
+                if not cancelled and not self._stopping:
+                    process = self._ctx.Process(
+                        target=_train_worker,
+                        args=(job.model_id, job.request, staged, source_rows, job.threads or self.threads, os.getpid()),
+                        name=f"training-{job.id[:8]}",
+                    )
+                    process.start()
+                    self._processes[job.id] = process
+            if cancelled:
+                status, error = "cancelled", "Training cancelled"
+            elif process is not None:
+                self._update(job.id, pid=process.pid)
+                process.join()
+                status, error = self._outcome(job, process.exitcode)
+        except Exception as e:
+            logger.exception("Training job %s failed", job.id)
+            error = str(e)
+        finally:
+            with self._lock:
+                self._processes.pop(job.id, None)
+                self._active -= 1
+                stopping = self._stopping
+            try:
+                os.remove(staged)
+            except OSError:
+                pass
+
+        if stopping:
+            # Interrupted by shutdown: left 'running' so recover() queues it again on the next start
+            return
+        self._update(job.id, status=status, error=error, pid=None, finished_at=datetime.now())
+        if status != "succeeded":
+            ai_service._update_progress(job.model_id, 0, "failed", error)
+        self._dispatch()
+
+    # --- Control ---
+
+    def cancel(self, job_id: str) -> TrainingJob:
+        """Cancel a queued job, or terminate the worker of a running one"""
+        from app.services.ai_service import ai_service
+        with self._lock:
+            job = self.get(job_id)
+            if job.status == "queued":
+                self._update(job_id, status="cancelled", error="Training cancelled", finished_at=datetime.now())
+                ai_service._update_progress(job.model_id, 0, "failed", "Training cancelled")
+            elif job.status == "running":
+                # _run records the outcome once the worker has exited (or skips starting it while staging)
+                self._update(job_id, cancel_requested=True)
+                process = self._processes.get(job_id)
+                if process is not None:
+                    process.terminate()
+            else:
+                raise ValueError(f"Only queued or running jobs can be cancelled (job is '{job.status}')")
+        return self.get(job_id)
+
+    def cancel_model(self, model_id: str):
+        """Cancel the active job of a model, if any (e.g. before deleting it)"""
+        job_id = self._active_job(model_id)
+        if job_id:
+            try:
+                self.cancel(job_id)
+            except ValueError:
+                pass
+
+    def recover(self) -> Dict[str, int]:
+        """
+        Called at startup. Jobs left running by a previous process are queued
+        again (training starts over) until they have been started max_attempts
+        times; then they are marked failed. Queued jobs simply start.
+        """
+        from app.services.ai_service import ai_service
+        conn = db.get_connection()
+        try:
+            exhausted = conn.execute(
+                "SELECT id, model_id, cancel_requested FROM training_jobs WHERE status = 'running' AND (attempts >= ? OR cancel_requested)",
+                [self.max_attempts]
+            ).fetchall()
+            for job_id, model_id, cancel_requested in exhausted:
+                error = "Training cancelled" if cancel_requested else "Interrupted by a server restart"
+                conn.execute(
+                    "UPDATE training_jobs SET status = ?, pid = NULL, error = ?, finished_at = ? WHERE id = ?",
+                    ["cancelled" if cancel_requested else "failed", error, datetime.now(), job_id]
+                )
+                ai_service._update_progress(model_id, 0, "failed", error)
+            requeued = conn.execute(
+                "UPDATE training_jobs SET status = 'queued', pid = NULL WHERE status = 'running'"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        with self._lock:
+            self._started = True
+            self._stopping = False
+        self._dispatch()
+        return {"failed": len(exhausted), "requeued": requeued}
+
+    def shutdown(self):
+        """Stop dispatching and terminate running workers; their jobs resume on the next start"""
+        with self._lock:
+            self._stopping = True
+            processes = list(self._processes.values())
+        for process in processes:
+            process.terminate()
+
+
+training_jobs = TrainingJobService(
+    workers=settings.TRAINING_WORKERS,
+    threads=settings.TRAINING_THREADS,
+    max_attempts=settings.TRAINING_MAX_ATTEMPTS,
+)
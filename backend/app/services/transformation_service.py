@@ -1,8 +1,33 @@
 import re
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import time
+import logging
+import threading
+import duckdb
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Iterable
+from datetime import datetime, timedelta
+from app.core.config import settings
 from app.infra.database import db
+from app.services.lineage_service import lineage_service
+from app.services.query_scheduler import query_scheduler, LANE_INGEST
 from app.models.transformation import TransformationCreate, TransformationUpdate, TransformationResponse
+from app.schemas.transformation import (
+    MaterializationConfig,
+    MaterializationStatus,
+    RefreshResult,
+    RefreshPlanResult,
+    LineageNode
+)
+
+logger = logging.getLogger(__name__)
+
+# Refrescos de nodos materializados; las ramas independientes del grafo corren en paralelo
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=settings.TRANSFORMATION_REFRESH_WORKERS,
+    thread_name_prefix="transformation-refresh",
+)
+# Planes disparados por la recarga de una tabla origen, de uno en uno
+_cascade_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transformation-cascade")
 
 
 class TransformationService:
@@ -18,10 +43,19 @@ class TransformationService:
     
     FORBIDDEN_KEYWORDS = {'DROP', 'DELETE', 'INSERT', 'UPDATE', 'ALTER', 'CREATE TABLE',
                           'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE'}
+
+    MATERIALIZATION_COLUMNS = "id, name, sql_definition, materialized, refresh_mode, refresh_interval_seconds, watermark_column, last_refreshed_at, last_watermark"
+
+    def __init__(self):
+        # Un lock por transformación evita dos refrescos simultáneos de la misma tabla
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._scheduler: Optional[threading.Thread] = None
     
-    def validate_sql(self, sql: str, source_table: str) -> tuple[bool, Optional[str]]:
+    def validate_sql(self, sql: str, source_table: str, conn=None) -> tuple[bool, Optional[str]]:
         """
-        Valida que el SQL sea seguro y válido
+        Valida que el SQL sea seguro y válido.
+        Si se recibe `conn` se reutiliza en lugar de tomar otra del pool.
         Returns: (is_valid, error_message)
         """
         sql_upper = sql.upper()
@@ -35,7 +69,9 @@ class TransformationService:
             return False, "La transformación debe contener una consulta SELECT"
         
         # Verificar que la tabla origen exista
-        conn = db.get_connection()
+        owns_conn = conn is None
+        if owns_conn:
+            conn = db.get_connection()
         try:
             # Verificar si es tabla o vista
             check_query = """
@@ -49,19 +85,20 @@ class TransformationService:
             if not result:
                 return False, f"La tabla/vista origen '{source_table}' no existe"
         finally:
-            conn.close()
+            if owns_conn:
+                conn.close()
         
         return True, None
     
     def create_transformation(self, transformation: TransformationCreate) -> TransformationResponse:
         """Crea una nueva transformación y su vista en DuckDB"""
-        # Validar SQL
-        is_valid, error_msg = self.validate_sql(transformation.sql_definition, transformation.source_table)
-        if not is_valid:
-            raise ValueError(error_msg)
-        
         conn = db.get_connection()
         try:
+            # Validar SQL
+            is_valid, error_msg = self.validate_sql(transformation.sql_definition, transformation.source_table, conn)
+            if not is_valid:
+                raise ValueError(error_msg)
+            
             # Verificar que el nombre no exista
             check = conn.execute(
                 "SELECT id FROM transformations WHERE name = ?",
@@ -95,6 +132,9 @@ class TransformationService:
             
             result = conn.execute("SELECT id FROM transformations WHERE name = ?", [transformation.name]).fetchone()
             transformation_id = result[0]
+
+            lineage_service.record(conn, transformation.name, transformation.sql_definition, transformation.source_table)
+            lineage_service.invalidate([transformation.name], conn)
             
             return TransformationResponse(
                 id=transformation_id,
@@ -136,24 +176,28 @@ class TransformationService:
         """Obtiene una transformación por ID"""
         conn = db.get_connection()
         try:
-            query = "SELECT id, name, description, source_table, sql_definition, created_at, updated_at, dashboard_id FROM transformations WHERE id = ?"
-            result = conn.execute(query, [transformation_id]).fetchone()
-            
-            if not result:
-                return None
-            
-            return TransformationResponse(
-                id=result[0],
-                name=result[1],
-                description=result[2],
-                source_table=result[3],
-                sql_definition=result[4],
-                created_at=result[5],
-                updated_at=result[6],
-                dashboard_id=result[7] if len(result) > 7 else None
-            )
+            return self._fetch_transformation(conn, transformation_id)
         finally:
             conn.close()
+
+    def _fetch_transformation(self, conn, transformation_id: int) -> Optional[TransformationResponse]:
+        """Lee una transformación usando una conexión ya obtenida del pool"""
+        query = "SELECT id, name, description, source_table, sql_definition, created_at, updated_at, dashboard_id FROM transformations WHERE id = ?"
+        result = conn.execute(query, [transformation_id]).fetchone()
+        
+        if not result:
+            return None
+        
+        return TransformationResponse(
+            id=result[0],
+            name=result[1],
+            description=result[2],
+            source_table=result[3],
+            sql_definition=result[4],
+            created_at=result[5],
+            updated_at=result[6],
+            dashboard_id=result[7] if len(result) > 7 else None
+        )
     
     def update_transformation(self, transformation_id: int, update: TransformationUpdate) -> Optional[TransformationResponse]:
         """Actualiza una transformación existente"""
@@ -161,7 +205,7 @@ class TransformationService:
         try:
             # Verificar que existe
             existing = conn.execute(
-                "SELECT name, sql_definition FROM transformations WHERE id = ?",
+                "SELECT name, sql_definition, source_table, materialized FROM transformations WHERE id = ?",
                 [transformation_id]
             ).fetchone()
             
@@ -185,8 +229,8 @@ class TransformationService:
                 params.append(update.source_table)
             if update.sql_definition is not None:
                 # Validar nuevo SQL
-                source_table = update.source_table if update.source_table else existing[1]
-                is_valid, error_msg = self.validate_sql(update.sql_definition, source_table)
+                source_table = update.source_table if update.source_table else existing[2]
+                is_valid, error_msg = self.validate_sql(update.sql_definition, source_table, conn)
                 if not is_valid:
                     raise ValueError(error_msg)
                 updates.append("sql_definition = ?")
@@ -194,7 +238,7 @@ class TransformationService:
             
             if not updates:
                 # No hay nada que actualizar
-                return self.get_transformation(transformation_id)
+                return self._fetch_transformation(conn, transformation_id)
             
             # Actualizar timestamp
             updates.append("updated_at = ?")
@@ -208,16 +252,31 @@ class TransformationService:
             # Actualizar la vista si cambió el nombre o SQL
             new_name = update.name if update.name else old_name
             new_sql = update.sql_definition if update.sql_definition else existing[1]
+            new_source = update.source_table if update.source_table else existing[2]
             
-            # Eliminar vista antigua si cambió el nombre
+            # Eliminar vista o tabla antigua si cambió el nombre
             if update.name and update.name != old_name:
-                conn.execute(f'DROP VIEW IF EXISTS "{old_name}"')
+                self._drop_relation(conn, old_name)
             
-            # Recrear vista
-            view_sql = f'CREATE OR REPLACE VIEW "{new_name}" AS {new_sql}'
-            conn.execute(view_sql)
+            if existing[3]:
+                # Transformación materializada: reconstruir la tabla completa
+                self._materialize(conn, new_name, new_sql, None, full=True)
+                conn.execute(
+                    "UPDATE transformations SET last_refreshed_at = ?, last_watermark = NULL WHERE id = ?",
+                    [datetime.now(), transformation_id]
+                )
+            else:
+                # Recrear vista
+                view_sql = f'CREATE OR REPLACE VIEW "{new_name}" AS {new_sql}'
+                conn.execute(view_sql)
+
+            # Lo que leía del nombre antiguo queda roto; lo que lee del nuevo, desactualizado
+            lineage_service.invalidate([old_name, new_name], conn)
+            if new_name != old_name:
+                lineage_service.forget(conn, old_name)
+            lineage_service.record(conn, new_name, new_sql, new_source)
             
-            return self.get_transformation(transformation_id)
+            return self._fetch_transformation(conn, transformation_id)
         finally:
             conn.close()
     
@@ -236,8 +295,10 @@ class TransformationService:
             
             view_name = result[0]
             
-            # Eliminar vista
-            conn.execute(f'DROP VIEW IF EXISTS "{view_name}"')
+            # Eliminar vista (o tabla si está materializada)
+            self._drop_relation(conn, view_name)
+            lineage_service.invalidate([view_name], conn)
+            lineage_service.forget(conn, view_name)
             
             # Eliminar metadatos
             conn.execute("DELETE FROM transformations WHERE id = ?", [transformation_id])
@@ -246,55 +307,435 @@ class TransformationService:
         finally:
             conn.close()
     
-    def preview_transformation(self, source_table: str, sql_definition: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """Preview de una transformación sin guardarla"""
-        # Validar SQL
-        is_valid, error_msg = self.validate_sql(sql_definition, source_table)
-        if not is_valid:
-            raise ValueError(error_msg)
-        
+    def _fetch_records(self, conn, sql: str, params: Optional[list] = None) -> tuple[List[str], List[Dict[str, Any]]]:
+        """Ejecuta la consulta una sola vez y lee esquema y filas del mismo resultado"""
+        cursor = conn.execute(sql, params or [])
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+        return columns, [dict(zip(columns, row)) for row in rows]
+
+    def _estimated_rows(self, conn, source_table: str) -> int:
+        """
+        Filas aproximadas de la tabla origen. Las tablas usan la estimación de DuckDB;
+        los datasets externos (vistas sobre Parquet) el recuento guardado en
+        dataset_metadata o, si no lo hay, los metadatos de sus ficheros Parquet.
+        """
+        result = conn.execute(
+            "SELECT estimated_size FROM duckdb_tables() WHERE table_name = ?",
+            [source_table]
+        ).fetchone()
+        if result:
+            return result[0]
+
+        result = conn.execute(
+            "SELECT row_count, source_path, segment_paths FROM dataset_metadata WHERE table_name = ?",
+            [source_table]
+        ).fetchone()
+        if not result:
+            return 0
+        row_count, source_path, segment_paths = result
+        if row_count is not None:
+            return row_count
+        if not source_path:
+            return 0
+        try:
+            return conn.execute(
+                "SELECT coalesce(sum(num_rows), 0) FROM parquet_file_metadata(?)",
+                [[source_path] + list(segment_paths or [])]
+            ).fetchone()[0]
+        except duckdb.Error:
+            return 0
+
+    def _should_sample(self, conn, source_table: str) -> bool:
+        return self._estimated_rows(conn, source_table) > settings.TRANSFORMATION_PREVIEW_SAMPLE_THRESHOLD
+
+    def preview_transformation(
+        self,
+        source_table: str,
+        sql_definition: str,
+        limit: int = 100,
+        sample: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """
+        Preview de una transformación sin guardarla.
+        Con `sample` la tabla origen se sustituye por una muestra fija de
+        TRANSFORMATION_PREVIEW_SAMPLE_ROWS filas; si es None se muestrea
+        automáticamente cuando la tabla supera el umbral configurado.
+        """
         conn = db.get_connection()
         try:
+            # Validar SQL con la misma conexión
+            is_valid, error_msg = self.validate_sql(sql_definition, source_table, conn)
+            if not is_valid:
+                raise ValueError(error_msg)
+
+            if sample is None:
+                sample = self._should_sample(conn, source_table)
+
             # Ejecutar query con límite
             preview_sql = f"SELECT * FROM ({sql_definition}) AS preview_query LIMIT {limit}"
-            results = conn.execute(preview_sql).fetchall()
-            
-            if not results:
-                return []
-            
-            # Obtener nombres de columnas
-            columns = [desc[0] for desc in conn.execute(preview_sql).description]
-            
-            # Convertir a lista de diccionarios
-            return [
-                {columns[i]: value for i, value in enumerate(row)}
-                for row in results
-            ]
+            if sample:
+                # Un CTE con el nombre de la tabla origen la sustituye por la muestra
+                sample_rows = settings.TRANSFORMATION_PREVIEW_SAMPLE_ROWS
+                preview_sql = (
+                    f'WITH "{source_table}" AS (SELECT * FROM main."{source_table}" '
+                    f'USING SAMPLE reservoir({sample_rows} ROWS) REPEATABLE (42)) {preview_sql}'
+                )
+
+            columns, data = self._fetch_records(conn, preview_sql)
+            return {"data": data, "columns": columns, "count": len(data), "sampled": sample}
         finally:
             conn.close()
     
     def get_transformation_data(self, transformation_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
         """Obtiene datos de una transformación existente"""
-        transformation = self.get_transformation(transformation_id)
-        if not transformation:
-            raise ValueError(f"Transformación con ID {transformation_id} no encontrada")
-        
         conn = db.get_connection()
         try:
-            query = f'SELECT * FROM "{transformation.name}" LIMIT {limit}'
-            results = conn.execute(query).fetchall()
-            
-            if not results:
-                return []
+            transformation = self._fetch_transformation(conn, transformation_id)
+            if not transformation:
+                raise ValueError(f"Transformación con ID {transformation_id} no encontrada")
             
-            columns = [desc[0] for desc in conn.execute(query).description]
-            
-            return [
-                {columns[i]: value for i, value in enumerate(row)}
-                for row in results
-            ]
+            query = f'SELECT * FROM "{transformation.name}" LIMIT {limit}'
+            _, data = self._fetch_records(conn, query)
+            return data
+        finally:
+            conn.close()
+
+    def get_lineage(self, transformation_id: int) -> Optional[LineageNode]:
+        """De qué lee una transformación y qué se rompe o queda desactualizado si cambia"""
+        conn = db.get_connection()
+        try:
+            transformation = self._fetch_transformation(conn, transformation_id)
+            if not transformation:
+                return None
+            return LineageNode(
+                name=transformation.name,
+                upstream=lineage_service.upstream(conn, transformation.name),
+                downstream=lineage_service.downstream(conn, [transformation.name]),
+            )
+        finally:
+            conn.close()
+
+    # --- Materialización ---
+
+    def _relation_type(self, conn, name: str) -> Optional[str]:
+        """'BASE TABLE', 'VIEW' o None si no existe"""
+        result = conn.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_schema = 'main' AND table_name = ?",
+            [name]
+        ).fetchone()
+        return result[0] if result else None
+
+    def _drop_relation(self, conn, name: str):
+        # DuckDB no permite DROP VIEW sobre una tabla ni al revés
+        kind = self._relation_type(conn, name)
+        if kind == 'VIEW':
+            conn.execute(f'DROP VIEW IF EXISTS "{name}"')
+        elif kind is not None:
+            conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+
+    def _refresh_lock(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._refresh_locks.setdefault(name, threading.Lock())
+
+    def _materialize(self, conn, name: str, sql: str, watermark_column: Optional[str], full: bool) -> Dict[str, Any]:
+        """
+        Escribe el resultado de la transformación en la tabla `name`.
+        Con columna watermark y tabla existente solo inserta las filas nuevas.
+        """
+        kind = self._relation_type(conn, name)
+        last = None
+        if not full and watermark_column and kind == 'BASE TABLE':
+            last = conn.execute(f'SELECT max("{watermark_column}") FROM "{name}"').fetchone()[0]
+
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            if last is not None:
+                mode = "incremental"
+                inserted = conn.execute(
+                    f'INSERT INTO "{name}" SELECT * FROM ({sql}) AS src WHERE src."{watermark_column}" > ?',
+                    [last]
+                ).fetchone()[0]
+            else:
+                mode = "full"
+                if kind == 'VIEW':
+                    conn.execute(f'DROP VIEW "{name}"')
+                conn.execute(f'CREATE OR REPLACE TABLE "{name}" AS {sql}')
+                inserted = None
+            row_count = conn.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+            watermark = None
+            if watermark_column:
+                watermark = conn.execute(f'SELECT max("{watermark_column}") FROM "{name}"').fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return {
+            "mode": mode,
+            "rows_inserted": row_count if inserted is None else inserted,
+            "row_count": row_count,
+            "watermark": str(watermark) if watermark is not None else None,
+        }
+
+    def _status_from_row(self, conn, row) -> MaterializationStatus:
+        row_count = None
+        if row[3] and self._relation_type(conn, row[1]) == 'BASE TABLE':
+            row_count = conn.execute(f'SELECT count(*) FROM "{row[1]}"').fetchone()[0]
+        return MaterializationStatus(
+            transformation_id=row[0],
+            name=row[1],
+            materialized=bool(row[3]),
+            refresh_mode=row[4] or "manual",
+            refresh_interval_seconds=row[5],
+            watermark_column=row[6],
+            last_refreshed_at=row[7],
+            last_watermark=row[8],
+            row_count=row_count,
+        )
+
+    def get_materialization(self, transformation_id: int) -> Optional[MaterializationStatus]:
+        """Configuración y estado de materialización de una transformación"""
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                f"SELECT {self.MATERIALIZATION_COLUMNS} FROM transformations WHERE id = ?",
+                [transformation_id]
+            ).fetchone()
+            if not row:
+                return None
+            return self._status_from_row(conn, row)
         finally:
             conn.close()
 
+    def set_materialization(self, transformation_id: int, config: MaterializationConfig) -> Optional[MaterializationStatus]:
+        """
+        Activa o desactiva la materialización. Al activarla se crea la tabla
+        con un refresco completo; al desactivarla se vuelve a crear la vista.
+        """
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT name, sql_definition FROM transformations WHERE id = ?",
+                [transformation_id]
+            ).fetchone()
+            if not row:
+                return None
+            name, sql = row
+
+            if config.watermark_column:
+                columns = [desc[0] for desc in conn.execute(f"SELECT * FROM ({sql}) AS src LIMIT 0").description]
+                if config.watermark_column not in columns:
+                    raise ValueError(f"La columna watermark '{config.watermark_column}' no está en el resultado de la transformación")
+
+            with self._refresh_lock(name):
+                last_refreshed_at = None
+                last_watermark = None
+                if config.materialized:
+                    result = self._materialize(conn, name, sql, config.watermark_column, full=True)
+                    last_refreshed_at = datetime.now()
+                    last_watermark = result["watermark"]
+                else:
+                    self._drop_relation(conn, name)
+                    conn.execute(f'CREATE OR REPLACE VIEW "{name}" AS {sql}')
+
+                conn.execute("""
+                    UPDATE transformations
+                    SET materialized = ?, refresh_mode = ?, refresh_interval_seconds = ?, watermark_column = ?,
+                        last_refreshed_at = ?, last_watermark = ?, updated_at = ?
+                    WHERE id = ?
+                """, [
+                    config.materialized,
+                    config.refresh_mode,
+                    config.refresh_interval_seconds,
+                    config.watermark_column,
+                    last_refreshed_at,
+                    last_watermark,
+                    datetime.now(),
+                    transformation_id,
+                ])
+            lineage_service.invalidate([name], conn)
+
+            row = conn.execute(
+                f"SELECT {self.MATERIALIZATION_COLUMNS} FROM transformations WHERE id = ?",
+                [transformation_id]
+            ).fetchone()
+            return self._status_from_row(conn, row)
+        finally:
+            conn.close()
+
+    def refresh_transformation(self, transformation_id: int, full: bool = False, cascade: bool = True) -> Optional[RefreshResult]:
+        """
+        Refresca una transformación materializada. Es incremental si tiene
+        columna watermark (fuentes append-only), salvo que se pida `full`.
+        Con `cascade` se encola el refresco de sus dependientes 'on_source_change'.
+        """
+        conn = db.get_connection()
+        try:
+            row = conn.execute(
+                f"SELECT {self.MATERIALIZATION_COLUMNS} FROM transformations WHERE id = ?",
+                [transformation_id]
+            ).fetchone()
+            if not row:
+                return None
+            if not row[3]:
+                raise ValueError(f"La transformación '{row[1]}' no está materializada")
+            name, sql, watermark_column = row[1], row[2], row[6]
+
+            started = time.perf_counter()
+            with self._refresh_lock(name):
+                result = self._materialize(conn, name, sql, watermark_column, full)
+                conn.execute(
+                    "UPDATE transformations SET last_refreshed_at = ?, last_watermark = ? WHERE id = ?",
+                    [datetime.now(), result["watermark"], transformation_id]
+                )
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        finally:
+            conn.close()
+
+        lineage_service.invalidate([name])
+        if cascade:
+            self.refresh_dependents(name)
+
+        return RefreshResult(
+            transformation_id=transformation_id,
+            name=name,
+            mode=result["mode"],
+            rows_inserted=result["rows_inserted"],
+            row_count=result["row_count"],
+            elapsed_ms=round(elapsed_ms, 2),
+        )
+
+    def plan_refresh(self, conn, names: Iterable[str]) -> List[List[str]]:
+        """
+        Orden de refresco de los nodos materializados `names`: cada nivel solo
+        depende de niveles anteriores y sus nodos pueden refrescarse en paralelo.
+        """
+        pending = lineage_service.dependencies_within(conn, names)
+        levels = []
+        while pending:
+            level = sorted(name for name, deps in pending.items() if not deps)
+            if not level:
+                raise ValueError(f"Dependencia circular entre: {', '.join(sorted(pending))}")
+            levels.append(level)
+            for name in level:
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(level)
+        return levels
+
+    def _materialized_ids(self, conn, names: Optional[Iterable[str]] = None, refresh_mode: Optional[str] = None) -> Dict[str, int]:
+        query = "SELECT name, id FROM transformations WHERE materialized"
+        params = []
+        if refresh_mode:
+            query += " AND refresh_mode = ?"
+            params.append(refresh_mode)
+        ids = dict(conn.execute(query, params).fetchall())
+        if names is not None:
+            names = set(names)
+            ids = {name: tid for name, tid in ids.items() if name in names}
+        return ids
+
+    def refresh_many(self, names: Optional[Iterable[str]] = None, full: bool = False) -> RefreshPlanResult:
+        """
+        Refresca nodos materializados (todos si `names` es None) en orden
+        topológico. Cada nodo arranca en cuanto terminan los nodos del plan de
+        los que depende, así que las ramas independientes corren en paralelo.
+        Si un nodo falla, los que dependen de él se omiten.
+        """
+        started = time.perf_counter()
+        conn = db.get_connection()
+        try:
+            ids = self._materialized_ids(conn, names)
+            pending = lineage_service.dependencies_within(conn, ids)
+            order = [name for level in self.plan_refresh(conn, ids) for name in level]
+        finally:
+            conn.close()
+
+        results: List[RefreshResult] = []
+        failed: Dict[str, str] = {}
+        skipped: List[str] = []
+        running = {}
+        while pending or running:
+            for name in [n for n, deps in pending.items() if not deps]:
+                del pending[name]
+                running[_refresh_executor.submit(self._refresh_node, ids[name], full)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failed[name] = str(e)
+                    # Todo lo que depende del nodo fallido queda sin refrescar
+                    for other in [n for n, deps in pending.items() if name in deps]:
+                        del pending[other]
+                        skipped.append(other)
+                for deps in pending.values():
+                    deps.discard(name)
+
+        return RefreshPlanResult(
+            order=order,
+            results=results,
+            failed=failed,
+            skipped=sorted(skipped),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+
+    def _refresh_node(self, transformation_id: int, full: bool = False) -> RefreshResult:
+        with query_scheduler.slot(LANE_INGEST):
+            return self.refresh_transformation(transformation_id, full=full, cascade=False)
+
+    def refresh_dependents(self, source_table: str):
+        """Encola el refresco, en orden de dependencias, de los nodos 'on_source_change' aguas abajo de `source_table`"""
+        conn = db.get_connection()
+        try:
+            downstream = lineage_service.downstream(conn, [source_table])
+            names = list(self._materialized_ids(conn, downstream, refresh_mode="on_source_change"))
+        finally:
+            conn.close()
+        if names:
+            _cascade_executor.submit(self._background_refresh, names)
+
+    def _background_refresh(self, names: List[str]):
+        try:
+            plan = self.refresh_many(names)
+            for name, error in plan.failed.items():
+                logger.error("Refresh of transformation %s failed: %s", name, error)
+        except Exception:
+            logger.exception("Refresh of transformations %s failed", names)
+
+    def refresh_due(self) -> int:
+        """Refresca las transformaciones programadas cuyo intervalo ya venció"""
+        now = datetime.now()
+        conn = db.get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT name, last_refreshed_at, refresh_interval_seconds FROM transformations
+                WHERE materialized AND refresh_mode = 'schedule' AND refresh_interval_seconds IS NOT NULL
+            """).fetchall()
+        finally:
+            conn.close()
+        due = [
+            row[0] for row in rows
+            if row[1] is None or row[1] + timedelta(seconds=row[2]) <= now
+        ]
+        if due:
+            self._background_refresh(due)
+        return len(due)
+
+    def start_refresh_scheduler(self):
+        if self._scheduler is None or not self._scheduler.is_alive():
+            self._scheduler = threading.Thread(target=self._schedule_loop, name="transformation-scheduler", daemon=True)
+            self._scheduler.start()
+
+    def _schedule_loop(self):
+        while True:
+            time.sleep(settings.TRANSFORMATION_SCHEDULER_INTERVAL)
+            try:
+                self.refresh_due()
+            except Exception:
+                logger.exception("Scheduled transformation refresh failed")
+
 
 transformation_service = TransformationService()
@@ -0,0 +1,300 @@
+import os
+import csv
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.infra.database import db
+from app.services.data_loader import data_loader, UPLOAD_DIR
+
+# Partial files live here until the upload completes (list_server_files ignores them)
+INCOMING_DIR = os.path.join(UPLOAD_DIR, ".incoming")
+
+SESSION_COLUMNS = "id, filename, total_size, chunk_size, sha256, detected_type, status, created_by, created_at, updated_at"
+
+# Formats the converter/loader accept, grouped by how they can be recognised
+BINARY_SIGNATURES = [
+    (b"PAR1", "parquet"),
+    (b"PK\x03\x04", "xlsx"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "xls"),
+    (b"Obj\x01", "avro"),
+    (b"ORC", "orc"),
+]
+TEXT_TYPES = {"csv", "txt", "json"}
+
+
+class UploadSessionNotFoundError(LookupError):
+    """The upload session does not exist or has expired"""
+
+
+class UploadChecksumError(ValueError):
+    """A chunk or the assembled file does not match its checksum"""
+
+
+def sniff_file_type(head: bytes) -> str:
+    """Guess the format from the first bytes of a file"""
+    for signature, file_type in BINARY_SIGNATURES:
+        if head.startswith(signature):
+            return file_type
+    text = head.lstrip(b"\xef\xbb\xbf").lstrip()
+    if text[:1] in (b"[", b"{"):
+        return "json"
+    try:
+        sample = head.decode("utf-8")
+    except UnicodeDecodeError:
+        # The chunk may end mid-character, or the file may be latin-1
+        sample = head.decode("latin-1")
+    if "\x00" in sample:
+        return "binary"
+    try:
+        csv.Sniffer().sniff(sample[:64 * 1024], delimiters=",;\t|")
+        return "csv"
+    except csv.Error:
+        return "txt"
+
+
+class _Session:
+    def __init__(self, row):
+        (self.id, self.filename, self.total_size, self.chunk_size, self.sha256,
+         self.detected_type, self.status, self.created_by, self.created_at, self.updated_at) = row
+
+    @property
+    def chunk_count(self) -> int:
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    @property
+    def extension(self) -> str:
+        return self.filename.rsplit(".", 1)[-1].lower() if "." in self.filename else ""
+
+    @property
+    def partial_path(self) -> str:
+        return os.path.join(INCOMING_DIR, f"{self.id}.part")
+
+    def chunk_size_of(self, index: int) -> int:
+        if index == self.chunk_count - 1:
+            return self.total_size - index * self.chunk_size
+        return self.chunk_size
+
+
+class UploadSessionService:
+    """
+    Chunked, resumable uploads. The client opens a session, PUTs chunks in any
+    order (each written straight to its offset in a preallocated file, with its
+    SHA-256 checked on arrival), can ask which chunks are missing after a
+    dropped connection, and completes the session to move the file into
+    uploads/. The format is sniffed from the first chunk so a mislabelled file
+    is rejected before the rest is sent.
+    """
+
+    def __init__(self, chunk_size: int, max_chunk_size: int, session_ttl_hours: float):
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.session_ttl = timedelta(hours=session_ttl_hours)
+        # Running whole-file hash for sessions whose chunks arrive in order
+        self._hashers: Dict[str, Any] = {}
+        self._hashed_upto: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, conn, session_id: str) -> _Session:
+        row = conn.execute(
+            f"SELECT {SESSION_COLUMNS} FROM upload_sessions WHERE id = ? AND status = 'open'",
+            [session_id]
+        ).fetchone()
+        if not row:
+            raise UploadSessionNotFoundError(f"Upload session '{session_id}' not found or expired")
+        return _Session(row)
+
+    def _received(self, conn, session_id: str) -> List[int]:
+        return [r[0] for r in conn.execute(
+            "SELECT chunk_index FROM upload_chunks WHERE session_id = ? ORDER BY chunk_index",
+            [session_id]
+        ).fetchall()]
+
+    def init(self, filename: str, total_size: int, chunk_size: Optional[int] = None,
+             sha256: Optional[str] = None, created_by: Optional[str] = None) -> Dict[str, Any]:
+        filename = os.path.basename(filename)
+        if not filename:
+            raise ValueError("A filename is required")
+        if total_size <= 0:
+            raise ValueError("total_size must be positive")
+        chunk_size = chunk_size or self.chunk_size
+        if chunk_size <= 0 or chunk_size > self.max_chunk_size:
+            raise ValueError(f"chunk_size must be between 1 and {self.max_chunk_size} bytes")
+
+        self.purge_expired()
+        os.makedirs(INCOMING_DIR, exist_ok=True)
+        session_id = uuid.uuid4().hex
+        # Preallocate so chunks can be written at their offsets in any order
+        with open(os.path.join(INCOMING_DIR, f"{session_id}.part"), "wb") as f:
+            f.truncate(total_size)
+
+        now = datetime.now()
+        conn = db.get_connection()
+        try:
+            conn.execute(
+                "INSERT INTO upload_sessions (id, filename, total_size, chunk_size, sha256, status, created_by, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'open', ?, ?, ?)",
+                [session_id, filename, total_size, chunk_size, sha256.lower() if sha256 else None, created_by, now, now]
+            )
+        finally:
+            conn.close()
+        return self.status(session_id)
+
+    def status(self, session_id: str) -> Dict[str, Any]:
+        conn = db.get_connection()
+        try:
+            session = self._get(conn, session_id)
+            received = self._received(conn, session_id)
+        finally:
+            conn.close()
+        received_set = set(received)
+        bytes_received = sum(session.chunk_size_of(i) for i in received)
+        return {
+            "session_id": session.id,
+            "filename": session.filename,
+            "total_size": session.total_size,
+            "chunk_size": session.chunk_size,
+            "chunk_count": session.chunk_count,
+            "received_chunks": received,
+            "missing_chunks": [i for i in range(session.chunk_count) if i not in received_set],
+            "bytes_received": bytes_received,
+            "detected_type": session.detected_type,
+            "expires_at": (session.updated_at + self.session_ttl).isoformat(),
+        }
+
+    def put_chunk(self, session_id: str, index: int, data: bytes, sha256: Optional[str] = None) -> Dict[str, Any]:
+        conn = db.get_connection()
+        try:
+            session = self._get(conn, session_id)
+            if index < 0 or index >= session.chunk_count:
+                raise ValueError(f"Chunk index must be between 0 and {session.chunk_count - 1}")
+            expected = session.chunk_size_of(index)
+            if len(data) != expected:
+                raise ValueError(f"Chunk {index} must be {expected} bytes, got {len(data)}")
+            digest = hashlib.sha256(data).hexdigest()
+            if sha256 and sha256.lower() != digest:
+                raise UploadChecksumError(f"Checksum mismatch for chunk {index}")
+
+            detected_type = session.detected_type
+            if index == 0:
+                detected_type = sniff_file_type(data[:64 * 1024])
+                self._check_type(session, detected_type)
+
+            with open(session.partial_path, "r+b") as f:
+                f.seek(index * session.chunk_size)
+                f.write(data)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO upload_chunks (session_id, chunk_index, size, sha256) VALUES (?, ?, ?, ?)",
+                [session_id, index, len(data), digest]
+            )
+            conn.execute(
+                "UPDATE upload_sessions SET detected_type = ?, updated_at = ? WHERE id = ?",
+                [detected_type, datetime.now(), session_id]
+            )
+        finally:
+            conn.close()
+
+        self._advance_hash(session, index, data)
+        return {"session_id": session_id, "chunk_index": index, "sha256": digest, "detected_type": detected_type}
+
+    def _check_type(self, session: _Session, detected_type: str):
+        """Reject early when the content clearly is not what the extension says"""
+        extension = session.extension
+        if detected_type == "binary":
+            if extension in TEXT_TYPES:
+                raise ValueError(f"File '{session.filename}' does not look like a {extension.upper()} file")
+        elif detected_type in TEXT_TYPES:
+            if extension not in TEXT_TYPES:
+                raise ValueError(f"File '{session.filename}' looks like a text ({detected_type.upper()}) file, not {extension.upper()}")
+        elif detected_type != extension and not (extension == "xls" and detected_type == "xlsx"):
+            raise ValueError(f"File '{session.filename}' looks like a {detected_type.upper()} file, not {extension.upper()}")
+
+    def _advance_hash(self, session: _Session, index: int, data: bytes):
+        if not session.sha256:
+            return
+        with self._lock:
+            offset = index * session.chunk_size
+            hashed = self._hashed_upto.get(session.id, 0)
+            if offset != hashed:
+                return  # Out of order; the file is hashed from disk on completion instead
+            hasher = self._hashers.setdefault(session.id, hashlib.sha256())
+            hasher.update(data)
+            self._hashed_upto[session.id] = hashed + len(data)
+
+    def _file_sha256(self, session: _Session) -> str:
+        with self._lock:
+            hasher = self._hashers.pop(session.id, None)
+            hashed = self._hashed_upto.pop(session.id, 0)
+        if hasher is not None and hashed == session.total_size:
+            return hasher.hexdigest()
+        hasher = hashlib.sha256()
+        with open(session.partial_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def complete(self, session_id: str) -> str:
+        """Verify the upload and move it into uploads/. Returns the final path."""
+        conn = db.get_connection()
+        try:
+            session = self._get(conn, session_id)
+            received = set(self._received(conn, session_id))
+            missing = [i for i in range(session.chunk_count) if i not in received]
+            if missing:
+                raise ValueError(f"Upload incomplete, missing chunks: {missing[:20]}")
+            if session.sha256 and self._file_sha256(session) != session.sha256:
+                raise UploadChecksumError("Checksum mismatch for the assembled file")
+
+            final_path = data_loader.upload_path(session.filename)
+            os.replace(session.partial_path, final_path)
+            conn.execute(
+                "UPDATE upload_sessions SET status = 'completed', updated_at = ? WHERE id = ?",
+                [datetime.now(), session_id]
+            )
+            conn.execute("DELETE FROM upload_chunks WHERE session_id = ?", [session_id])
+            return final_path
+        finally:
+            conn.close()
+
+    def abort(self, session_id: str):
+        conn = db.get_connection()
+        try:
+            session = self._get(conn, session_id)
+            self._discard(conn, session.id)
+        finally:
+            conn.close()
+
+    def _discard(self, conn, session_id: str):
+        conn.execute("UPDATE upload_sessions SET status = 'aborted', updated_at = ? WHERE id = ?", [datetime.now(), session_id])
+        conn.execute("DELETE FROM upload_chunks WHERE session_id = ?", [session_id])
+        with self._lock:
+            self._hashers.pop(session_id, None)
+            self._hashed_upto.pop(session_id, None)
+        try:
+            os.remove(os.path.join(INCOMING_DIR, f"{session_id}.part"))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self) -> int:
+        """Drop open sessions with no activity within the TTL"""
+        conn = db.get_connection()
+        try:
+            expired = conn.execute(
+                "SELECT id FROM upload_sessions WHERE status = 'open' AND updated_at < ?",
+                [datetime.now() - self.session_ttl]
+            ).fetchall()
+            for (session_id,) in expired:
+                self._discard(conn, session_id)
+            return len(expired)
+        finally:
+            conn.close()
+
+
+upload_sessions = UploadSessionService(
+    chunk_size=settings.UPLOAD_CHUNK_SIZE,
+    max_chunk_size=settings.UPLOAD_MAX_CHUNK_SIZE,
+    session_ttl_hours=settings.UPLOAD_SESSION_TTL_HOURS,
+)
@@ -1,7 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
 from app.api.v1 import router as api_router
+from app.infra.database import PoolTimeoutError
+from app.services.query_scheduler import AdmissionError
 
 app = FastAPI(
     title="BI Dashboard API",
@@ -21,10 +24,39 @@ if settings.BACKEND_CORS_ORIGINS:
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.exception_handler(PoolTimeoutError)
+def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+@app.exception_handler(AdmissionError)
+def admission_error_handler(request: Request, exc: AdmissionError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.on_event("startup")
 def startup_event():
     from app.infra.database import db
+    from app.services.lineage_service import lineage_service
+    from app.services.transformation_service import transformation_service
+    from app.services.ingest_jobs import ingest_jobs
+    from app.services.training_jobs import training_jobs
     db.init_db()
+    lineage_service.rebuild()
+    ingest_jobs.recover()
+    training_jobs.recover()
+    transformation_service.start_refresh_scheduler()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    from app.infra.database import db
+    from app.services.batch_converter import batch_converter
+    from app.services.training_jobs import training_jobs
+    batch_converter.shutdown()
+    training_jobs.shutdown()
+    db.close()
 
 @app.get("/health")
 def health_check():
@@ -2,6 +2,7 @@
 
 import { useState, useRef } from "react";
 import api from "@/lib/api";
+import { ingestJobService } from "@/services/ingestJobs";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card";
 import {
@@ -96,9 +97,10 @@ export default function ConverterPage() {
             const res = await api.post("/datasets/convert", formData, {
                 headers: { "Content-Type": "multipart/form-data" }
             });
-            setResult(res.data);
+            // The conversion runs as an ingest job; its result is the conversion report
+            setResult(await ingestJobService.settle(res));
         } catch (err: any) {
-            setError(err.response?.data?.detail || "Error al convertir el archivo. Intenta de nuevo.");
+            setError(err.response?.data?.detail || err.message || "Error al convertir el archivo. Intenta de nuevo.");
         } finally {
             setLoading(false);
         }
@@ -4,6 +4,8 @@ import { useState, useEffect } from "react";
 import { useQuery, useQueryClient } from "@tanstack/react-query";
 import { useRouter } from "next/navigation";
 import api from "@/lib/api";
+import { uploadService, CHUNKED_UPLOAD_THRESHOLD } from "@/services/upload";
+import { ingestJobService } from "@/services/ingestJobs";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card";
@@ -110,9 +112,19 @@ export default function DatasetsPage() {
         }
 
         try {
-            await api.post("/datasets/", formData, {
-                headers: { "Content-Type": "multipart/form-data" }
-            });
+            if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+                // Large files go in resumable chunks
+                await uploadService.uploadInChunks(file, {
+                    tableName,
+                    dashboardId: currentDashboard?.id,
+                });
+            } else {
+                const res = await api.post("/datasets/", formData, {
+                    headers: { "Content-Type": "multipart/form-data" }
+                });
+                // The load runs as an ingest job; wait for it to finish
+                await ingestJobService.settle(res);
+            }
             handleSuccess();
             setFile(null);
             setTableName("");
@@ -135,11 +147,12 @@ export default function DatasetsPage() {
         resetFeedback();
 
         try {
-            await api.post("/datasets/import-url", {
+            const res = await api.post("/datasets/import-url", {
                 url,
                 table_name: urlTableName,
                 dashboard_id: currentDashboard?.id
             });
+            await ingestJobService.settle(res);
             handleSuccess();
             setUrl("");
             setUrlTableName("");
@@ -159,11 +172,12 @@ export default function DatasetsPage() {
         resetFeedback();
 
         try {
-            await api.post("/datasets/import-local", {
+            const res = await api.post("/datasets/import-local", {
                 file_path: serverFile,
                 table_name: serverTableName,
                 dashboard_id: currentDashboard?.id
             });
+            await ingestJobService.settle(res);
             handleSuccess();
             setServerFile("");
             setServerTableName("");
@@ -182,7 +196,7 @@ export default function DatasetsPage() {
 
     const handleError = (error: any) => {
         console.error(error);
-        setUploadError(error.response?.data?.detail || "Error en la operación");
+        setUploadError(error.response?.data?.detail || error.message || "Error en la operación");
     };
 
     const handleQueryDataset = (datasetName: string) => {
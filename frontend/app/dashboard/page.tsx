@@ -1,6 +1,7 @@
 "use client";
 
 import { useState, useEffect, useRef } from "react";
+import { useQueryClient } from "@tanstack/react-query";
 import { Button } from "@/components/ui/button";
 import { Plus, LayoutDashboard, Sparkles, Download } from "lucide-react";
 import { WidgetBuilder } from "@/components/dashboard/WidgetBuilder";
@@ -35,6 +36,8 @@ export default function DashboardPage() {
     const [managerMode, setManagerMode] = useState<'create' | 'edit' | 'delete'>('create');
     const [managingDashboard, setManagingDashboard] = useState<any>(null);
 
+    const queryClient = useQueryClient();
+
     const skipNextLoadRef = useRef(false);
     const hasLoadedInitially = useRef(false);
     const dashboardRef = useRef<HTMLDivElement>(null);
@@ -50,15 +53,43 @@ export default function DashboardPage() {
             ...item.config,
             id: item.id
         }));
+        const hasChanged = JSON.stringify(loadedWidgets) !== JSON.stringify(widgets);
+        let cancelled = false;
+
+        const finishLoading = () => {
+            if (cancelled) return;
+            if (hasChanged) {
+                setWidgets(loadedWidgets);
+            }
+            setIsWidgetsLoaded(true);
 
-        if (JSON.stringify(loadedWidgets) !== JSON.stringify(widgets)) {
-            setWidgets(loadedWidgets);
+            setTimeout(() => {
+                hasLoadedInitially.current = true;
+            }, 100);
+        };
+
+        if (!hasChanged || loadedWidgets.length === 0) {
+            finishLoading();
+            return;
         }
-        setIsWidgetsLoaded(true);
 
-        setTimeout(() => {
-            hasLoadedInitially.current = true;
-        }, 100);
+        // Load every widget's data in one request and seed each widget's query cache
+        dashboardService.render(currentDashboard.id)
+            .then(rendered => {
+                const results = new Map(rendered.widgets.map(w => [w.id, w]));
+                loadedWidgets.forEach((widget: WidgetConfig) => {
+                    const result = results.get(widget.id);
+                    if (result && !result.error && result.data) {
+                        queryClient.setQueryData(["widget", widget.id, widget], result.data);
+                    }
+                });
+            })
+            .catch(err => console.error("Failed to render dashboard", err))
+            .finally(finishLoading);
+
+        return () => {
+            cancelled = true;
+        };
     }, [currentDashboard, isDashboardLoading]);
 
     useEffect(() => {
@@ -236,6 +236,9 @@ export default function TransformationDialog({ open, onClose, transformation, in
                 sql_definition: sql.trim().replace(/;+$/, '')
             });
             setPreviewData(res.data.data || []);
+            if (res.data.sampled) {
+                toast.info("Vista previa calculada sobre una muestra de la tabla origen");
+            }
             setActiveTab("preview");
         } catch (error: any) {
             toast.error(error.response?.data?.detail || "Error en preview");
@@ -19,6 +19,22 @@ export interface Dashboard {
     updated_at: string;
 }
 
+export interface WidgetRenderResult {
+    id: string;
+    type: string;
+    title?: string;
+    data: any[] | null;
+    row_count: number;
+    elapsed_ms: number;
+    error?: string | null;
+}
+
+export interface DashboardRender {
+    dashboard_id: string;
+    elapsed_ms: number;
+    widgets: WidgetRenderResult[];
+}
+
 export const dashboardService = {
     async list(): Promise<Dashboard[]> {
         const response = await api.get<Dashboard[]>('/dashboards/');
@@ -30,6 +46,11 @@ export const dashboardService = {
         return response.data;
     },
 
+    async render(id: string): Promise<DashboardRender> {
+        const response = await api.post<DashboardRender>(`/dashboards/${id}/render`);
+        return response.data;
+    },
+
     async create(name: string, description?: string): Promise<Dashboard> {
         const response = await api.post<Dashboard>('/dashboards/', { name, description });
         return response.data;
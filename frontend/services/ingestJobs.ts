@@ -0,0 +1,49 @@
+import api from '@/lib/api';
+import type { AxiosResponse } from 'axios';
+
+const POLL_INTERVAL_MS = 1000;
+const WAIT_TIMEOUT_MS = 60 * 60 * 1000;
+
+export interface IngestJob {
+    id: string;
+    kind: string;
+    status: 'queued' | 'running' | 'succeeded' | 'failed';
+    phase: string;
+    bytes_total?: number | null;
+    bytes_read: number;
+    rows_written?: number | null;
+    result?: any;
+    error?: string | null;
+}
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+export const ingestJobService = {
+    async get(jobId: string): Promise<IngestJob> {
+        const response = await api.get<IngestJob>(`/datasets/jobs/${jobId}`);
+        return response.data;
+    },
+
+    // Poll a job until it finishes; resolves with its result, rejects with its error or after timeoutMs
+    async wait(jobId: string, onUpdate?: (job: IngestJob) => void, timeoutMs: number = WAIT_TIMEOUT_MS): Promise<any> {
+        const deadline = Date.now() + timeoutMs;
+        for (;;) {
+            const job = await ingestJobService.get(jobId);
+            onUpdate?.(job);
+            if (job.status === 'succeeded') return job.result;
+            if (job.status === 'failed') throw new Error(job.error || 'Ingest job failed');
+            if (Date.now() >= deadline) {
+                throw new Error(`Ingest job ${jobId} is still ${job.status}; check it later in the jobs list`);
+            }
+            await sleep(POLL_INTERVAL_MS);
+        }
+    },
+
+    // Ingest endpoints answer 202 + job id: wait for the job, or return an inline result as is
+    async settle(response: AxiosResponse, onUpdate?: (job: IngestJob) => void): Promise<any> {
+        if (response.status === 202 && response.data?.job_id) {
+            return ingestJobService.wait(response.data.job_id, onUpdate);
+        }
+        return response.data;
+    },
+};
@@ -0,0 +1,88 @@
+import api from '@/lib/api';
+import { ingestJobService } from '@/services/ingestJobs';
+
+// Files above this size use the chunked, resumable upload protocol
+export const CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+const MAX_CHUNK_RETRIES = 3;
+
+export interface UploadSession {
+    session_id: string;
+    filename: string;
+    total_size: number;
+    chunk_size: number;
+    chunk_count: number;
+    received_chunks: number[];
+    missing_chunks: number[];
+    bytes_received: number;
+    detected_type?: string | null;
+}
+
+export interface ChunkedUploadOptions {
+    action?: 'register' | 'convert';
+    tableName?: string;
+    dashboardId?: string;
+    onProgress?: (bytesSent: number, totalBytes: number) => void;
+}
+
+const sessionKey = (file: File) => `upload:${file.name}:${file.size}:${file.lastModified}`;
+
+async function sha256Hex(data: ArrayBuffer): Promise<string> {
+    const digest = await crypto.subtle.digest('SHA-256', data);
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function openSession(file: File): Promise<UploadSession> {
+    // Resume a session left open by an interrupted upload of the same file
+    const saved = localStorage.getItem(sessionKey(file));
+    if (saved) {
+        try {
+            const response = await api.get<UploadSession>(`/datasets/uploads/${saved}`);
+            return response.data;
+        } catch {
+            localStorage.removeItem(sessionKey(file));
+        }
+    }
+    const response = await api.post<UploadSession>('/datasets/uploads/', {
+        filename: file.name,
+        total_size: file.size,
+    });
+    localStorage.setItem(sessionKey(file), response.data.session_id);
+    return response.data;
+}
+
+export const uploadService = {
+    async uploadInChunks(file: File, options: ChunkedUploadOptions = {}): Promise<any> {
+        const session = await openSession(file);
+        let sent = session.bytes_received;
+        options.onProgress?.(sent, file.size);
+
+        for (const index of session.missing_chunks) {
+            const start = index * session.chunk_size;
+            const chunk = await file.slice(start, Math.min(start + session.chunk_size, file.size)).arrayBuffer();
+            const checksum = await sha256Hex(chunk);
+
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    await api.put(`/datasets/uploads/${session.session_id}/chunks/${index}`, chunk, {
+                        headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum },
+                    });
+                    break;
+                } catch (error: any) {
+                    // Rejected content (wrong type, bad checksum) will not succeed on retry
+                    if (error.response?.status === 400 || attempt >= MAX_CHUNK_RETRIES) throw error;
+                }
+            }
+            sent += chunk.byteLength;
+            options.onProgress?.(sent, file.size);
+        }
+
+        const response = await api.post(`/datasets/uploads/${session.session_id}/complete`, {
+            action: options.action ?? 'register',
+            table_name: options.tableName,
+            dashboard_id: options.dashboardId,
+        });
+        localStorage.removeItem(sessionKey(file));
+        // The file is loaded by an ingest job; resolve once it has finished
+        return ingestJobService.settle(response);
+    },
+};